@@ -2,22 +2,152 @@ u"""
 Модуль выполняющий роль клиентского приложения
 """
 import hashlib
-import json
+import queue
 import socket
 import struct
 import threading
 import uuid
-from time import sleep
+from concurrent.futures import Future, TimeoutError
+from functools import partial
 
 import pika
 from termcolor import cprint
 
+import Rabbit_codec
+
+rpc_timeout = 10  # время ожидания ответа сервера в секундах
+stream_actions = {'get_orders', 'get_favorites'}  # действия с потоковым ответом сервера (get_cars - по выбору)
+request_exchange = 'server_requests'  # direct exchange запросов сервера (request_exchange в config_server)
+wire_format = Rabbit_codec.MSGPACK if Rabbit_codec.msgpack is not None else Rabbit_codec.JSON  # формат запросов
+
+
+class RpcClient:
+    u"""
+    RPC-клиент поверх RabbitMQ\r\n
+    Очередь callback_queue читается непрерывно в отдельном потоке, ответы сопоставляются
+    с ожидающими запросами по correlation_id. Через одно соединение может выполняться
+    сколько угодно одновременных запросов\r\n
+    """
+    def __init__(self, host='localhost'):
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+        self.channel = self.connection.channel()
+        self.channel.exchange_declare(exchange=request_exchange, exchange_type='direct')
+        result = self.channel.queue_declare(queue='', exclusive=True)
+        self.callback_queue = result.method.queue
+        self.futures = {}  # correlation_id -> Future
+        self.streams = {}  # correlation_id -> очередь сообщений потокового ответа
+        self.lock = threading.Lock()
+        self.channel.basic_consume(queue=self.callback_queue, on_message_callback=self.on_response, auto_ack=True)
+        self.thread = threading.Thread(target=self.channel.start_consuming, name='rpc-consumer', daemon=True)
+        self.thread.start()
+
+    def on_response(self, ch, method, props, body):
+        """Метод для передачи ответа сервера ожидающему запросу"""
+        with self.lock:
+            future = self.futures.pop(props.correlation_id, None)
+            stream = self.streams.get(props.correlation_id)
+        if stream is not None:
+            stream.put((props, body))
+        elif future is not None:  # ответы на запросы с истекшим временем ожидания отбрасываются
+            future.set_result(get_message(body, props.content_type, props.content_encoding))
+
+    def call_async(self, client_data, stream=None, priority=None):
+        """
+        Метод для отправки запроса серверу без ожидания ответа\r\n
+        Параметры:\r\n
+            client_data: словарь данных от клиента\r\n
+            stream: очередь для сообщений потокового ответа (None - ответ одним сообщением)\r\n
+            priority: приоритет сообщения AMQP (учитывается при queue_max_priority на сервере)\r\n
+        Возвращаемое значение:\r\n
+            (corr_id, future): идентификатор запроса и Future со словарем ответа\r\n
+        """
+        corr_id = str(uuid.uuid4())
+        future = Future()
+        with self.lock:
+            if stream is None:
+                self.futures[corr_id] = future
+            else:
+                self.streams[corr_id] = stream
+        properties = pika.BasicProperties(reply_to=self.callback_queue, correlation_id=corr_id, content_type=wire_format,
+                                          headers={'accept_encoding': Rabbit_codec.DEFLATE}, priority=priority)
+        body = Rabbit_codec.encode_message(client_data, wire_format)
+        self.connection.add_callback_threadsafe(partial(self.channel.basic_publish, exchange=request_exchange,
+                                                        routing_key=Rabbit_codec.request_class(client_data),
+                                                        properties=properties, body=body))
+        return corr_id, future
+
+    def call(self, client_data, timeout=None, priority=None):
+        """
+        Метод для отправки запроса серверу и ожидания ответа\r\n
+        Параметры:\r\n
+            client_data: словарь данных от клиента\r\n
+            timeout: время ожидания ответа в секундах (None - без ограничения)\r\n
+            priority: приоритет сообщения AMQP\r\n
+        Возвращаемое значение:\r\n
+            словарь с ответом сервера\r\n
+        """
+        corr_id, future = self.call_async(client_data, priority=priority)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            with self.lock:
+                self.futures.pop(corr_id, None)
+            raise
+
+    def stream(self, client_data, timeout=None):
+        """
+        Метод для отправки запроса с потоковым ответом\r\n
+        Параметры:\r\n
+            client_data: словарь данных от клиента\r\n
+            timeout: время ожидания каждого сообщения ответа в секундах (None - без ограничения)\r\n
+        Возвращаемое значение:\r\n
+            ReplyStream - итератор по строкам ответа\r\n
+        """
+        messages = queue.Queue()
+        corr_id, future = self.call_async(dict(client_data, stream=True), messages)
+        return ReplyStream(self, corr_id, messages, timeout)
+
+
+class ReplyStream:
+    u"""
+    Итератор по строкам потокового ответа сервера\r\n
+    Части (заголовок stream_seq) выдаются по порядку номеров, сообщение с заголовком stream_end содержит
+    ответ обработчика (status, message, stream_chunks) и доступно в reply после окончания итерации\r\n
+    """
+    def __init__(self, client, corr_id, messages, timeout):
+        self.client = client
+        self.corr_id = corr_id
+        self.messages = messages
+        self.timeout = timeout
+        self.reply = None
+
+    def __iter__(self):
+        pending = {}  # номер части -> список строк, пришедший раньше предыдущих частей
+        seq = 0
+        try:
+            while self.reply is None or seq < self.reply.get('stream_chunks', 0):
+                if seq in pending:
+                    yield from pending.pop(seq)
+                    seq += 1
+                    continue
+                try:
+                    props, body = self.messages.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError
+                headers = props.headers or {}
+                if 'stream_seq' in headers:
+                    pending[headers['stream_seq']] = get_message(body, props.content_type, props.content_encoding)
+                else:
+                    self.reply = get_message(body, props.content_type, props.content_encoding)
+            if not self.reply.get('stream_chunks') and self.reply.get('status') == '200':
+                yield from self.reply['content']  # сервер ответил одним сообщением
+        finally:
+            with self.client.lock:
+                self.client.streams.pop(self.corr_id, None)
+
 
 try:
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
-    channel = connection.channel()
-    result = channel.queue_declare(queue='', exclusive=True)
-    callback_queue = result.method.queue
+    rpc_client = RpcClient()
 except pika.exceptions.AMQPConnectionError:
     print('RabbitMQ не подключен!!')
     exit()
@@ -75,6 +205,13 @@ fields_dict = {
     },
     'favorites': {
         'CarId': 'Авто'
+    },
+    'quotes': {
+        'CarId': 'Id авто',
+        'DateStartContract': 'Дата начала аренды',
+        'DateEndContract': 'Дата окончания аренды',
+        'Cost': 'Стоимость аренды',
+        'Comission': 'Комиссия'
     }
 }
 
@@ -97,6 +234,10 @@ def launch_client():
         13: ['clients', 'del_favorite', del_favorite, 'чтобы удалить ТС из избранного'],
         14: ['clients', 'get_favorites', get_favorites, 'чтобы просмотреть список избранного'],
         15: ['clients', 'log_out', log_out, 'чтобы выйти из аккаунта'],
+        16: ['cars', 'get_free_cars', get_free_cars, 'чтобы посмотреть свободные авто на даты'],
+        17: ['orders', 'quote', quote, 'чтобы рассчитать стоимость аренды нескольких авто'],
+        18: ['cars', 'search', search, 'чтобы найти авто по марке, заголовку или адресу'],
+        19: ['batch', 'run', overview, 'чтобы посмотреть личную информацию, заявки и избранное'],
     }
     cprint('Клиент запущен!', 'yellow')
     client_data = {}  # словарь для отправки серверу
@@ -140,10 +281,17 @@ def launch_client():
                 cprint('Ошибка, проверьте введенные данные!', 'red')
                 break
 
-def get_message():
-    message = channel.basic_get(queue=callback_queue, auto_ack=True)
-    message = message[2].decode()
-    return message
+def get_message(body, content_type=None, content_encoding=None):
+    """
+    Метод для получения ответа сервера\r\n
+    Параметры:\r\n
+        body: тело сообщения из очереди callback_queue\r\n
+        content_type: content_type сообщения (JSON или MSGPACK)\r\n
+        content_encoding: content_encoding сообщения (deflate - тело сжато zlib)\r\n
+    Возвращаемое значение:\r\n
+        словарь с ответом сервера\r\n
+    """
+    return Rabbit_codec.decode_message(Rabbit_codec.decompress(body, content_encoding), content_type)
 
 
 def send_and_receive(client_data):
@@ -154,11 +302,63 @@ def send_and_receive(client_data):
     Возвращаемое значение:\r\n
         client_data: словарь данных от клиента\r\n
     """
-    send_data = json.dumps(client_data)
-    corr_id = str(uuid.uuid4())
-    channel.basic_publish(exchange='', routing_key='server_queue',properties=pika.BasicProperties(reply_to=callback_queue, correlation_id=corr_id), body=send_data)
-    sleep(0.1)
-    message = json.loads(get_message())
+    try:
+        message = rpc_client.call(client_data, timeout=rpc_timeout)
+    except TimeoutError:
+        message = timeout_message(client_data)
+    return message
+
+
+def send_batch(client_data, items, transaction=False):
+    """
+    Метод для выполнения нескольких запросов за один обмен сообщениями с сервером\r\n
+    Параметры:\r\n
+        client_data: словарь данных от клиента (token)\r\n
+        items: список запросов {endpoint, action, content}\r\n
+        transaction: выполнить запросы в одной транзакции (ошибка запроса записи отменяет весь пакет, вход,
+            регистрация, выход и удаление клиента в транзакции запрещены)\r\n
+    Возвращаемое значение:\r\n
+        словарь с ответом сервера, ответы на запросы пакета - в content\r\n
+    """
+    batch_data = {'endpoint': 'batch', 'action': 'run', 'token': client_data.get('token'),
+                  'content': {'items': items, 'transaction': transaction}}
+    return send_and_receive(batch_data)
+
+
+def timeout_message(client_data):
+    """
+    Метод для получения ответа-ошибки, если сервер не ответил за rpc_timeout\r\n
+    Параметры:\r\n
+        client_data: словарь данных от клиента\r\n
+    """
+    message = dict(client_data)
+    message['content'] = []
+    message['status'] = '504'
+    message['message'] = 'Сервер не ответил за ' + str(rpc_timeout) + ' с'
+    return message
+
+
+def print_stream(client_data):
+    """
+    Метод для отображения строк потокового ответа сервера по мере их получения\r\n
+    Параметры:\r\n
+        client_data: словарь данных от клиента\r\n
+    Возвращаемое значение:\r\n
+        словарь с ответом сервера\r\n
+    """
+    stream = rpc_client.stream(client_data, timeout=rpc_timeout)
+    try:
+        for num, row in enumerate(stream):
+            if num == 0:
+                cprint("=" * 35, 'green')
+            print_row(client_data, row)
+        message = stream.reply
+    except TimeoutError:
+        message = timeout_message(client_data)
+    message.pop('stream', None)
+    message.pop('stream_rows', None)
+    message.pop('stream_chunks', None)
+    cprint(message['message'], 'green' if message['status'] == '200' else 'red')
     return message
 
 
@@ -174,12 +374,15 @@ def print_content(client_data):
         password = client_data['content']['Password']
         client_data['content']['Password'] = hashlib.sha256(password.encode()).hexdigest()
 
-    client_data = send_and_receive(client_data)
-    if client_data['status'] == '200':
-        cprint(client_data['message'], 'green')
-        print_client_data_fields(client_data)
+    if client_data.pop('stream', False) or client_data['action'] in stream_actions:
+        client_data = print_stream(client_data)
     else:
-        cprint(client_data['message'], 'red')
+        client_data = send_and_receive(client_data)
+        if client_data['status'] == '200':
+            cprint(client_data['message'], 'green')
+            print_client_data_fields(client_data)
+        else:
+            cprint(client_data['message'], 'red')
     del(client_data['message'])
     del(client_data['status'])
     return client_data
@@ -208,26 +411,39 @@ def print_client_data_fields(client_data):
     """
     if client_data['content']:
         cprint("=" * 35, 'green')
-        for num in range(len(client_data['content'])):
-            if client_data['action'] == 'get_favorites':
-                print(fields_dict['favorites']['CarId'] + ': ' + client_data['content'][num]['CarId'])
-            else:
-                for field in fields_dict[client_data['endpoint']]:
-                    if field == 'Password':
-                        continue
-                    a = client_data['content'][num][field]
-                    if field in car_values_list:
-                        print(fields_dict[client_data['endpoint']][field] + ': ' + car_values_list[field][a])
-                    else:
-                        if field in order_status_dict:
-                            print(fields_dict[client_data['endpoint']][field] + ': ' + order_status_dict[field][a])
-                        else:
-                            print(fields_dict[client_data['endpoint']][field] + ': ' + str(a))
-
-            cprint("=" * 35, 'green')
+        for row in client_data['content']:
+            print_row(client_data, row)
     else:
         return
 
+
+def print_row(client_data, row):
+    """
+    Метод для вывода одной строки ответа сервера\r\n
+    Параметры:\r\n
+        client_data: словарь данных от клиента (endpoint и action определяют набор полей)\r\n
+        row: словарь строки\r\n
+    """
+    if client_data['action'] == 'get_favorites':
+        print(fields_dict['favorites']['CarId'] + ': ' + row['CarId'])
+    elif client_data['action'] == 'quote':
+        for field in fields_dict['quotes']:
+            print(fields_dict['quotes'][field] + ': ' + str(row[field]))
+    else:
+        for field in fields_dict[client_data['endpoint']]:
+            if field == 'Password':
+                continue
+            a = row[field]
+            if field in car_values_list:
+                print(fields_dict[client_data['endpoint']][field] + ': ' + car_values_list[field][a])
+            else:
+                if field in order_status_dict:
+                    print(fields_dict[client_data['endpoint']][field] + ': ' + order_status_dict[field][a])
+                else:
+                    print(fields_dict[client_data['endpoint']][field] + ': ' + str(a))
+
+    cprint("=" * 35, 'green')
+
 def check_id():
     """Метод для проверки корректности введенного идентификатора"""
     choice = int(input())
@@ -235,7 +451,33 @@ def check_id():
 ###########CAR###############################################
 def get_cars(client_data):
     """
-    Метод для получения списка автомобилей определенной категории\r\n
+    Метод для получения списка автомобилей определенной категории постранично или всей категории
+    потоковым ответом (без страниц)\r\n
+    Параметры:\r\n
+        client_data: словарь данных от клиента\r\n
+    Возвращаемое значение:\r\n
+        client_data: словарь данных от клиента\r\n
+    """
+    print('Введите ' + fields_dict[client_data['endpoint']]['CategoryID'])
+    client_data['content'] = {}
+    category_id = client_data['content']['CategoryID'] = check_id()
+    print('Введите 1 чтобы показать всю категорию сразу, 0 - чтобы показывать по страницам')
+    if input() == '1':
+        client_data['stream'] = True  # ответ без страниц, next_page не возвращается
+    client_data = print_content(client_data)
+    while client_data.get('next_page'):
+        print('Введите 1 чтобы показать следующую страницу, 0 - чтобы вернуться в меню')
+        if input() != '1':
+            break
+        client_data['content'] = dict(client_data['next_page'], CategoryID=category_id)
+        client_data = print_content(client_data)
+    client_data.pop('next_page', None)
+    return client_data
+
+
+def get_free_cars(client_data):
+    """
+    Метод для получения списка свободных на даты аренды автомобилей определенной категории\r\n
     Параметры:\r\n
         client_data: словарь данных от клиента\r\n
     Возвращаемое значение:\r\n
@@ -243,8 +485,42 @@ def get_cars(client_data):
     """
     print('Введите ' + fields_dict[client_data['endpoint']]['CategoryID'])
     client_data['content'] = {}
-    client_data['content']['CategoryID'] = check_id()
+    category_id = client_data['content']['CategoryID'] = check_id()
+    print('Введите дату начала аренды в формате дд-мм-гггг')
+    date_start = client_data['content']['DateStartContract'] = input()
+    print('Введите дату конца аренды в формате дд-мм-гггг')
+    date_end = client_data['content']['DateEndContract'] = input()
     client_data = print_content(client_data)
+    while client_data.get('next_page'):
+        print('Введите 1 чтобы показать следующую страницу, 0 - чтобы вернуться в меню')
+        if input() != '1':
+            break
+        client_data['content'] = dict(client_data['next_page'], CategoryID=category_id,
+                                      DateStartContract=date_start, DateEndContract=date_end)
+        client_data = print_content(client_data)
+    client_data.pop('next_page', None)
+    return client_data
+
+
+def search(client_data):
+    """
+    Метод для полнотекстового поиска автомобилей\r\n
+    Параметры:\r\n
+        client_data: словарь данных от клиента\r\n
+    Возвращаемое значение:\r\n
+        client_data: словарь данных от клиента\r\n
+    """
+    print('Введите слова для поиска')
+    client_data['content'] = {}
+    query = client_data['content']['query'] = input()
+    client_data = print_content(client_data)
+    while client_data.get('next_page'):
+        print('Введите 1 чтобы показать следующую страницу, 0 - чтобы вернуться в меню')
+        if input() != '1':
+            break
+        client_data['content'] = dict(client_data['next_page'], query=query)
+        client_data = print_content(client_data)
+    client_data.pop('next_page', None)
     return client_data
 
 
@@ -400,6 +676,27 @@ def add_order(client_data):
     return client_data
 
 
+def quote(client_data):
+    """
+    Метод для расчета стоимости аренды нескольких автомобилей без создания заявок\r\n
+    Параметры:\r\n
+        client_data: словарь данных от клиента\r\n
+    Возвращаемое значение:\r\n
+        client_data: словарь данных от клиента\r\n
+    """
+    client_data['content'] = {'items': []}
+    print('Введите дату начала аренды в формате дд-мм-гггг')
+    date_start = input()
+    print('Введите дату конца аренды в формате дд-мм-гггг')
+    date_end = input()
+    print('Введите Id авто через пробел')
+    for car_id in input().split():
+        client_data['content']['items'].append({'CarId': car_id, 'DateStartContract': date_start,
+                                                'DateEndContract': date_end})
+    client_data = print_content(client_data)
+    return client_data
+
+
 def get_order(client_data):
     """
     Метод для получения информации о заявке\r\n
@@ -475,4 +772,29 @@ def get_favorites(client_data):
     return client_data
 ###########Favorite###############################################
 
+
+def overview(client_data):
+    """
+    Метод для получения личной информации, заявок и избранного одним пакетом запросов\r\n
+    Параметры:\r\n
+        client_data: словарь данных от клиента\r\n
+    Возвращаемое значение:\r\n
+        client_data: словарь данных от клиента\r\n
+    """
+    client_data = send_batch(client_data, [{'endpoint': 'clients', 'action': 'get_client'},
+                                           {'endpoint': 'orders', 'action': 'get_orders'},
+                                           {'endpoint': 'clients', 'action': 'get_favorites'}])
+    if client_data['status'] == '200':
+        for item in client_data['content']:
+            if item['status'] == '200':
+                cprint(item['message'], 'green')
+                print_client_data_fields(item)
+            else:
+                cprint(item['message'], 'red')
+    else:
+        cprint(client_data['message'], 'red')
+    del(client_data['message'])
+    del(client_data['status'])
+    return client_data
+
 launch_client()
@@ -0,0 +1,262 @@
+u"""
+Модуль форматов сообщений между клиентом и сервером\r\n
+Формат тела сообщения задается свойством content_type сообщения AMQP: application/msgpack
+(даты и decimal.Decimal передаются расширенными типами msgpack) или application/json.
+Сообщения без content_type и с неизвестным content_type считаются JSON.
+Тело может быть сжато zlib (content_encoding: deflate), если получатель указал поддержку
+в заголовке accept_encoding. Класс запроса (очередь чтения или записи) определяется здесь же,
+чтобы клиент и сервер использовали один набор действий записи\r\n
+"""
+import datetime
+import decimal
+import json
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # без msgpack клиент и сервер обмениваются только JSON
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+DEFLATE = 'deflate'
+
+EXT_DATE = 1  # дата: порядковый номер дня (date.toordinal), 4 байта
+EXT_DATETIME = 2  # дата и время: строка isoformat
+EXT_DECIMAL = 3  # decimal.Decimal: строка str(value)
+
+WRITE_ACTIONS = {  # (endpoint, action) действий, изменяющих БД
+    ('clients', 'sign_up'), ('clients', 'sign_in'), ('clients', 'del_client'), ('clients', 'edit_pass'),
+    ('clients', 'edit_client'), ('clients', 'add_favorite'), ('clients', 'del_favorite'), ('orders', 'add_order')
+}
+WRITE_ENDPOINTS = {'admin'}  # массовый импорт и экспорт не занимают обработчиков очереди чтения
+
+
+def request_class(message):
+    """
+    Метод для определения класса запроса: write - действие изменяет БД (WRITE_ACTIONS, WRITE_ENDPOINTS),
+    read - только чтение. Пакет batch относится к записи, если в нем есть запрос записи\r\n
+    Параметры:\r\n
+        message: словарь запроса (endpoint, action, content)\r\n
+    Возвращаемое значение:\r\n
+        ключ маршрутизации очереди запроса: read или write\r\n
+    """
+    endpoint = message.get('endpoint')
+    if endpoint == 'batch':
+        items = (message.get('content') or {}).get('items') or []
+        return 'write' if any(request_class(item) == 'write' for item in items if isinstance(item, dict)) else 'read'
+    return 'write' if endpoint in WRITE_ENDPOINTS or (endpoint, message.get('action')) in WRITE_ACTIONS else 'read'
+
+
+def negotiate(content_type):
+    """
+    Метод для выбора формата ответа по формату запроса\r\n
+    Параметры:\r\n
+        content_type: content_type запроса\r\n
+    Возвращаемое значение:\r\n
+        MSGPACK, если клиент прислал msgpack и он установлен, иначе JSON\r\n
+    """
+    return MSGPACK if content_type == MSGPACK and msgpack is not None else JSON
+
+
+def msgpack_default(value):
+    """Метод для упаковки типов, которых нет в msgpack"""
+    if isinstance(value, datetime.datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, datetime.date):
+        return msgpack.ExtType(EXT_DATE, struct.pack('>I', value.toordinal()))
+    if isinstance(value, decimal.Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode())
+    return str(value)  # как default=str в JSON
+
+
+def msgpack_ext_hook(code, data):
+    """Метод для распаковки расширенных типов msgpack"""
+    if code == EXT_DATE:
+        return datetime.date.fromordinal(struct.unpack('>I', data)[0])
+    if code == EXT_DATETIME:
+        return datetime.datetime.fromisoformat(data.decode())
+    if code == EXT_DECIMAL:
+        return decimal.Decimal(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def encode_message(message, content_type=JSON):
+    """
+    Метод для кодирования сообщения\r\n
+    Параметры:\r\n
+        message: словарь сообщения\r\n
+        content_type: формат (JSON или MSGPACK)\r\n
+    Возвращаемое значение:\r\n
+        тело сообщения\r\n
+    """
+    if content_type == MSGPACK:
+        return msgpack.packb(message, default=msgpack_default, use_bin_type=True)
+    return json.dumps(message, ensure_ascii=False, default=str).encode()  # default=str - даты и Decimal строками
+
+
+def decode_message(body, content_type=None):
+    """
+    Метод для декодирования сообщения\r\n
+    Параметры:\r\n
+        body: тело сообщения\r\n
+        content_type: content_type сообщения (None - JSON)\r\n
+    Возвращаемое значение:\r\n
+        словарь сообщения\r\n
+    """
+    if content_type == MSGPACK:
+        return msgpack.unpackb(body, ext_hook=msgpack_ext_hook, raw=False, strict_map_key=False)
+    return json.loads(body)
+
+
+def add_field(body, content_type, name, value):
+    """
+    Метод для добавления поля в начало уже закодированного словаря без повторного кодирования\r\n
+    Параметры:\r\n
+        body: закодированный словарь\r\n
+        content_type: формат body\r\n
+        name, value: имя и значение поля\r\n
+    """
+    if content_type != MSGPACK:
+        return b'{' + json.dumps(name).encode() + b': ' + json.dumps(value, ensure_ascii=False).encode() + \
+            (b', ' + body[1:] if body[1:2] != b'}' else body[1:])
+    first = body[0]
+    if 0x80 <= first <= 0x8f:  # fixmap
+        size, rest = first & 0x0f, body[1:]
+    elif first == 0xde:  # map 16
+        size, rest = struct.unpack('>H', body[1:3])[0], body[3:]
+    else:  # map 32
+        size, rest = struct.unpack('>I', body[1:5])[0], body[5:]
+    size += 1
+    if size <= 0x0f:
+        header = bytes([0x80 | size])
+    elif size <= 0xffff:
+        header = b'\xde' + struct.pack('>H', size)
+    else:
+        header = b'\xdf' + struct.pack('>I', size)
+    return header + msgpack.packb(name, use_bin_type=True) + \
+        msgpack.packb(value, default=msgpack_default, use_bin_type=True) + rest
+
+
+def join_items(items, content_type):
+    """
+    Метод для объединения закодированных элементов в закодированный список\r\n
+    Параметры:\r\n
+        items: список закодированных элементов\r\n
+        content_type: формат элементов\r\n
+    """
+    if content_type != MSGPACK:
+        return b'[' + b', '.join(items) + b']'
+    size = len(items)
+    if size <= 0x0f:
+        header = bytes([0x90 | size])  # fixarray
+    elif size <= 0xffff:
+        header = b'\xdc' + struct.pack('>H', size)
+    else:
+        header = b'\xdd' + struct.pack('>I', size)
+    return header + b''.join(items)
+
+
+def encode_chunks(rows, content_type, max_bytes):
+    """
+    Метод для кодирования строк частями ограниченного размера\r\n
+    Строки кодируются по одной по мере чтения итератора, в памяти находится не больше одной части\r\n
+    Параметры:\r\n
+        rows: итератор словарей строк\r\n
+        content_type: формат (JSON или MSGPACK)\r\n
+        max_bytes: размер части в байтах (часть из одной строки может быть больше)\r\n
+    Возвращаемое значение:\r\n
+        генератор закодированных списков строк\r\n
+    """
+    items, size = [], 0
+    for row in rows:
+        item = encode_message(row, content_type)
+        if items and size + len(item) > max_bytes:
+            yield join_items(items, content_type)
+            items, size = [], 0
+        items.append(item)
+        size += len(item) + 2
+    if items:
+        yield join_items(items, content_type)
+
+
+def accepts_deflate(headers):
+    """
+    Метод для проверки, поддерживает ли отправитель запроса сжатые ответы\r\n
+    Параметры:\r\n
+        headers: заголовки сообщения AMQP (может быть None)\r\n
+    """
+    return DEFLATE in str((headers or {}).get('accept_encoding') or '').split(',')
+
+
+def decompress(body, content_encoding=None):
+    """
+    Метод для распаковки тела сообщения\r\n
+    Параметры:\r\n
+        body: тело сообщения\r\n
+        content_encoding: content_encoding сообщения (None - без сжатия)\r\n
+    """
+    if content_encoding == DEFLATE:
+        return zlib.decompress(body)
+    if content_encoding:
+        raise ValueError('Сжатие ' + str(content_encoding) + ' не поддерживается')
+    return body
+
+
+class Compressor:
+    u"""
+    Сжатие тел сообщений zlib с порогом размера и статистикой\r\n
+    Сообщения меньше min_size и сообщения, которые не стали меньше после сжатия, отправляются как есть.
+    В статистике учитывается процессорное время потока, затраченное на сжатие, и сэкономленные байты\r\n
+    """
+    def __init__(self, min_size, level=1):
+        self.min_size = min_size
+        self.level = level
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_time = 0.0
+
+    def compress(self, body):
+        """
+        Метод для сжатия тела сообщения\r\n
+        Параметры:\r\n
+            body: тело сообщения\r\n
+        Возвращаемое значение:\r\n
+            (тело сообщения, content_encoding или None, если тело не сжато)\r\n
+        """
+        if not self.min_size or len(body) < self.min_size:
+            with self.lock:
+                self.messages += 1
+                self.bytes_in += len(body)
+                self.bytes_out += len(body)
+            return body, None
+        started = time.thread_time()
+        packed = zlib.compress(body, self.level)
+        spent = time.thread_time() - started
+        result = (packed, DEFLATE) if len(packed) < len(body) else (body, None)
+        with self.lock:
+            self.messages += 1
+            self.compressed += result[1] is not None
+            self.bytes_in += len(body)
+            self.bytes_out += len(result[0])
+            self.cpu_time += spent
+        return result
+
+    def stats(self):
+        """Метод для получения статистики сжатия"""
+        with self.lock:
+            return {
+                'messages': self.messages,
+                'compressed': self.compressed,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'bytes_saved': self.bytes_in - self.bytes_out,
+                'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else 1.0,
+                'cpu_ms': round(self.cpu_time * 1000, 1)
+            }
@@ -1,26 +1,55 @@
 u"""
 Модуль выполняющий роль сервера\r\n
-Для запуска сервера необходимо настроить конфигурационный файл config_server.yaml
+Для запуска сервера необходимо настроить конфигурационный файл config_server.yaml\r\n
+python Rabbit_server.py migrate - создать в существующей базе данных новые таблицы (архивные, сводки), индексы из моделей
+и полнотекстовый индекс (после создания таблиц сводок выполнить rebuild_reports)\r\n
+python Rabbit_server.py rebuild_reports - пересчитать дневные сводки компаний и автомобилей по всем заявкам\r\n
+python Rabbit_server.py archive [дней] - перенести в архивные таблицы строки, удаленные раньше archive_after_days дней\r\n
+python Rabbit_server.py explain - проверить планы запросов обработчиков (код возврата 1 при полном просмотре таблицы)\r\n
+python Rabbit_server.py import cars|companies|categories <файл.csv|файл.jsonl> - импортировать строки
+(код возврата 1, если часть строк пропущена)\r\n
+python Rabbit_server.py export cars|companies|categories <файл.csv|файл.jsonl> - выгрузить неудаленные строки
 """
+import asyncio
+import bisect
+import copy
+import csv
 import decimal
 import hashlib
+import hmac
+import operator
+import os
+import queue
+import re
 import struct
+import sys
 import threading
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from threading import Thread
 import yaml
-from sqlalchemy import create_engine, Integer, String, Column, Date, ForeignKey, Numeric, Boolean
+from sqlalchemy import create_engine, Integer, String, Column, Date, ForeignKey, Numeric, Boolean, and_, or_, event, Index, text, bindparam, table, column, DDL, \
+    Table, exists, select, literal, func, cast, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 import socket
 import json
-from sqlalchemy.orm import Session, relationship
+from sqlalchemy.orm import Session, relationship, object_session, column_property
 import logging.config
+import numpy as np
 import datetime
 import tarantool
 from sqlalchemy.orm import scoped_session
 from sqlalchemy.orm import sessionmaker
-from functools import wraps
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import OperationalError
+from functools import partial, wraps
 import pika
+import Rabbit_codec
+from pika.adapters.asyncio_connection import AsyncioConnection
 
 
 with open('config_server') as config_server:
@@ -32,18 +61,158 @@ logger = logging.getLogger('server')
 #########################################################################################
 
 
+class TarantoolSpace(threading.local):
+    u"""
+    Пространство user_token в Tarantool с отдельным соединением для каждого потока\r\n
+    Соединение создается при первом обращении из потока, все вызовы передаются пространству\r\n
+    """
+    def __init__(self):
+        self.connection = tarantool.connect(config['connection_string_tarantool_ip'],
+                                            config['connection_string_tarantool_port'])
+        self.space = self.connection.space('user_token')
+
+    def __getattr__(self, name):
+        return getattr(self.space, name)
+
+
+class TokenCache:
+    u"""
+    Локальный LRU-кэш токенов перед Tarantool\r\n
+    Хранит token -> (id клиента, время последнего обращения). Запись используется без обращения
+    к Tarantool, пока не пройдено окно обновления ttl_update, после чего токен снова проверяется
+    и продлевается в Tarantool\r\n
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token, time_now):
+        """
+        Метод для получения записи о токене из кэша\r\n
+        Параметры:\r\n
+            token: токен клиента\r\n
+            time_now: текущее время Unix-time\r\n
+        Возвращаемое значение:\r\n
+            (id клиента, время последнего обращения) или None, если записи нет или окно обновления пройдено\r\n
+        """
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is not None and time_now - entry[1] <= config['ttl_update']:
+                self.entries.move_to_end(token)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, token, person_id, last_seen):
+        """Метод для добавления записи о токене с вытеснением самой старой записи"""
+        with self.lock:
+            self.entries[token] = (person_id, last_seen)
+            self.entries.move_to_end(token)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, token):
+        """Метод для удаления записи о токене из кэша"""
+        with self.lock:
+            self.entries.pop(token, None)
+
+    def __contains__(self, token):
+        with self.lock:
+            return token in self.entries
+
+    def stats(self):
+        """Метод для получения статистики кэша"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+def create_db_engine(pool_size, max_overflow, pragmas, savepoints=False):
+    """
+    Метод для создания движка БД с пулом соединений\r\n
+    Для SQLite при каждом новом соединении выполняются PRAGMA из pragmas\r\n
+    Параметры:\r\n
+        pool_size: число постоянных соединений в пуле\r\n
+        max_overflow: число дополнительных соединений сверх pool_size\r\n
+        pragmas: словарь PRAGMA имя -> значение\r\n
+        savepoints: управлять транзакциями SQLite самостоятельно, чтобы работали SAVEPOINT.
+            Транзакция начинается с BEGIN IMMEDIATE: блокировка записи берётся сразу и ожидает
+            busy_timeout, а не падает с "database is locked" при переходе от чтения к записи\r\n
+    """
+    sqlite = config['connection_string'].startswith('sqlite')
+    engine = create_engine(config['connection_string'], poolclass=QueuePool,
+                           pool_size=pool_size, max_overflow=max_overflow,
+                           connect_args={'check_same_thread': False} if sqlite else {})
+    if sqlite:
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute('PRAGMA ' + name + ' = ' + str(value))
+            cursor.close()
+            if savepoints:
+                dbapi_connection.isolation_level = None  # pysqlite не начинает транзакции сам
+
+        event.listen(engine, 'connect', set_pragmas)
+        if savepoints:
+            event.listen(engine, 'begin', lambda conn: conn.exec_driver_sql('BEGIN IMMEDIATE'))
+    return engine
+
+
+class RoutingSession(Session):
+    u"""
+    Сессия, направляющая запросы обработчиков чтения (request_context.read_only)
+    в отдельный пул соединений только для чтения, а остальные - в пул записи.
+    Внутри пакета запросов в одной транзакции (request_context.batch_transaction) все запросы
+    выполняются в пуле записи, чтобы чтение видело незафиксированные изменения пакета\r\n
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if getattr(request_context, 'read_only', False) and not self._flushing and \
+                not getattr(request_context, 'batch_transaction', False):
+            return read_engine
+        return db_engine
+
+
+def declare_request_queues(channel):  # pragma: no cover
+    """
+    Метод для объявления direct exchange запросов и очередей классов запросов (read, write)\r\n
+    Параметры:\r\n
+        channel: канал блокирующего соединения с RabbitMQ\r\n
+    """
+    channel.exchange_declare(exchange=config['request_exchange'], exchange_type='direct')
+    for queue_class, settings in config['request_queues'].items():
+        channel.queue_declare(queue=settings['queue'], arguments=request_queue_arguments())
+        channel.queue_bind(queue=settings['queue'], exchange=config['request_exchange'], routing_key=queue_class)
+
+
+def request_queue_arguments():
+    """Метод для получения аргументов объявления очередей запросов (приоритеты сообщений)"""
+    return {'x-max-priority': config['queue_max_priority']} if config['queue_max_priority'] else None
+
 
 try:
     connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
     channel = connection.channel()
-    channel.queue_declare(queue='server_queue')
-    connection_tarantool = tarantool.connect(config['connection_string_tarantool_ip'],
-                                             config['connection_string_tarantool_port'])
-    tarantool_space = connection_tarantool.space('user_token')
-    db_engine = create_engine(config['connection_string'])
-    db_engine.connect()
+    declare_request_queues(channel)
+    tarantool_space = TarantoolSpace()
+    connection_tarantool = tarantool_space.connection
+    db_engine = create_db_engine(config['db_pool_size'], config['db_max_overflow'], config['sqlite_pragmas'],
+                                 savepoints=True)
+    db_engine.connect().close()
+    read_engine = create_db_engine(config['db_read_pool_size'], config['db_read_max_overflow'],
+                                   dict(config['sqlite_pragmas'], query_only='ON'))
+    read_engine.connect().close()
     Base = declarative_base()
-    session_factory = sessionmaker(bind=db_engine)
+    session_factory = sessionmaker(bind=db_engine, class_=RoutingSession)
     session = scoped_session(session_factory)
 except tarantool.error.NetworkError:
     logger.error('Tarantool не подключен!!')
@@ -55,18 +224,146 @@ except Exception as e:
     logger.error(e)
     exit()
 
+class ResponseCache:
+    u"""
+    LRU-кэш закодированных ответов на запросы чтения каталога\r\n
+    Запись хранит версии таблиц, из которых построен ответ, и становится недействительной
+    после фиксации изменения любой строки этих таблиц. Изменения, сделанные другими процессами
+    или напрямую в БД, кэш не отслеживает, кроме импорта командой import (см. reload_thread)\r\n
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # ключ -> (версии таблиц, тело ответа)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.memory = 0
+
+    def get(self, key, versions):
+        """Метод для получения тела ответа, построенного при тех же версиях таблиц"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, versions, body):
+        """Метод для добавления тела ответа с вытеснением самой старой записи"""
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.memory -= len(key) + len(old[1])
+            self.entries[key] = (versions, body)
+            self.memory += len(key) + len(body)
+            while len(self.entries) > self.max_size:
+                old_key, old = self.entries.popitem(last=False)
+                self.memory -= len(old_key) + len(old[1])
+
+    def stats(self):
+        """Метод для получения статистики кэша"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'memory_bytes': self.memory,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+class CachedReply:
+    u"""
+    Ответ, уже закодированный без токена клиента\r\n
+    Токен добавляется при отправке, поэтому один ответ из кэша подходит всем клиентам\r\n
+    """
+    def __init__(self, body, token=None, content_type=Rabbit_codec.JSON):
+        self.body = body
+        self.token = token
+        self.content_type = content_type
+
+    def encode(self):
+        """Метод для получения тела сообщения с токеном клиента"""
+        if self.token is None:
+            return self.body
+        return Rabbit_codec.add_field(self.body, self.content_type, 'token', self.token)
+
+
 salt = config['salt']
+token_cache = TokenCache(config['token_cache_size'])
+response_cache = ResponseCache(config['response_cache_size'])
+table_versions = {}  # имя таблицы -> номер версии, увеличивается при фиксации изменений
+table_versions_lock = threading.Lock()
+request_context = threading.local()  # данные текущего запроса в потоке обработчика
 
 
 #########################################################################################
-def object_to_dict(obj):
-    """
-    Метод для преобразования объекта класса в словарь\r\n
-    Параметры:\r\n
-        obj: объект какого-либо класса\r\n
+class Serializer:
+    u"""
+    Сериализатор строк модели в словарь, собираемый один раз для каждой модели\r\n
+    Список колонок и функции преобразования Date и Numeric в строки определяются при создании,
+    поэтому при сериализации не нужен обход __table__.columns и default=str в json.dumps.
+    Для ответов в msgpack значения не преобразуются\r\n
+    Атрибуты\r\n
+    ---\r\n
+    fields (tuple): имена выводимых колонок\r\n
+    columns (list): колонки модели для запроса только выводимых полей\r\n
+    ---
     """
-    return {x.name: getattr(obj, x.name)
-            for x in obj.__table__.columns}
+    def __init__(self, model, include=None, exclude=()):
+        columns = [x for x in model.__table__.columns
+                   if (include is None or x.name in include) and x.name not in exclude]
+        self.fields = tuple(x.name for x in columns)
+        self.columns = [getattr(model, name) for name in self.fields]
+        self.getter = operator.attrgetter(*self.fields) if len(self.fields) > 1 else \
+            (lambda obj, name=self.fields[0]: (getattr(obj, name),))
+        self.converters = tuple((x.name, date_to_str if isinstance(x.type, Date) else str)
+                                for x in columns if isinstance(x.type, (Date, Numeric)))
+        self.row_getter = (None, None)  # (метаданные результата запроса, itemgetter позиций полей в строке)
+
+    def values(self, obj):
+        """
+        Метод для получения значений полей в порядке fields\r\n
+        У строки запроса значения берутся по позициям колонок: обращение к атрибутам Row в SQLAlchemy 1.4
+        на порядок медленнее. Позиции вычисляются один раз для результата запроса\r\n
+        """
+        if not isinstance(obj, Row):
+            return self.getter(obj)
+        parent, getter = self.row_getter
+        if parent is not obj._parent:
+            keys = list(obj._parent.keys)
+            if not all(name in keys for name in self.fields):
+                return self.getter(obj)
+            positions = [keys.index(name) for name in self.fields]
+            getter = operator.itemgetter(*positions) if len(positions) > 1 else \
+                (lambda row, position=positions[0]: (row[position],))
+            self.row_getter = (obj._parent, getter)
+        return getter(obj)
+
+    def to_dict(self, obj, content_type=None):
+        """
+        Метод для преобразования объекта модели или строки запроса в словарь\r\n
+        Параметры:\r\n
+            obj: объект модели или строка запроса с атрибутами fields\r\n
+            content_type: формат ответа (по умолчанию формат текущего запроса)\r\n
+        """
+        result = dict(zip(self.fields, self.values(obj)))
+        if (content_type or getattr(request_context, 'content_type', Rabbit_codec.JSON)) == Rabbit_codec.MSGPACK:
+            return result  # даты и Decimal передаются расширенными типами msgpack
+        for name, converter in self.converters:
+            value = result[name]
+            if value is not None:
+                result[name] = converter(value)
+        return result
+
+
+def date_to_str(value):
+    """Метод для преобразования даты в строку в том же виде, что и str(date)"""
+    return value.isoformat() if type(value) is datetime.date else str(value)
 
 #########################################################################################
 def dict_to_object(obj, dict):
@@ -81,6 +378,460 @@ def dict_to_object(obj, dict):
             setattr(obj, x.name, dict[x.name])
     return obj
 
+#########################################################################################
+# запросы обработчиков для проверки планов (explain_queries): имя -> функция без параметров, строящая запрос
+# с примерными значениями. Запрос регистрируется рядом с кодом, который его выполняет
+explained_queries = {}
+
+car_facet_fields = ('Transmission', 'Engine', 'Car_type', 'Drive')  # фильтры по точному значению
+car_range_fields = ('Year', 'Price', 'Power')  # фильтры по диапазону: <поле>_min, <поле>_max
+car_sort_fields = ('Id', 'Price', 'Year', 'Power')
+
+
+def catalog_query(content):
+    """
+    Метод для построения запроса каталога автомобилей категории с фильтрами и keyset-пагинацией\r\n
+    Параметры:\r\n
+        content: словарь с параметрами запроса (CategoryID, фильтры, order_by, desc, after_id, after_value)\r\n
+    Возвращаемое значение:\r\n
+        запрос SQLAlchemy, отсортированный по order_by и Id\r\n
+    """
+    query = session.query(*car_serializer.columns).filter(Car.CategoryID == int(content['CategoryID']), Car.DateDel == None)
+    for field in car_facet_fields:
+        if content.get(field) is not None:
+            query = query.filter(getattr(Car, field) == int(content[field]))
+    for field in car_range_fields:
+        if content.get(field + '_min') is not None:
+            query = query.filter(getattr(Car, field) >= int(content[field + '_min']))
+        if content.get(field + '_max') is not None:
+            query = query.filter(getattr(Car, field) <= int(content[field + '_max']))
+
+    order_by = content.get('order_by') or 'Id'
+    if order_by not in car_sort_fields:
+        raise ValueError('Сортировка по полю ' + str(order_by) + ' не поддерживается')
+    sort_column = getattr(Car, order_by)
+    desc = bool(content.get('desc'))
+    if content.get('after_id') is not None:
+        after_id = int(content['after_id'])
+        if order_by == 'Id':
+            query = query.filter(Car.Id < after_id if desc else Car.Id > after_id)
+        else:
+            after_value = int(content['after_value'])
+            if desc:
+                query = query.filter(or_(sort_column < after_value, and_(sort_column == after_value, Car.Id < after_id)))
+            else:
+                query = query.filter(or_(sort_column > after_value, and_(sort_column == after_value, Car.Id > after_id)))
+    if desc:
+        return query.order_by(sort_column.desc(), Car.Id.desc())
+    return query.order_by(sort_column, Car.Id)
+
+
+class CarCatalogIndex:
+    u"""
+    Колоночный индекс каталога в памяти на основе NumPy\r\n
+    Хранит целочисленные атрибуты неудаленных автомобилей в отдельных массивах и отвечает на запросы
+    каталога векторными масками вместо запросов к БД. Пустые значения хранятся как -1\r\n
+    """
+    columns = ('Id', 'CategoryID') + car_facet_fields + ('Wheel_drive',) + car_range_fields
+    key_shift = 2 ** 31  # составной ключ сортировки: значение * key_shift + Id
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.size = 0
+        self.data = {name: np.empty(0, dtype=np.int64) for name in self.columns}
+        self.alive = np.empty(0, dtype=bool)
+        self.positions = {}  # Id -> номер строки в массивах
+
+    def load(self, rows):
+        """
+        Метод для загрузки индекса\r\n
+        Параметры:\r\n
+            rows: кортежи значений в порядке CarCatalogIndex.columns\r\n
+        """
+        table = np.array([[-1 if value is None else value for value in row] for row in rows],
+                         dtype=np.int64).reshape(-1, len(self.columns))
+        with self.lock:
+            self.size = len(table)
+            capacity = max(self.size, 1024)
+            self.data = {}
+            for number, name in enumerate(self.columns):
+                self.data[name] = np.full(capacity, -1, dtype=np.int64)
+                self.data[name][:self.size] = table[:, number]
+            self.alive = np.zeros(capacity, dtype=bool)
+            self.alive[:self.size] = True
+            self.positions = {int(car_id): pos for pos, car_id in enumerate(table[:, 0])}
+
+    def upsert(self, values):
+        """
+        Метод для добавления или обновления автомобиля в индексе\r\n
+        Параметры:\r\n
+            values: словарь значений полей CarCatalogIndex.columns\r\n
+        """
+        with self.lock:
+            pos = self.positions.get(values['Id'])
+            if pos is None:
+                if self.size == len(self.alive):
+                    capacity = max(2 * self.size, 1024)
+                    for name in self.columns:
+                        column = np.full(capacity, -1, dtype=np.int64)
+                        column[:self.size] = self.data[name][:self.size]
+                        self.data[name] = column
+                    alive = np.zeros(capacity, dtype=bool)
+                    alive[:self.size] = self.alive[:self.size]
+                    self.alive = alive
+                pos = self.positions[values['Id']] = self.size
+                self.size += 1
+            for name in self.columns:
+                self.data[name][pos] = -1 if values[name] is None else values[name]
+            self.alive[pos] = True
+
+    def remove(self, car_id):
+        """Метод для исключения автомобиля из индекса"""
+        with self.lock:
+            pos = self.positions.get(car_id)
+            if pos is not None:
+                self.alive[pos] = False
+
+    def search(self, content, limit):
+        """
+        Метод для поиска автомобилей в индексе\r\n
+        Параметры:\r\n
+            content: словарь с параметрами запроса (те же, что у catalog_query)\r\n
+            limit: максимальное количество id в ответе\r\n
+        Возвращаемое значение:\r\n
+            (car_ids, facets): id автомобилей страницы в порядке сортировки и количество
+            подходящих автомобилей по значениям каждого фильтра\r\n
+        """
+        order_by = content.get('order_by') or 'Id'
+        if order_by not in car_sort_fields:
+            raise ValueError('Сортировка по полю ' + str(order_by) + ' не поддерживается')
+        desc = bool(content.get('desc'))
+        with self.lock:
+            column = {name: self.data[name][:self.size] for name in self.columns}
+            mask = self.alive[:self.size] & (column['CategoryID'] == int(content['CategoryID']))
+            for field in car_facet_fields:
+                if content.get(field) is not None:
+                    mask &= column[field] == int(content[field])
+            for field in car_range_fields:
+                if content.get(field + '_min') is not None:
+                    mask &= column[field] >= int(content[field + '_min'])
+                if content.get(field + '_max') is not None:
+                    mask &= column[field] <= int(content[field + '_max'])
+
+            facets = {}
+            for field in car_facet_fields:
+                values, counts = np.unique(column[field][mask], return_counts=True)
+                facets[field] = {int(value): int(count) for value, count in zip(values, counts)}
+
+            keys = column[order_by] * self.key_shift + column['Id']
+            if content.get('after_id') is not None:
+                after_value = content['after_id'] if order_by == 'Id' else content['after_value']
+                after_key = int(after_value) * self.key_shift + int(content['after_id'])
+                mask &= keys < after_key if desc else keys > after_key
+            rows = np.flatnonzero(mask)
+            page_keys = -keys[rows] if desc else keys[rows]
+            if len(rows) > limit:
+                top = np.argpartition(page_keys, limit)[:limit]
+                rows, page_keys = rows[top], page_keys[top]
+            car_ids = column['Id'][rows[np.argsort(page_keys)]]
+        return [int(car_id) for car_id in car_ids], facets
+
+    def cursor(self, car_id, content):
+        """
+        Метод для получения курсора страницы, следующей за автомобилем индекса\r\n
+        Параметры:\r\n
+            car_id: id последнего автомобиля, найденного search\r\n
+            content: словарь с параметрами запроса (order_by)\r\n
+        Возвращаемое значение:\r\n
+            словарь с after_id и after_value или None, если автомобиля уже нет в индексе\r\n
+        """
+        order_by = content.get('order_by') or 'Id'
+        with self.lock:
+            pos = self.positions.get(car_id)
+            if pos is None or not self.alive[pos]:
+                return None
+            return {'after_id': car_id, 'after_value': int(self.data[order_by][pos])}
+
+
+catalog_index = CarCatalogIndex()
+
+def car_page_query(car_ids):
+    """Метод для построения запроса строк неудаленных автомобилей страницы, найденной индексом каталога"""
+    return session.query(*car_serializer.columns).filter(Car.Id.in_(car_ids), Car.DateDel == None)
+
+
+def index_page(content, limit):
+    """
+    Метод для получения страницы автомобилей, найденной индексом каталога\r\n
+    Индекс обновляется после фиксации, поэтому автомобиль, удаленный в другом потоке, может еще быть
+    в индексе, но уже не найтись в БД. Такие автомобили отбрасываются, а страница дополняется
+    следующими автомобилями индекса, чтобы она не оказалась короче limit при наличии продолжения\r\n
+    Параметры:\r\n
+        content: словарь с параметрами запроса (те же, что у catalog_query)\r\n
+        limit: количество строк страницы\r\n
+    Возвращаемое значение:\r\n
+        (cars, facets): строки автомобилей в порядке сортировки и количество автомобилей по значениям фильтров\r\n
+    """
+    requested = limit
+    car_ids, facets = catalog_index.search(content, requested)
+    cars = []
+    while True:
+        cars_by_id = {car.Id: car for car in car_page_query(car_ids)}
+        cars.extend(cars_by_id[car_id] for car_id in car_ids if car_id in cars_by_id)
+        if len(cars) >= limit or len(car_ids) < requested:  # страница заполнена или индекс исчерпан
+            return cars, facets
+        cursor = catalog_index.cursor(car_ids[-1], content)
+        if cursor is None:
+            return cars, facets
+        requested = limit - len(cars)
+        car_ids = catalog_index.search(dict(content, **cursor), requested)[0]
+
+
+explained_queries['get_cars'] = lambda: catalog_query({'CategoryID': 1}).limit(10)
+explained_queries['get_cars (order_by Price)'] = lambda: catalog_query(
+    {'CategoryID': 1, 'order_by': 'Price', 'after_id': 1, 'after_value': 1}).limit(10)
+explained_queries['get_cars (catalog_index)'] = lambda: car_page_query([1, 2])
+explained_queries['get_free_cars'] = lambda: catalog_query(
+    {'CategoryID': 1, 'DateStartContract': '01-01-2030', 'DateEndContract': '05-01-2030'})
+
+
+def orders_query(client_id):
+    """
+    Метод для построения запроса заявок клиента вместе с названием автомобиля одним JOIN\r\n
+    Параметры:\r\n
+        client_id: id клиента\r\n
+    Возвращаемое значение:\r\n
+        запрос SQLAlchemy, выбирающий колонки Contract и Car.Brand_and_name\r\n
+    """
+    return session.query(*Contract.__table__.columns, Car.Brand_and_name)\
+        .join(Car, Contract.CarId == Car.Id)\
+        .filter(Contract.ClientId == client_id, Contract.DateDel == None)
+
+
+explained_queries['get_order'] = lambda: orders_query(1).filter(Contract.Id == 1)
+explained_queries['get_orders'] = lambda: orders_query(1).order_by(Contract.Id)
+
+
+def order_to_dict(row):
+    """
+    Метод для преобразования строки запроса orders_query в словарь заявки\r\n
+    Параметры:\r\n
+        row: строка запроса orders_query\r\n
+    """
+    order = contract_serializer.to_dict(row)
+    order['CarId'] = row.Brand_and_name + ': id ' + str(row.CarId)
+    return order
+
+
+class AvailabilityIndex:
+    u"""
+    Индекс занятости автомобилей по активным заявкам\r\n
+    Для каждого автомобиля хранит интервалы аренды [начало, конец), отсортированные по началу,
+    и префиксный максимум концов, поэтому проверка пересечения выполняется бинарным поиском\r\n
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cars = {}  # CarId -> (starts, ends, contract_ids, max_ends)
+        self.contracts = {}  # Id заявки -> CarId
+
+    def load(self, rows):
+        """
+        Метод для загрузки индекса\r\n
+        Параметры:\r\n
+            rows: кортежи (Id заявки, CarId, дата начала, дата окончания)\r\n
+        """
+        with self.lock:
+            self.cars = {}
+            self.contracts = {}
+            for contract_id, car_id, start, end in sorted(rows, key=lambda row: (row[1], row[2])):
+                self.add_locked(contract_id, car_id, start.toordinal(), end.toordinal())
+
+    def add_locked(self, contract_id, car_id, start, end):
+        """Метод для добавления интервала заявки (вызывается под self.lock)"""
+        starts, ends, contract_ids, max_ends = self.cars.setdefault(car_id, ([], [], [], []))
+        pos = bisect.bisect_right(starts, start)
+        starts.insert(pos, start)
+        ends.insert(pos, end)
+        contract_ids.insert(pos, contract_id)
+        max_ends.insert(pos, end)
+        self.update_max_ends(max_ends, ends, pos)
+        self.contracts[contract_id] = car_id
+
+    def remove_locked(self, contract_id):
+        """Метод для удаления интервала заявки (вызывается под self.lock)"""
+        car_id = self.contracts.pop(contract_id, None)
+        if car_id is None:
+            return
+        starts, ends, contract_ids, max_ends = self.cars[car_id]
+        pos = contract_ids.index(contract_id)
+        for values in (starts, ends, contract_ids, max_ends):
+            del values[pos]
+        self.update_max_ends(max_ends, ends, pos)
+
+    @staticmethod
+    def update_max_ends(max_ends, ends, pos):
+        """Метод для пересчета префиксного максимума концов интервалов начиная с pos"""
+        current = max_ends[pos - 1] if pos > 0 else None
+        for i in range(pos, len(ends)):
+            current = ends[i] if current is None else max(current, ends[i])
+            max_ends[i] = current
+
+    def is_free_locked(self, car_id, start, end):
+        """Метод для проверки, свободен ли автомобиль в интервале [start, end) (вызывается под self.lock)"""
+        intervals = self.cars.get(car_id)
+        if intervals is None:
+            return True
+        pos = bisect.bisect_left(intervals[0], end)  # интервалы с началом раньше end
+        return pos == 0 or intervals[3][pos - 1] <= start
+
+    def is_free(self, car_id, start, end):
+        """
+        Метод для проверки, свободен ли автомобиль\r\n
+        Параметры:\r\n
+            car_id: id автомобиля\r\n
+            start, end: даты начала и окончания аренды\r\n
+        """
+        with self.lock:
+            return self.is_free_locked(car_id, start.toordinal(), end.toordinal())
+
+    def reserve(self, contract_id, car_id, start, end):
+        """
+        Метод для атомарной проверки занятости и добавления интервала заявки\r\n
+        Возвращаемое значение:\r\n
+            True, если автомобиль свободен и интервал добавлен\r\n
+        """
+        with self.lock:
+            if not self.is_free_locked(car_id, start.toordinal(), end.toordinal()):
+                return False
+            self.add_locked(contract_id, car_id, start.toordinal(), end.toordinal())
+            return True
+
+    def upsert(self, contract_id, car_id, start, end):
+        """Метод для добавления или замены интервала заявки"""
+        with self.lock:
+            self.remove_locked(contract_id)
+            self.add_locked(contract_id, car_id, start.toordinal(), end.toordinal())
+
+    def remove(self, contract_id):
+        """Метод для удаления интервала заявки"""
+        with self.lock:
+            self.remove_locked(contract_id)
+
+
+availability_index = AvailabilityIndex()
+
+
+class CarPriceCache:
+    u"""
+    LRU-кэш тарифов автомобилей (Price, Percent, FixedRate) для расчета стоимости заявок\r\n
+    Отсутствующие в кэше автомобили загружаются одним запросом, запись удаляется
+    после фиксации изменения автомобиля\r\n
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # CarId -> (Price, Percent, FixedRate)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, car_ids):
+        """
+        Метод для получения тарифов автомобилей\r\n
+        Параметры:\r\n
+            car_ids: id автомобилей\r\n
+        Возвращаемое значение:\r\n
+            словарь CarId -> (Price, Percent, FixedRate), удаленные и несуществующие автомобили пропускаются\r\n
+        """
+        prices = {}
+        with self.lock:
+            for car_id in car_ids:
+                entry = self.entries.get(car_id)
+                if entry is not None:
+                    self.entries.move_to_end(car_id)
+                    prices[car_id] = entry
+            self.hits += len(prices)
+            self.misses += len(car_ids) - len(prices)
+        missing = [car_id for car_id in car_ids if car_id not in prices]
+        if missing:
+            rows = price_query(missing).all()
+            with self.lock:
+                for car_id, *entry in rows:
+                    prices[car_id] = self.entries[car_id] = tuple(entry)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return prices
+
+    def invalidate(self, car_id):
+        """Метод для удаления тарифа автомобиля из кэша"""
+        with self.lock:
+            self.entries.pop(car_id, None)
+
+    def clear(self):
+        """Метод для удаления всех тарифов из кэша"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Метод для получения статистики кэша"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+def price_query(car_ids):
+    """Метод для построения запроса тарифов (Id, Price, Percent, FixedRate) неудаленных автомобилей"""
+    return session.query(Car.Id, Car.Price, Car.Percent, Car.FixedRate).filter(Car.Id.in_(car_ids), Car.DateDel == None)
+
+
+explained_queries['quote (price_cache)'] = lambda: price_query([1, 2])
+price_cache = CarPriceCache(config['price_cache_size'])
+compressor = Rabbit_codec.Compressor(config['compress_min_bytes'], config['compress_level'])
+
+
+def decimal_places(value):
+    """Метод для получения числа знаков после запятой у decimal.Decimal"""
+    return max(0, -value.normalize().as_tuple().exponent)
+
+
+def quote_prices(prices, percents, fixed_rates, days):
+    """
+    Метод для расчета стоимости и комиссии набора заявок за один векторный проход\r\n
+    Результат совпадает с расчетом add_order: cost = days * Price,
+    round(Percent * Decimal(0.01) * cost + FixedRate, 2). Комиссия считается в целых числах
+    (единицах 10^-(d+2), где d - наибольшее число знаков после запятой у Percent и FixedRate),
+    а половина копейки округляется так же, как в Decimal: Decimal(0.01) чуть больше 0.01,
+    поэтому ничья решается в сторону знака Percent * cost, а при нулевом произведении - к четному\r\n
+    Параметры:\r\n
+        prices: стоимости аренды за день\r\n
+        percents: проценты комиссии (decimal.Decimal)\r\n
+        fixed_rates: фиксированные комиссии (decimal.Decimal)\r\n
+        days: количество дней аренды\r\n
+    Возвращаемое значение:\r\n
+        (costs, comissions): стоимости и комиссии (decimal.Decimal с двумя знаками)\r\n
+    """
+    places = max([decimal_places(value) for value in percents + fixed_rates] or [0])
+    scale = 10 ** places
+    costs = np.asarray(days, dtype=np.int64) * np.asarray(prices, dtype=np.int64)
+    percent_units = [int(value.scaleb(places)) for value in percents]
+    fixed_units = [int(value.scaleb(places + 2)) for value in fixed_rates]
+    bound = (max(map(abs, percent_units), default=0) * int(np.abs(costs).max(initial=0)) +
+             max(map(abs, fixed_units), default=0)) * 2
+    dtype = np.int64 if bound < 2 ** 62 else object  # при переполнении int64 считаем в целых Python
+    percent_cost = np.asarray(percent_units, dtype=dtype) * costs.astype(dtype)
+    units = percent_cost + np.asarray(fixed_units, dtype=dtype)
+    cents, rest = units // scale, units % scale
+    twice = rest * 2
+    tie_up = np.where(percent_cost == 0, cents % 2 == 1, percent_cost > 0)
+    cents = cents + ((twice > scale) | ((twice == scale) & tie_up))
+    comissions = [decimal.Decimal(int(value)).scaleb(-2) for value in cents]
+    return [int(value) for value in costs], comissions
+
 #########################################################################################
 
 def check_500(any_func):
@@ -98,22 +849,65 @@ def check_500(any_func):
 
     return checking
 
+def read_only(any_func):
+    u"""Декоратор для выполнения обработчика чтения через пул соединений только для чтения"""
+    @wraps(any_func)
+    def reading(data):
+        request_context.read_only = True
+        try:
+            return any_func(data)
+        finally:
+            request_context.read_only = False
+
+    return reading
+
+
+def call_as_person(any_func, data, person_id):
+    """
+    Метод для вызова обработчика от имени авторизованного клиента\r\n
+    Клиент загружается по первичному ключу (повторные обращения берутся из identity map сессии)
+    и доступен обработчику через request_context.person\r\n
+    Параметры:\r\n
+        any_func: обработчик запроса\r\n
+        data: словарь с информацией полученной от клиента\r\n
+        person_id: id клиента из записи о токене\r\n
+    """
+    man = session.get(Person, person_id)
+    if man is None or man.DateDel is not None or man.Token != data['token']:
+        raise LookupError('Клиент с токеном ' + str(data['token']) + ' не найден')
+    request_context.person = man
+    try:
+        return any_func(data)
+    finally:
+        request_context.person = None
+
+
 def check_token(any_func):
     u"""Декоратор для проверки токена клиента"""
     @wraps(any_func)
     def checking(data):
         try:
-            tarantool_token = tarantool_space.select(data['token']).data[0]
+            batch_token = getattr(request_context, 'batch_token', None)
+            if batch_token is not None and batch_token[0] == data['token'] and data['token'] in token_cache:
+                # токен уже проверен для пакета и не удален запросами пакета (log_out)
+                return call_as_person(any_func, data, batch_token[1])
             time_now = int(datetime.datetime.now().timestamp())
+            cached_token = token_cache.get(data['token'], time_now)
+            if cached_token is not None:
+                return call_as_person(any_func, data, cached_token[0])
+            tarantool_token = tarantool_space.select(data['token']).data[0]
             last_time_token = time_now - tarantool_token[2]
             if last_time_token <= config['ttl']:
                 if last_time_token <= config['ttl_update']:
-                    return any_func(data)
+                    token_cache.put(data['token'], tarantool_token[1], tarantool_token[2])
+                    return call_as_person(any_func, data, tarantool_token[1])
                 else:
                     tarantool_space.update(data['token'], [('=', 2, time_now)])
-                    return any_func(data)
+                    token_cache.put(data['token'], tarantool_token[1], time_now)
+                    return call_as_person(any_func, data, tarantool_token[1])
             else:
                 tarantool_space.delete((data['token']))
+                token_cache.invalidate(data['token'])
                 del data['token']
                 data['content'] = []
                 data['status'] = '403'
@@ -127,6 +921,81 @@ def check_token(any_func):
 
     return checking
 
+def cache_response(*tables):
+    u"""
+    Декоратор для кэширования успешных ответов обработчика чтения\r\n
+    Ключ кэша - запрос без токена, ответ действителен до изменения таблиц tables\r\n
+    """
+    def decorator(any_func):
+        @wraps(any_func)
+        def caching(data):
+            if streaming(data):  # строки потокового ответа уже отправлены клиенту, кэшировать нечего
+                return any_func(data)
+            if getattr(request_context, 'batch_transaction', False):  # ответ может зависеть от незафиксированных изменений
+                return any_func(data)
+            token = data.get('token')
+            content_type = getattr(request_context, 'content_type', Rabbit_codec.JSON)
+            key = content_type + ' ' + json.dumps({k: v for k, v in data.items() if k != 'token'},
+                                                  ensure_ascii=False, sort_keys=True, default=str)
+            with table_versions_lock:
+                versions = tuple(table_versions.get(table, 0) for table in tables)
+            body = response_cache.get(key, versions)
+            if body is not None:
+                return CachedReply(body, token, content_type)
+            data = any_func(data)
+            if data.get('status') != '200':
+                return data
+            body = Rabbit_codec.encode_message({k: v for k, v in data.items() if k != 'token'}, content_type)
+            response_cache.put(key, versions, body)
+            return CachedReply(body, data.get('token'), content_type)
+
+        return caching
+
+    return decorator
+
+
+def streaming(data):
+    """
+    Метод для проверки, запросил ли клиент потоковый ответ (stream) и может ли обработчик отправлять части\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента\r\n
+    """
+    return bool(data.get('stream')) and getattr(request_context, 'publish', None) is not None
+
+
+def reply_rows(data, rows):
+    """
+    Метод для передачи строк ответа клиенту списком в content или, при потоковом ответе, частями\r\n
+    Части до stream_chunk_bytes байт публикуются по мере чтения строк из БД с тем же correlation_id и
+    номером stream_seq, а ответ обработчика (stream_rows, stream_chunks, пустой content) завершает поток\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента\r\n
+        rows: итератор словарей строк\r\n
+    Возвращаемое значение:\r\n
+        количество строк (если строк нет и ответ не потоковый, content не изменяется)\r\n
+    """
+    if not streaming(data):
+        content = list(rows)
+        if content:
+            data['content'] = content
+        return len(content)
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    chunks = 0
+    for body in Rabbit_codec.encode_chunks(counted(), request_context.content_type, config['stream_chunk_bytes']):
+        request_context.publish(body, chunks)
+        chunks += 1
+    data['content'] = []
+    data['stream_rows'] = count
+    data['stream_chunks'] = chunks
+    return count
+
 #########################################################################################
 
 class Car(Base):
@@ -189,8 +1058,10 @@ class Car(Base):
     Power = Column(Integer, nullable=False, doc="Мощность")
     Price = Column(Integer, nullable=False, doc="Стоимость аренды")
 
+    @read_only
     @check_500
     @check_token
+    @cache_response('Cars', 'Category')
     def get_car(data):
         """
         Метод для получения информации об автомобиле\r\n
@@ -199,9 +1070,9 @@ class Car(Base):
         Возвращаемое значение:\r\n
             data: словарь с информацией об автомобиле\r\n
         """
-        car = session.query(Car).filter(Car.Id == int(data['content']['Id']), Car.DateDel == None).first()
+        car = session.query(*car_serializer.columns).filter(Car.Id == int(data['content']['Id']), Car.DateDel == None).first()
         if car is not None:
-            data['content'] = [object_to_dict(car)]
+            data['content'] = [car_serializer.to_dict(car)]
             data['status'] = '200'
             data['message'] = 'Просмотр ТС c id ' + str(data['content'][0]['Id'])
             logger.info(data['message'] + ' ' + data['status'])
@@ -211,32 +1082,56 @@ class Car(Base):
             logger.error(str(data['message']) + ' ' + data['status'])
         return data
 
+    @read_only
     @check_500
     @check_token
+    @cache_response('Cars', 'Category')
     def get_cars(data):
         """
         Метод для получения списка автомобилей определенной категории\r\n
         Параметры:\r\n
             data: словарь с информацией полученной от клиента\r\n
         Возвращаемое значение:\r\n
-            data: словарь с данными автомобилей определенной категории\r\n
+            data: словарь с данными автомобилей определенной категории, курсором следующей страницы next_page
+            и количеством автомобилей по значениям фильтров facets (при включенном catalog_index).
+            При потоковом ответе (stream) отправляется вся категория без страниц\r\n
         """
-        category = session.query(Category).get(int(data['content']['CategoryID']))
+        category = session.get(Category, int(data['content']['CategoryID']))
         if category == None:
             data['status'] = '404'
             data['message'] = 'Категории с id ' + str(data['content']['CategoryID']) + ' нет'
             logger.error(data['message'] + ' ' + data['status'])
+        elif streaming(data):  # вся категория частями, без страниц
+            content = data['content']
+            facets = catalog_index.search(content, 0)[1] if config['catalog_index'] else None
+            cars = (car_serializer.to_dict(car) for car in catalog_query(content).yield_per(config['page_size']))
+            if reply_rows(data, cars):
+                data['status'] = '200'
+                data['message'] = 'Просмотр списка ТС с категорией ' + str(content['CategoryID'])
+                logger.info(data['message'] + ' ' + data['status'])
+                data['facets'] = facets
+                data['next_page'] = None
+            else:
+                data['status'] = '404'
+                data['message'] = 'ТС с категорией ' + str(content['CategoryID']) + ' нет'
+                logger.error(data['message'] + ' ' + data['status'])
         else:
-            cars = category.category_cars
-            new_cars = []  # [{} {} {}]
-            for car in cars:
-                if car.DateDel == None:
-                    dict = object_to_dict(car)
-                    new_cars.append(dict)
+            limit = min(int(data['content'].get('limit') or config['page_size']), config['max_page_size'])
+            facets = None
+            if config['catalog_index']:
+                cars, facets = index_page(data['content'], limit + 1)
+            else:
+                cars = catalog_query(data['content']).limit(limit + 1).all()
+            new_cars = [car_serializer.to_dict(car) for car in cars[:limit]]
             if new_cars:
                 data['status'] = '200'
                 data['message'] = 'Просмотр списка ТС с категорией ' + str(data['content']['CategoryID'])
                 logger.info(data['message'] + ' ' + data['status'])
+                data['facets'] = facets
+                data['next_page'] = None
+                if len(cars) > limit:
+                    order_by = data['content'].get('order_by') or 'Id'
+                    data['next_page'] = {'after_id': new_cars[-1]['Id'], 'after_value': new_cars[-1][order_by]}
                 data['content'] = new_cars
             else:
                 data['status'] = '404'
@@ -246,6 +1141,78 @@ class Car(Base):
         return data
 
 
+    @read_only
+    @check_500
+    @check_token
+    @cache_response('Cars')
+    def search(data):
+        """
+        Метод для полнотекстового поиска автомобилей по марке, заголовку, адресу и условиям аренды\r\n
+        Параметры:\r\n
+            data: словарь с информацией полученной от клиента (query, необязательные CategoryID, limit, offset)\r\n
+        Возвращаемое значение:\r\n
+            data: словарь с данными автомобилей в порядке релевантности и смещением следующей страницы next_page\r\n
+        """
+        match = search_match(data['content'].get('query', ''))
+        limit = min(int(data['content'].get('limit') or config['page_size']), config['max_page_size'])
+        offset = int(data['content'].get('offset') or 0)
+        cars = []
+        if match is not None:
+            cars = search_query(match, data['content'].get('CategoryID')).limit(limit + 1).offset(offset).all()
+        new_cars = [car_serializer.to_dict(car) for car in cars[:limit]]
+        if new_cars:
+            data['status'] = '200'
+            data['message'] = 'Найдено по запросу: ' + str(data['content']['query'])
+            logger.info(data['message'] + ' ' + data['status'])
+            data['next_page'] = {'offset': offset + limit} if len(cars) > limit else None
+            data['content'] = new_cars
+        else:
+            data['status'] = '404'
+            data['message'] = 'По запросу ' + str(data['content'].get('query', '')) + ' ничего не найдено'
+            logger.error(data['message'] + ' ' + data['status'])
+
+        return data
+
+    @read_only
+    @check_500
+    @check_token
+    def get_free_cars(data):
+        """
+        Метод для получения списка свободных на даты аренды автомобилей определенной категории\r\n
+        Параметры:\r\n
+            data: словарь с информацией полученной от клиента (CategoryID, DateStartContract, DateEndContract
+            и параметры каталога get_cars)\r\n
+        Возвращаемое значение:\r\n
+            data: словарь с данными свободных автомобилей и курсором следующей страницы next_page\r\n
+        """
+        start = datetime.datetime.strptime(data['content']['DateStartContract'], "%d-%m-%Y")
+        end = datetime.datetime.strptime(data['content']['DateEndContract'], "%d-%m-%Y")
+        limit = min(int(data['content'].get('limit') or config['page_size']), config['max_page_size'])
+        cars = []
+        for car in catalog_query(data['content']).yield_per(config['page_size']):
+            if availability_index.is_free(car.Id, start, end):
+                cars.append(car)
+                if len(cars) > limit:
+                    break
+        new_cars = [car_serializer.to_dict(car) for car in cars[:limit]]
+        if new_cars:
+            data['status'] = '200'
+            data['message'] = 'Свободные ТС с категорией ' + str(data['content']['CategoryID']) + ' с ' + \
+                              data['content']['DateStartContract'] + ' по ' + data['content']['DateEndContract']
+            logger.info(data['message'] + ' ' + data['status'])
+            data['next_page'] = None
+            if len(cars) > limit:
+                order_by = data['content'].get('order_by') or 'Id'
+                data['next_page'] = {'after_id': new_cars[-1]['Id'], 'after_value': new_cars[-1][order_by]}
+            data['content'] = new_cars
+        else:
+            data['status'] = '404'
+            data['message'] = 'Свободных ТС с категорией ' + str(data['content']['CategoryID']) + ' нет'
+            logger.error(data['message'] + ' ' + data['status'])
+
+        return data
+
+
 class Person(Base):
     u"""
         Класс клиента
@@ -309,8 +1276,9 @@ class Person(Base):
             person.Token = uuid.uuid4().hex
             session.add(person)
             session.commit()
-            tarantool_space.insert(
-                (person.Token, person.Id, int(datetime.datetime.now().timestamp())))
+            time_now = int(datetime.datetime.now().timestamp())
+            tarantool_space.insert((person.Token, person.Id, time_now))
+            token_cache.put(person.Token, person.Id, time_now)
             data = {}
             data['token'] = person.Token
             data['status'] = '200'
@@ -341,8 +1309,9 @@ class Person(Base):
             data['token'] = man.Token = uuid.uuid4().hex
             session.add(man)
             session.commit()
-            tarantool_space.insert(
-                (man.Token, man.Id, int(datetime.datetime.now().timestamp())))
+            time_now = int(datetime.datetime.now().timestamp())
+            tarantool_space.insert((man.Token, man.Id, time_now))
+            token_cache.put(man.Token, man.Id, time_now)
             data['message'] = 'Вы авторизовались. ' + 'Ваш id: ' + str(man.Id)
             logger.info(data['message'] + ' ' + data['status'])
         else:
@@ -352,6 +1321,7 @@ class Person(Base):
 
         return data
 
+    @read_only
     @check_500
     @check_token
     def get_client(data):
@@ -362,10 +1332,8 @@ class Person(Base):
         Возвращаемое значение:\r\n
             data: словарь с личной информацией клиента или сообщение об ошибке\r\n
         """
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
-        data['content'] = [object_to_dict(man)]
-        del (data['content'][0]['Password'])
-        del (data['content'][0]['Token'])
+        man = request_context.person
+        data['content'] = [person_serializer.to_dict(man)]
         data['token'] = man.Token
         data['status'] = '200'
         data['message'] = 'Данные клиента с id ' + str(man.Id)
@@ -383,10 +1351,12 @@ class Person(Base):
         Возвращаемое значение:\r\n
             data: словарь с информацией об удалении или сообщение об ошибке\r\n
         """
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
+        man = request_context.person
         man.DateDel = datetime.date.today()
         session.add(man)
         session.commit()
+        tarantool_space.delete((data['token']))
+        token_cache.invalidate(data['token'])
         data['content'] = []
         data['status'] = '200'
         data['message'] = 'Аккаунт с id ' + str(man.Id) + ' удален'
@@ -404,7 +1374,7 @@ class Person(Base):
         Возвращаемое значение:\r\n
             data: словарь с информацией о смене пароля или сообщение об ошибке\r\n
         """
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
+        man = request_context.person
         salted = hashlib.sha256(data['content']['Password'].encode() + salt.encode()).hexdigest()
         man.Password = salted
         session.add(man)
@@ -427,7 +1397,7 @@ class Person(Base):
         Возвращаемое значение:\r\n
             data: словарь с информацией об успешном редактировании или сообщение об ошибке\r\n
         """
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
+        man = request_context.person
         man = dict_to_object(man, data['content'])
         man.Birthday = datetime.datetime.strptime(data['content']['Birthday'], "%d-%m-%Y")
         session.add(man)
@@ -451,6 +1421,7 @@ class Person(Base):
             data: словарь с информацией о выходе из системы или сообщение об ошибке\r\n
         """
         tarantool_space.delete((data['token']))
+        token_cache.invalidate(data['token'])
         data = {}
         data['content'] = []
         data['status'] = '200'
@@ -530,17 +1501,21 @@ class Contract(Base):
         ---
     """
     __tablename__ = 'Contract'
+    # колонки, из которых считаются дневные сводки (report_columns), загружают прежнее значение при изменении
+    # (active_history), иначе после истечения атрибутов (commit) contract_report_updated не знает, что вычесть
     Id = Column(Integer, primary_key=True, doc="Уникальный идентификатор")  # pk
     ClientId = Column(Integer, ForeignKey('Person.Id'), nullable=False, doc="Уникальный идентификатор клиента")  # fk
-    CarId = Column(Integer, ForeignKey('Cars.Id'), nullable=False, doc="Уникальный идентификатор автомобиля")  # fk
-    DateStartContract = Column(Date, nullable=False, doc="Дата начала аренды")
-    DateEndContract = Column(Date, nullable=False, doc="Дата окончания аренды")
+    CarId = column_property(Column(Integer, ForeignKey('Cars.Id'), nullable=False,
+                                   doc="Уникальный идентификатор автомобиля"), active_history=True)  # fk
+    DateStartContract = column_property(Column(Date, nullable=False, doc="Дата начала аренды"), active_history=True)
+    DateEndContract = column_property(Column(Date, nullable=False, doc="Дата окончания аренды"), active_history=True)
     Driver = Column(Boolean, nullable=False, doc="Требуется ли водитель для аренды")
     Note = Column(String, nullable=True, doc="Комментарий к заявке")
-    Status = Column(Integer, nullable=False, doc="Статус заявки (Активна, завершена, отменена)")
-    Comission = Column(Numeric, nullable=False, doc="Комиссия с заявки")
-    Cost = Column(Integer, nullable=False, doc="Стоимость аренды")
-    DateDel = Column(Date, nullable=True, doc="Дата удаления")
+    Status = column_property(Column(Integer, nullable=False, doc="Статус заявки (Активна, завершена, отменена)"),
+                             active_history=True)
+    Comission = column_property(Column(Numeric, nullable=False, doc="Комиссия с заявки"), active_history=True)
+    Cost = column_property(Column(Integer, nullable=False, doc="Стоимость аренды"), active_history=True)
+    DateDel = column_property(Column(Date, nullable=True, doc="Дата удаления"), active_history=True)
     contract_client = relationship("Person", back_populates="client_contracts", doc="Вспомогательное поле для создания связи с классом Person")
     contract_car = relationship("Car", back_populates="car_contract", doc="Вспомогательное поле для создания связи с классом Car")
 
@@ -554,7 +1529,7 @@ class Contract(Base):
         Возвращаемое значение:\r\n
             data: словарь с информацией о создании договора или сообщение об ошибке\r\n
         """
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
+        man = request_context.person
         car = session.query(Car).filter(Car.Id == data['content']['CarId'], Car.DateDel == None).first()
         if car is not None:
             start = datetime.datetime.strptime(data['content']['DateStartContract'], "%d-%m-%Y")
@@ -577,18 +1552,76 @@ class Contract(Base):
             contract.Driver = False
             contract.Status = 0
             session.add(contract)
-            session.commit()
+            session.flush()
+            if availability_index.reserve(contract.Id, car.Id, start, end):
+                session.info.setdefault('reserved_contracts', []).append(contract.Id)
+                session.commit()
+                data['content'] = []
+                data['status'] = '200'
+                data['message'] = 'Заявка добавлена! Id заявки: ' + str(contract.Id)
+                logger.info(data['message'] + ' ' + data['status'])
+            else:  # незафиксированная заявка откатывается при закрытии сессии
+                data['status'] = '409'
+                data['message'] = 'Автомобиль с id ' + str(car.Id) + ' уже забронирован на даты с ' + \
+                                  data['content']['DateStartContract'] + ' по ' + \
+                                  data['content']['DateEndContract'] + ', выберите другие даты'
+                data['content'] = []
+                logger.error(data['message'] + ' ' + data['status'])
+        else:
+            data['status'] = '500'
+            data['message'] = 'Автомобиль не найден!'
+            logger.error(data['message'] + ' ' + data['status'])
+
+        return data
+
+    @read_only
+    @check_500
+    @check_token
+    def quote(data):
+        """
+        Метод для расчета стоимости и комиссии нескольких заявок без их создания\r\n
+        Параметры:\r\n
+            data: словарь с информацией полученной от клиента (items - список словарей
+            с CarId, DateStartContract и DateEndContract, не больше max_quote_items)\r\n
+        Возвращаемое значение:\r\n
+            data: словарь со стоимостью (Cost) и комиссией (Comission) каждой заявки,
+            для несуществующих автомобилей Cost и Comission равны None\r\n
+        """
+        items = data['content']['items']
+        if len(items) > config['max_quote_items']:
             data['content'] = []
+            data['status'] = '403'
+            data['message'] = 'В запросе больше ' + str(config['max_quote_items']) + ' заявок, действие запрещено'
+            logger.error(data['message'] + ' ' + data['status'])
+            return data
+        car_ids = [int(item['CarId']) for item in items]
+        prices = price_cache.get_many(list(set(car_ids)))
+        quoted = [num for num, car_id in enumerate(car_ids)
+                  if car_id in prices and None not in prices[car_id]]
+        days = [(datetime.datetime.strptime(items[num]['DateEndContract'], "%d-%m-%Y") -
+                 datetime.datetime.strptime(items[num]['DateStartContract'], "%d-%m-%Y")).days for num in quoted]
+        costs, comissions = quote_prices([prices[car_ids[num]][0] for num in quoted],
+                                         [prices[car_ids[num]][1] for num in quoted],
+                                         [prices[car_ids[num]][2] for num in quoted], days)
+        quotes = [{'CarId': car_id, 'DateStartContract': item['DateStartContract'],
+                   'DateEndContract': item['DateEndContract'], 'Cost': None, 'Comission': None}
+                  for car_id, item in zip(car_ids, items)]
+        for num, cost, comission in zip(quoted, costs, comissions):
+            quotes[num]['Cost'] = cost
+            quotes[num]['Comission'] = str(comission)
+        if quoted:
             data['status'] = '200'
-            data['message'] = 'Заявка добавлена! Id заявки: ' + str(contract.Id)
+            data['message'] = 'Рассчитано заявок: ' + str(len(quoted)) + ' из ' + str(len(items))
             logger.info(data['message'] + ' ' + data['status'])
         else:
-            data['status'] = '500'
-            data['message'] = 'Автомобиль не найден!'
+            data['status'] = '404'
+            data['message'] = 'Автомобили не найдены!'
             logger.error(data['message'] + ' ' + data['status'])
+        data['content'] = quotes
 
         return data
 
+    @read_only
     @check_500
     @check_token
     def get_order(data):
@@ -599,16 +1632,10 @@ class Contract(Base):
         Возвращаемое значение:\r\n
             data: словарь с информацией договоре или сообщение об ошибке\r\n
         """
-        contract = session.query(Contract).filter(Contract.Id == int(data['content']['Id']),
-                                                  Contract.DateDel == None).first()
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
-        l = list(filter(lambda x: x.Id == int(data['content']['Id']), man.client_contracts))
-        contract = l[0] if l != [] else None
+        man = request_context.person
+        contract = orders_query(man.Id).filter(Contract.Id == int(data['content']['Id'])).first()
         if contract is not None:
-            data['content'] = [object_to_dict(contract)]
-            c = contract.contract_car.Id
-            data['content'][0]['CarId'] = contract.contract_car.Brand_and_name + ': id ' + str(
-                contract.contract_car.Id)
+            data['content'] = [order_to_dict(contract)]
             data['status'] = '200'
             data['message'] = 'Просмотр заявки c id ' + str(data['content'][0]['Id'])
             logger.info(data['message'] + ' ' + data['status'])
@@ -619,6 +1646,7 @@ class Contract(Base):
 
         return data
 
+    @read_only
     @check_500
     @check_token
     def get_orders(data):
@@ -629,16 +1657,9 @@ class Contract(Base):
         Возвращаемое значение:\r\n
             data: словарь со списком договоров или сообщение об ошибке\r\n
         """
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
-        list_contract = list(man.client_contracts)
-        contracts = []
-        for o in list_contract:
-            object = object_to_dict(o)
-            c = o.contract_car
-            object['CarId'] = c.Brand_and_name + ': id ' + str(c.Id)
-            contracts.append(object)
-        if contracts:
-            data['content'] = contracts
+        man = request_context.person
+        contracts = (order_to_dict(row) for row in orders_query(man.Id).order_by(Contract.Id).yield_per(config['page_size']))
+        if reply_rows(data, contracts):
             data['status'] = '200'
             data['message'] = 'Просмотр заявок клиента с id ' + str(man.Id)
             logger.info(data['message'] + ' ' + data['status'])
@@ -680,7 +1701,7 @@ class Favorite(Base):
         Возвращаемое значение:\r\n
             data: словарь с информацией о добавлении автомобиля в избранное или сообщение об ошибке\r\n
         """
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
+        man = request_context.person
         car = session.query(Car).filter(Car.Id == data['content']['CarId'], Car.DateDel == None).first()
         if car is not None:
             if car not in man.favorites:
@@ -715,7 +1736,7 @@ class Favorite(Base):
         Возвращаемое значение:\r\n
             data: словарь с информацией об удалении автомобиля из списка избранного клиента или сообщение об ошибке\r\n
         """
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
+        man = request_context.person
         fav = session.query(Favorite).filter(Favorite.ClientId == man.Id,
                                              Favorite.CarId == data['content']['CarId']).first()
         if fav is not None:
@@ -732,6 +1753,7 @@ class Favorite(Base):
 
         return data
 
+    @read_only
     @check_500
     @check_token
     def get_favorites(data):
@@ -742,15 +1764,11 @@ class Favorite(Base):
         Возвращаемое значение:\r\n
             data: словарь со спиком автомобилей или сообщение об ошибке\r\n
         """
-        man = session.query(Person).filter(Person.Token == data['token'], Person.DateDel == None).first()
-        list_favorites = list(man.favorites)
-        favorites = []
-        for o in list_favorites:
-            object = {}
-            object['CarId'] = o.Brand_and_name + ': id ' + str(o.Id)
-            favorites.append(object)
-        if favorites:
-            data['content'] = favorites
+        man = request_context.person
+        list_favorites = session.query(Car.Id, Car.Brand_and_name).join(Favorite, Favorite.CarId == Car.Id)\
+            .filter(Favorite.ClientId == man.Id, Favorite.DateDel == None).order_by(Favorite.Id)
+        favorites = ({'CarId': o.Brand_and_name + ': id ' + str(o.Id)} for o in list_favorites.yield_per(config['page_size']))
+        if reply_rows(data, favorites):
             data['status'] = '200'
             data['message'] = 'Просмотр списка избранного клиента с id ' + str(man.Id)
             logger.info(data['message'] + ' ' + data['status'])
@@ -762,69 +1780,1868 @@ class Favorite(Base):
         return data
 
 
+class CompanyDailyStats(Base):
+    u"""
+        Класс дневной сводки по заявкам компании (по дате начала аренды)
+
+        Атрибуты\r\n
+        ---\r\n
+        CompanyID (Integer): Уникальный идентификатор компании\r\n
+        Day (Date): День начала аренды\r\n
+        Orders (Integer): Количество заявок\r\n
+        Revenue (Integer): Сумма стоимости аренды\r\n
+        ComissionCents (Integer): Сумма комиссии в копейках\r\n
+        Days (Integer): Сумма дней аренды\r\n
+        ---
+    """
+    __tablename__ = 'CompanyDailyStats'
+    CompanyID = Column(Integer, primary_key=True, doc="Уникальный идентификатор компании")  # pk
+    Day = Column(Date, primary_key=True, doc="День начала аренды")  # pk
+    Orders = Column(Integer, nullable=False, default=0, doc="Количество заявок")
+    Revenue = Column(Integer, nullable=False, default=0, doc="Сумма стоимости аренды")
+    ComissionCents = Column(Integer, nullable=False, default=0, doc="Сумма комиссии в копейках")
+    Days = Column(Integer, nullable=False, default=0, doc="Сумма дней аренды")
+
+
+class CarDailyStats(Base):
+    u"""
+        Класс дневной сводки по заявкам автомобиля (по дате начала аренды)
+
+        Атрибуты\r\n
+        ---\r\n
+        CarId (Integer): Уникальный идентификатор автомобиля\r\n
+        Day (Date): День начала аренды\r\n
+        CompanyID (Integer): Уникальный идентификатор компании автомобиля\r\n
+        Orders (Integer): Количество заявок\r\n
+        Revenue (Integer): Сумма стоимости аренды\r\n
+        ComissionCents (Integer): Сумма комиссии в копейках\r\n
+        Days (Integer): Сумма дней аренды\r\n
+        ---
+    """
+    __tablename__ = 'CarDailyStats'
+    CarId = Column(Integer, primary_key=True, doc="Уникальный идентификатор автомобиля")  # pk
+    Day = Column(Date, primary_key=True, doc="День начала аренды")  # pk
+    CompanyID = Column(Integer, nullable=False, doc="Уникальный идентификатор компании автомобиля")
+    Orders = Column(Integer, nullable=False, default=0, doc="Количество заявок")
+    Revenue = Column(Integer, nullable=False, default=0, doc="Сумма стоимости аренды")
+    ComissionCents = Column(Integer, nullable=False, default=0, doc="Сумма комиссии в копейках")
+    Days = Column(Integer, nullable=False, default=0, doc="Сумма дней аренды")
+
+
 ###########################################################################################################
-client_data = {}
-# удаление всех записей в Tarantool (очистка перед каждым запуском, в будущем можно очищать раз в 24 часа)
-connection_tarantool.call('box.space.user_token:truncate', ())
+car_serializer = Serializer(Car)
+person_serializer = Serializer(Person, exclude=('Password', 'Token'))
+contract_serializer = Serializer(Contract)
+favorite_serializer = Serializer(Favorite)
+
+###########################################################################################################
+# индексы по колонкам поиска, частичные индексы содержат только неудаленные строки
+Index('ix_Person_Phone', Person.Phone, sqlite_where=Person.DateDel == None)
+Index('ix_Cars_CategoryID', Car.CategoryID, sqlite_where=Car.DateDel == None)
+Index('ix_Cars_CategoryID_Price', Car.CategoryID, Car.Price, sqlite_where=Car.DateDel == None)
+Index('ix_Contract_ClientId', Contract.ClientId, sqlite_where=Contract.DateDel == None)
+Index('ix_Favorites_ClientId_CarId', Favorite.ClientId, Favorite.CarId)
+dropped_indexes = ('ix_Person_Token',)  # токен проверяется по Tarantool, запросов к Person по Token нет
+# индексы для проверки ссылок на строки, переносимые в архив (учитывают и удаленные строки)
+Index('ix_Contract_ClientId_DateDel', Contract.ClientId, Contract.DateDel)
+Index('ix_Contract_CarId', Contract.CarId)
+Index('ix_Favorites_CarId', Favorite.CarId)
+Index('ix_CarDailyStats_CompanyID_Day', CarDailyStats.CompanyID, CarDailyStats.Day)
+
+explained_queries.update({
+    'sign_up': lambda: session.query(Person).filter(Person.Phone == '0', Person.DateDel == None),
+    'sign_in': lambda: session.query(Person).filter(Person.Phone == '0', Person.Password == '0',
+                                                    Person.DateDel == None),
+    'check_token': lambda: session.query(Person).filter(Person.Id == 1),
+    'get_car': lambda: session.query(*car_serializer.columns).filter(Car.Id == 1, Car.DateDel == None),
+    'add_order': lambda: session.query(Car).filter(Car.Id == 1, Car.DateDel == None),
+    'add_favorite': lambda: session.query(Car).join(Favorite, Favorite.CarId == Car.Id).filter(Favorite.ClientId == 1),
+    'del_favorite': lambda: session.query(Favorite).filter(Favorite.ClientId == 1, Favorite.CarId == 1),
+    'get_favorites': lambda: session.query(Car.Id, Car.Brand_and_name).join(Favorite, Favorite.CarId == Car.Id)
+        .filter(Favorite.ClientId == 1, Favorite.DateDel == None).order_by(Favorite.Id),
+})
+
+# полнотекстовый индекс FTS5 по текстовым колонкам автомобилей (внешнее содержимое - таблица Cars),
+# синхронизируется триггерами при любой записи в Cars, включая массовый импорт и изменения напрямую в БД
+car_search_columns = ('Brand_and_name', 'Header', 'Location', 'RentCondition')
+car_search_weights = (10.0, 5.0, 2.0, 1.0)  # веса колонок в ранжировании bm25
+car_search_table = table('Cars_fts', column('rowid'))
+car_search_ddl = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS "Cars_fts" USING fts5(' + ', '.join(car_search_columns) +
+    ", content='Cars', content_rowid='Id', tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS "Cars_fts_ai" AFTER INSERT ON "Cars" BEGIN '
+    'INSERT INTO "Cars_fts"(rowid, ' + ', '.join(car_search_columns) + ') '
+    'VALUES (new."Id", ' + ', '.join('new."' + name + '"' for name in car_search_columns) + '); END',
+    'CREATE TRIGGER IF NOT EXISTS "Cars_fts_ad" AFTER DELETE ON "Cars" BEGIN '
+    'INSERT INTO "Cars_fts"("Cars_fts", rowid, ' + ', '.join(car_search_columns) + ') '
+    'VALUES (\'delete\', old."Id", ' + ', '.join('old."' + name + '"' for name in car_search_columns) + '); END',
+    'CREATE TRIGGER IF NOT EXISTS "Cars_fts_au" AFTER UPDATE OF ' + ', '.join(car_search_columns) + ' ON "Cars" BEGIN '
+    'INSERT INTO "Cars_fts"("Cars_fts", rowid, ' + ', '.join(car_search_columns) + ') '
+    'VALUES (\'delete\', old."Id", ' + ', '.join('old."' + name + '"' for name in car_search_columns) + '); '
+    'INSERT INTO "Cars_fts"(rowid, ' + ', '.join(car_search_columns) + ') '
+    'VALUES (new."Id", ' + ', '.join('new."' + name + '"' for name in car_search_columns) + '); END',
+)
+for statement in car_search_ddl:
+    event.listen(Car.__table__, 'after_create', DDL(statement))
+
+
+def search_match(query):
+    """
+    Метод для построения выражения MATCH из строки поиска клиента\r\n
+    Каждое слово ищется как префикс, все слова должны встречаться в объявлении. Синтаксис FTS5
+    из строки клиента не используется, поэтому кавычки и операторы в ней не приводят к ошибке\r\n
+    Возвращаемое значение:\r\n
+        выражение MATCH или None, если в строке нет слов\r\n
+    """
+    words = re.findall(r'\w+', str(query))[:config['search_max_words']]
+    return ' '.join('"' + word + '"*' for word in words) or None
 
 
-def server_thread():  # pragma: no cover
+def search_query(match, category_id=None):
     """
-    Метод для запуска сервера в потоке\r\n
+    Метод для построения запроса полнотекстового поиска неудаленных автомобилей, отсортированного по bm25\r\n
     Параметры:\r\n
-        connection: данные о соединении клиента\r\n
-        address: адресс клиента в сети\r\n
+        match: выражение MATCH (search_match)\r\n
+        category_id: id категории или None\r\n
     """
-    ###########################################################################################################
-    cars_dict = {
-        'get_cars': Car.get_cars,
-        'get_car': Car.get_car
-    }
-    person_dict = {
-        'sign_up': Person.sign_up,
-        'sign_in': Person.sign_in,
-        'get_client': Person.get_client,
-        'del_client': Person.del_client,
-        'edit_pass': Person.edit_pass,
-        'edit_client': Person.edit_client,
-        'log_out': Person.log_out,
-        'add_favorite': Favorite.add_favorite,
-        'del_favorite': Favorite.del_favorite,
-        'get_favorites': Favorite.get_favorites
-    }
-    contract_dict = {
-        'add_order': Contract.add_order,
-        'get_order': Contract.get_order,
-        'get_orders': Contract.get_orders,
-    }
+    query = session.query(*car_serializer.columns)\
+        .join(car_search_table, car_search_table.c.rowid == Car.Id)\
+        .filter(text('"Cars_fts" MATCH :match').bindparams(match=match), Car.DateDel == None)
+    if category_id is not None:
+        query = query.filter(Car.CategoryID == int(category_id))
+    rank = text('bm25("Cars_fts", ' + ', '.join(str(weight) for weight in car_search_weights) + ')')
+    return query.order_by(rank, Car.Id)
 
-    while True:
-        def callback(ch, method,  props, body):
-            client_data = json.loads(body)
-            new_client_dict = client_data
-            if client_data['endpoint'] == 'cars':
-                q = client_data['action']
-                new_client_dict = cars_dict.get(q)(client_data)
-            if client_data['endpoint'] == 'clients':
-                q = client_data['action']
-                new_client_dict = person_dict.get(q)(client_data)
-            if client_data['endpoint'] == 'orders':
-                q = client_data['action']
-                new_client_dict = contract_dict.get(q)(client_data)
-            client_data = {}
-            new_client_dict = (json.dumps(new_client_dict, ensure_ascii=False, default=str))
-            channel.basic_publish(exchange='', routing_key=props.reply_to, properties=pika.BasicProperties(correlation_id = props.correlation_id), body=new_client_dict)
-        channel.basic_consume(queue='server_queue', on_message_callback=callback, auto_ack=True)
-        channel.start_consuming()
 
+explained_queries['search'] = lambda: search_query(search_match('toyota')).limit(10)
 
-def launch_server():  # pragma: no cover
-    """Метод для инициализации сервера и ожидания подключения клиента """
-    logger.info('****** RabbitMq ******')
-    logger.info('Срвер запущен по адресу ' + config['address'] + ':' + str(config['port']))
-    server_thread()
+###########################################################################################################
+def archive_model(model):
+    """
+    Метод для создания модели архивной таблицы <таблица>_archive\r\n
+    Архивная таблица содержит колонки модели без внешних ключей и индексов и дату переноса в архив\r\n
+    """
+    columns = [Column(x.name, x.type, primary_key=x.primary_key, nullable=x.nullable, doc=x.doc)
+               for x in model.__table__.columns]
+    columns.append(Column('DateArchive', Date, nullable=False, doc="Дата переноса в архив"))
+    archive_table = Table(model.__tablename__ + '_archive', Base.metadata, *columns)
+    return type(model.__name__ + 'Archive', (Base,), {'__table__': archive_table})
 
 
-# Base.metadata.create_all(db_engine)
-launch_server()
+# модели в порядке переноса в архив: сначала ссылающиеся строки, затем строки, на которые они ссылаются
+archive_models = {model: archive_model(model) for model in (Favorite, Contract, Car, Person)}
+archive_entities = {'favorites': Favorite, 'orders': Contract, 'cars': Car, 'clients': Person}
+
+
+def archive_candidates(model, cutoff, after_id, limit):
+    """
+    Метод для построения запроса id строк, удаленных раньше cutoff, на которые не ссылаются строки других таблиц\r\n
+    Строки перебираются по возрастанию Id начиная с after_id, поэтому весь перенос - один проход по таблице\r\n
+    """
+    query = session.query(model.Id).filter(model.Id > after_id, model.DateDel != None, model.DateDel < cutoff)
+    for other in Base.metadata.sorted_tables:
+        for foreign_key in other.foreign_keys:
+            if foreign_key.column.table is model.__table__:
+                query = query.filter(~exists().where(foreign_key.parent == model.Id))
+    return query.order_by(model.Id).limit(limit)
+
+
+explained_queries.update({'archive ' + model.__tablename__: lambda model=model: archive_candidates(
+    model, datetime.date.today(), 0, 10) for model in archive_models})
+
+
+def archive_batch(model, ids, today):
+    """Метод для переноса строк с id из ids в архивную таблицу в одной транзакции"""
+    names = [x.name for x in model.__table__.columns]
+    rows = select(*[model.__table__.c[name] for name in names], literal(today, Date))\
+        .where(model.Id.in_(ids))
+    session.execute(archive_models[model].__table__.insert().from_select(names + ['DateArchive'], rows))
+    session.execute(model.__table__.delete().where(model.Id.in_(ids)))
+    session.commit()
 
+
+def archive_deleted(days=None):
+    """
+    Метод для переноса давно удаленных клиентов, автомобилей, заявок и избранного в архивные таблицы\r\n
+    Строки переносятся частями по archive_batch_size в коротких транзакциях с паузой archive_pause_ms
+    между ними, поэтому обработчики запросов не ждут блокировку записи дольше одной части.
+    Строка остается в рабочей таблице, пока на нее ссылаются строки других таблиц\r\n
+    Параметры:\r\n
+        days: через сколько дней после удаления строка переносится (по умолчанию archive_after_days)\r\n
+    Возвращаемое значение:\r\n
+        словарь: имя таблицы -> число перенесенных строк\r\n
+    """
+    today = datetime.date.today()
+    cutoff = today - datetime.timedelta(days=config['archive_after_days'] if days is None else days)
+    result = {}
+    for model in archive_models:
+        moved = 0
+        after_id = 0
+        retries = 0
+        while True:
+            ids = [row[0] for row in archive_candidates(model, cutoff, after_id, config['archive_batch_size'])]
+            if not ids:
+                break
+            try:
+                archive_batch(model, ids, today)
+            except OperationalError as e:
+                session.rollback()
+                retries += 1
+                if not database_locked(e) or retries > config['archive_max_retries']:
+                    logger.error('Перенос в архив ' + model.__tablename__ + ' прерван: ' + str(e))
+                    break
+                logger.error('Перенос в архив ' + model.__tablename__ + ' отложен (попытка ' + str(retries) + '): ' +
+                             str(e))
+            else:
+                moved += len(ids)
+                after_id = ids[-1]
+                retries = 0
+            session.remove()
+            time.sleep(config['archive_pause_ms'] / 1000)
+        session.remove()
+        result[model.__tablename__] = moved
+        logger.info('Перенесено в архив ' + model.__tablename__ + '_archive: ' + str(moved) + ' строк')
+    return result
+
+
+def database_locked(error):
+    """
+    Метод для проверки, что ошибка БД вызвана блокировкой другой транзакцией (SQLITE_BUSY, SQLITE_LOCKED)\r\n
+    Параметры:\r\n
+        error: исключение OperationalError\r\n
+    Возвращаемое значение:\r\n
+        True, если запрос можно повторить позже\r\n
+    """
+    message = str(error.orig).lower()
+    return 'database is locked' in message or 'database table is locked' in message or 'database is busy' in message
+
+###########################################################################################################
+client_data = {}
+
+
+def car_catalog_changed(mapper, connection, target):
+    """Метод для запоминания изменений автомобиля до фиксации транзакции"""
+    changes = object_session(target).info.setdefault('catalog_changes', {})
+    if target.DateDel is None:
+        changes[target.Id] = {name: getattr(target, name) for name in CarCatalogIndex.columns}
+    else:
+        changes[target.Id] = None
+
+
+def car_catalog_deleted(mapper, connection, target):
+    """Метод для запоминания удаления автомобиля до фиксации транзакции"""
+    object_session(target).info.setdefault('catalog_changes', {})[target.Id] = None
+
+
+def commit_deferred():
+    """
+    Метод для проверки, отложен ли перенос изменений в память до фиксации всей транзакции
+    (транзакционный пакет run_batch или групповая транзакция GroupCommitter)\r\n
+    """
+    return getattr(request_context, 'batch_transaction', False)
+
+
+def apply_catalog_changes(ses):
+    """Метод для переноса зафиксированных изменений автомобилей в индекс каталога и кэш тарифов"""
+    if commit_deferred():
+        return
+    for car_id, values in ses.info.pop('catalog_changes', {}).items():
+        price_cache.invalidate(car_id)
+        if values is None:
+            catalog_index.remove(car_id)
+        else:
+            catalog_index.upsert(values)
+
+
+def load_catalog_index():  # pragma: no cover
+    """Метод для загрузки индекса каталога при запуске сервера"""
+    rows = session.query(*[getattr(Car, name) for name in CarCatalogIndex.columns]).filter(Car.DateDel == None)
+    catalog_index.load(rows)
+    session.remove()
+    logger.info('Индекс каталога загружен: ' + str(catalog_index.size) + ' ТС')
+
+
+def read_data_version():
+    """Метод для чтения номера версии данных, который увеличивает команда import (PRAGMA user_version)"""
+    with read_engine.connect() as conn:
+        return conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def bump_data_version():
+    """
+    Метод для увеличения номера версии данных после импорта в отдельном процессе\r\n
+    Работающий сервер видит новый номер в reload_thread и перезагружает индекс каталога и кэши\r\n
+    """
+    with db_engine.begin() as conn:
+        version = conn.exec_driver_sql('PRAGMA user_version').scalar() + 1
+        conn.exec_driver_sql('PRAGMA user_version = ' + str(version))
+    return version
+
+
+def reload_fleet_caches():
+    """Метод для перезагрузки индекса каталога и сброса кэшей, построенных по таблицам импорта"""
+    if config['catalog_index']:
+        load_catalog_index()
+    price_cache.clear()
+    with table_versions_lock:  # ответы из кэша ответов становятся недействительными
+        for model in fleet_models.values():
+            table_versions[model.__tablename__] = table_versions.get(model.__tablename__, 0) + 1
+    logger.info('Индекс каталога и кэши перезагружены после импорта в другом процессе')
+
+
+def reload_thread():  # pragma: no cover
+    """Метод для периодической проверки импорта, выполненного командой import в другом процессе"""
+    version = read_data_version()
+    while True:
+        time.sleep(config['reload_check_interval'])
+        try:
+            current = read_data_version()
+            if current != version:
+                version = current
+                reload_fleet_caches()
+        except Exception as e:
+            logger.error('Ошибка проверки версии данных: ' + str(e))
+
+
+def table_changed(mapper, connection, target):
+    """Метод для запоминания таблицы, строка которой изменена в транзакции"""
+    object_session(target).info.setdefault('changed_tables', set()).add(target.__tablename__)
+
+
+def bump_table_versions(ses):
+    """Метод для увеличения версий таблиц, изменения которых зафиксированы"""
+    if commit_deferred():
+        return
+    changed_tables = ses.info.pop('changed_tables', ())
+    with table_versions_lock:
+        for table in changed_tables:
+            table_versions[table] = table_versions.get(table, 0) + 1
+
+
+def contract_availability_changed(mapper, connection, target):
+    """Метод для запоминания изменений заявки до фиксации транзакции"""
+    changes = object_session(target).info.setdefault('availability_changes', {})
+    if target.Status == 0 and target.DateDel is None:
+        changes[target.Id] = (target.CarId, target.DateStartContract, target.DateEndContract)
+    else:
+        changes[target.Id] = None
+
+
+def contract_availability_deleted(mapper, connection, target):
+    """Метод для запоминания удаления заявки до фиксации транзакции"""
+    object_session(target).info.setdefault('availability_changes', {})[target.Id] = None
+
+
+def apply_availability_changes(ses):
+    """Метод для переноса зафиксированных изменений заявок в индекс занятости"""
+    if commit_deferred():
+        return
+    ses.info.pop('reserved_contracts', None)
+    for contract_id, values in ses.info.pop('availability_changes', {}).items():
+        if values is None:
+            availability_index.remove(contract_id)
+        else:
+            availability_index.upsert(contract_id, *values)
+
+
+def load_availability_index():  # pragma: no cover
+    """Метод для загрузки индекса занятости автомобилей при запуске сервера"""
+    rows = session.query(Contract.Id, Contract.CarId, Contract.DateStartContract, Contract.DateEndContract)\
+        .filter(Contract.Status == 0, Contract.DateDel == None).all()
+    availability_index.load(rows)
+    session.remove()
+    logger.info('Индекс занятости загружен: ' + str(len(rows)) + ' активных заявок')
+
+
+report_statuses = (0, 1)  # в сводки входят активные и завершенные заявки
+report_columns = ('CarId', 'DateStartContract', 'DateEndContract', 'Cost', 'Comission', 'Status', 'DateDel')
+report_measures = ('Orders', 'Revenue', 'ComissionCents', 'Days')
+
+
+def contract_report_values(values):
+    """
+    Метод для получения вклада заявки в дневные сводки\r\n
+    Параметры:\r\n
+        values: словарь значений колонок report_columns заявки\r\n
+    Возвращаемое значение:\r\n
+        (CarId, день, количество, стоимость, комиссия в копейках, дни аренды) или None, если заявка не учитывается\r\n
+    """
+    if values['Status'] not in report_statuses or values['DateDel'] is not None:
+        return None
+    start, end = values['DateStartContract'], values['DateEndContract']
+    day = start.date() if isinstance(start, datetime.datetime) else start
+    cents = (decimal.Decimal(str(values['Comission'])) * 100).to_integral_value(decimal.ROUND_HALF_UP)
+    return values['CarId'], day, 1, values['Cost'], int(cents), (end - start).days
+
+
+def car_company_query(car_id):
+    """Метод для построения запроса компании автомобиля (для сводок)"""
+    return select(Car.CompanyID).where(Car.Id == car_id)
+
+
+explained_queries['report rollup'] = lambda: car_company_query(1)
+
+
+def apply_report_values(connection, values, sign):
+    """Метод для прибавления (sign=1) или вычитания (sign=-1) вклада заявки в сводках компании и автомобиля"""
+    car_id, day, orders, revenue, cents, days = values
+    company_id = connection.execute(car_company_query(car_id)).scalar()
+    measures = dict(zip(report_measures, (orders * sign, revenue * sign, cents * sign, days * sign)))
+    for stats, keys in ((CompanyDailyStats, {'CompanyID': company_id, 'Day': day}),
+                        (CarDailyStats, {'CarId': car_id, 'Day': day, 'CompanyID': company_id})):
+        statement = sqlite_insert(stats.__table__).values(**keys, **measures)
+        statement = statement.on_conflict_do_update(
+            index_elements=[x.name for x in stats.__table__.primary_key],
+            set_={name: stats.__table__.c[name] + statement.excluded[name] for name in measures})
+        connection.execute(statement)
+        if sign < 0:  # строки без заявок удаляются, как при пересчете rebuild_reports
+            key = [stats.__table__.c[x.name] == keys[x.name] for x in stats.__table__.primary_key]
+            connection.execute(stats.__table__.delete().where(*key, stats.__table__.c.Orders == 0))
+
+
+def contract_report_inserted(mapper, connection, target):
+    """Метод для добавления новой заявки в дневные сводки в той же транзакции"""
+    values = contract_report_values({name: getattr(target, name) for name in report_columns})
+    if values is not None:
+        apply_report_values(connection, values, 1)
+
+
+def contract_report_updated(mapper, connection, target):
+    """Метод для переноса изменения заявки (статус, даты, стоимость, удаление) в дневные сводки"""
+    state = inspect(target)
+    new = {name: getattr(target, name) for name in report_columns}
+    old = dict(new)
+    for name in report_columns:
+        history = state.attrs[name].history
+        if history.deleted:
+            old[name] = history.deleted[0]
+    if old == new:
+        return
+    old_values, new_values = contract_report_values(old), contract_report_values(new)
+    if old_values is not None:
+        apply_report_values(connection, old_values, -1)
+    if new_values is not None:
+        apply_report_values(connection, new_values, 1)
+
+
+def contract_report_deleted(mapper, connection, target):
+    """Метод для вычитания удаленной заявки из дневных сводок"""
+    values = contract_report_values({name: getattr(target, name) for name in report_columns})
+    if values is not None:
+        apply_report_values(connection, values, -1)
+
+
+def rebuild_reports():  # pragma: no cover
+    """
+    Метод для пересчета дневных сводок по всем заявкам в одной транзакции\r\n
+    Возвращаемое значение:\r\n
+        количество строк сводок компаний и автомобилей\r\n
+    """
+    counted = and_(Contract.Status.in_(report_statuses), Contract.DateDel == None)
+    measures = [func.count(), func.sum(Contract.Cost),
+                func.sum(cast(func.round(Contract.Comission * 100), Integer)),
+                func.sum(cast(func.julianday(Contract.DateEndContract) - func.julianday(Contract.DateStartContract),
+                              Integer))]
+    names = list(report_measures)
+    day = func.date(Contract.DateStartContract)
+    company_rows = select(Car.CompanyID, day, *measures).join(Car, Car.Id == Contract.CarId).where(counted)\
+        .group_by(Car.CompanyID, day)
+    car_rows = select(Contract.CarId, day, Car.CompanyID, *measures).join(Car, Car.Id == Contract.CarId)\
+        .where(counted).group_by(Contract.CarId, day)
+    session.execute(CompanyDailyStats.__table__.delete())
+    session.execute(CarDailyStats.__table__.delete())
+    session.execute(CompanyDailyStats.__table__.insert().from_select(['CompanyID', 'Day'] + names, company_rows))
+    session.execute(CarDailyStats.__table__.insert().from_select(['CarId', 'Day', 'CompanyID'] + names, car_rows))
+    session.commit()
+    counts = session.query(CompanyDailyStats).count(), session.query(CarDailyStats).count()
+    session.remove()
+    logger.info('Сводки пересчитаны: ' + str(counts[0]) + ' строк компаний, ' + str(counts[1]) + ' строк автомобилей')
+    return counts
+
+
+def discard_session_changes(ses):
+    """Метод для сброса изменений, запомненных в отмененной транзакции"""
+    if commit_deferred():  # отмена точки сохранения: изменения остальных запросов транзакции сохраняются
+        return
+    ses.info.pop('catalog_changes', None)
+    ses.info.pop('changed_tables', None)
+    ses.info.pop('availability_changes', None)
+    for contract_id in ses.info.pop('reserved_contracts', ()):
+        availability_index.remove(contract_id)
+
+
+def restore_session_changes(ses, info):
+    """
+    Метод для отмены изменений, запомненных после снимка info (отмена точки сохранения одного запроса)\r\n
+    Параметры:\r\n
+        ses: сессия БД\r\n
+        info: копия ses.info до начала точки сохранения\r\n
+    """
+    kept = set(info.get('reserved_contracts', ()))
+    for contract_id in ses.info.get('reserved_contracts', ()):
+        if contract_id not in kept:
+            availability_index.remove(contract_id)
+    ses.info.clear()
+    ses.info.update(info)
+
+
+event.listen(Car, 'after_insert', car_catalog_changed)
+event.listen(Car, 'after_update', car_catalog_changed)
+event.listen(Car, 'after_delete', car_catalog_deleted)
+for model in (Car, Category):
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, table_changed)
+event.listen(Contract, 'after_insert', contract_availability_changed)
+event.listen(Contract, 'after_update', contract_availability_changed)
+event.listen(Contract, 'after_delete', contract_availability_deleted)
+event.listen(Contract, 'after_insert', contract_report_inserted)
+event.listen(Contract, 'after_update', contract_report_updated)
+event.listen(Contract, 'after_delete', contract_report_deleted)
+event.listen(session_factory, 'after_commit', apply_catalog_changes)
+event.listen(session_factory, 'after_commit', apply_availability_changes)
+event.listen(session_factory, 'after_commit', bump_table_versions)
+event.listen(session_factory, 'after_rollback', discard_session_changes)
+
+
+#########################################################################################
+fleet_models = {'cars': Car, 'companies': Company, 'categories': Category}  # сущности массового импорта
+
+
+class RowValidator:
+    u"""
+    Проверка и преобразование строк импорта по описанию колонок модели\r\n
+    Обязательные колонки, типы, длина строк и внешние ключи берутся из __table__ модели\r\n
+    """
+    def __init__(self, model):
+        self.columns = {x.name: x for x in model.__table__.columns}
+        self.required = tuple(x.name for x in model.__table__.columns
+                              if not x.nullable and x.default is None and not x.primary_key)
+        self.references = {}  # колонка внешнего ключа -> множество существующих id
+        for x in model.__table__.columns:
+            for foreign_key in x.foreign_keys:
+                target = foreign_key.column
+                self.references[x.name] = {row[0] for row in session.query(target)}
+
+    def convert(self, column, value):
+        """Метод для преобразования значения колонки к типу модели"""
+        if value is None or value == '':
+            return None
+        if isinstance(column.type, Boolean):
+            if value in (True, 1, '1', 'true', 'True'):
+                return True
+            if value in (False, 0, '0', 'false', 'False'):
+                return False
+            raise ValueError('ожидается логическое значение')
+        if isinstance(column.type, Integer):
+            return int(value)
+        if isinstance(column.type, Numeric):
+            return decimal.Decimal(str(value))
+        if isinstance(column.type, Date):
+            try:
+                return datetime.date.fromisoformat(str(value))
+            except ValueError:
+                return datetime.datetime.strptime(str(value), "%d-%m-%Y").date()
+        value = str(value)
+        if column.type.length is not None and len(value) > column.type.length:
+            raise ValueError('длина больше ' + str(column.type.length))
+        return value
+
+    def validate(self, row):
+        """
+        Метод для проверки строки импорта\r\n
+        Параметры:\r\n
+            row: словарь колонок или строка JSON\r\n
+        Возвращаемое значение:\r\n
+            словарь значений, приведенных к типам колонок\r\n
+        """
+        if isinstance(row, str):
+            row = json.loads(row)
+            if not isinstance(row, dict):
+                raise ValueError('ожидается объект JSON')
+        values = {}
+        for name, value in row.items():
+            column = self.columns.get(name)
+            if column is None:
+                raise ValueError('неизвестная колонка ' + str(name))
+            try:
+                values[name] = self.convert(column, value)
+            except (ValueError, ArithmeticError) as e:
+                raise ValueError(name + ': ' + str(e) if str(e) else name + ': некорректное значение')
+        for name in self.required:
+            if values.get(name) is None:
+                raise ValueError('не заполнена колонка ' + name)
+        for name, ids in self.references.items():
+            if values.get(name) is not None and values[name] not in ids:
+                raise ValueError(name + ': запись с id ' + str(values[name]) + ' не найдена')
+        if values.get('Id') is None:
+            values.pop('Id', None)
+        return values
+
+
+def fleet_format(path, fmt=None):
+    """Метод для определения формата файла импорта/экспорта (csv или jsonl)"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'ndjson':
+        fmt = 'jsonl'
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError('Формат ' + str(fmt) + ' не поддерживается, ожидается csv или jsonl')
+    return fmt
+
+
+def read_fleet_rows(path, fmt):
+    """
+    Генератор строк файла импорта\r\n
+    Возвращаемое значение:\r\n
+        пары (номер строки, словарь колонок для csv или строка JSON для jsonl)\r\n
+    """
+    with open(path, encoding='utf-8', newline='') as file:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(file), start=2):
+                yield number, row
+        else:
+            for number, line in enumerate(file, start=1):
+                if line.strip():
+                    yield number, line
+
+
+def fleet_chunks(rows, size):
+    """Генератор списков из size элементов rows"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_fleet_chunk(model, rows):
+    """
+    Метод для записи части строк импорта пакетными executemany\r\n
+    Строки с существующим Id обновляются, остальные добавляются. Строки группируются по набору колонок,
+    так как executemany выполняет одну и ту же команду для всех параметров\r\n
+    Возвращаемое значение:\r\n
+        (число добавленных строк, список id обновленных строк)\r\n
+    """
+    table = model.__table__
+    ids = [row['Id'] for row in rows if 'Id' in row]
+    existing = set()
+    for start in range(0, len(ids), 500):  # ограничение SQLite на число параметров запроса
+        existing.update(row[0] for row in session.query(model.Id).filter(model.Id.in_(ids[start:start + 500])))
+    inserts, updates = {}, {}
+    for row in rows:
+        group = updates if row.get('Id') in existing else inserts
+        group.setdefault(tuple(sorted(row)), []).append(row)
+        if 'Id' in row:
+            existing.add(row['Id'])  # повтор Id в той же части файла обновляет добавленную строку
+    for params in inserts.values():
+        session.execute(table.insert(), params)
+    for names, params in updates.items():
+        statement = table.update().where(table.c.Id == bindparam('b_Id'))\
+            .values({name: bindparam('b_' + name) for name in names if name != 'Id'})
+        session.execute(statement, [{'b_' + name: value for name, value in row.items()} for row in params])
+    return sum(len(params) for params in inserts.values()), [row['Id'] for params in updates.values()
+                                                            for row in params]
+
+
+def import_fleet(entity, path, fmt=None, chunk_size=None):
+    """
+    Метод для потокового импорта автомобилей, компаний или категорий из csv/jsonl\r\n
+    Файл читается частями по chunk_size строк, каждая часть записывается в отдельной транзакции,
+    поэтому расход памяти не зависит от размера файла. Некорректные строки пропускаются\r\n
+    Параметры:\r\n
+        entity: cars, companies или categories\r\n
+        path: путь к файлу\r\n
+        fmt: csv или jsonl (по умолчанию по расширению файла)\r\n
+        chunk_size: число строк в одной транзакции\r\n
+    Возвращаемое значение:\r\n
+        словарь со статистикой импорта и первыми ошибками\r\n
+    """
+    model = fleet_models[entity]
+    fmt = fleet_format(path, fmt)
+    chunk_size = chunk_size or config['bulk_chunk_size']
+    validator = RowValidator(model)
+    result = {'rows': 0, 'inserted': 0, 'updated': 0, 'skipped': 0, 'errors': []}
+    started = time.monotonic()
+    for chunk in fleet_chunks(read_fleet_rows(path, fmt), chunk_size):
+        rows = []
+        for number, row in chunk:
+            try:
+                rows.append(validator.validate(row))
+            except ValueError as e:
+                result['skipped'] += 1
+                if len(result['errors']) < config['bulk_max_errors']:
+                    result['errors'].append('строка ' + str(number) + ': ' + str(e))
+        inserted, updated = write_fleet_chunk(model, rows)
+        session.info.setdefault('changed_tables', set()).add(model.__tablename__)
+        session.commit()
+        if model is Car:
+            for car_id in updated:
+                price_cache.invalidate(car_id)
+        result['rows'] += len(chunk)
+        result['inserted'] += inserted
+        result['updated'] += len(updated)
+        elapsed = time.monotonic() - started
+        logger.info('Импорт ' + entity + ': обработано ' + str(result['rows']) + ' строк, ' +
+                    str(int(result['rows'] / elapsed) if elapsed else result['rows']) + ' строк/с')
+    if model is Car and config['catalog_index']:
+        load_catalog_index()  # executemany не вызывает события ORM, поэтому индекс перестраивается целиком
+    session.remove()
+    result['seconds'] = round(time.monotonic() - started, 3)
+    logger.info('Импорт ' + entity + ' из ' + path + ' завершен: ' + str(result['inserted']) + ' добавлено, ' +
+                str(result['updated']) + ' обновлено, ' + str(result['skipped']) + ' пропущено')
+    return result
+
+
+def export_fleet(entity, path, fmt=None, chunk_size=None):
+    """
+    Метод для потокового экспорта неудаленных автомобилей, компаний или категорий в csv/jsonl\r\n
+    Строки читаются из БД частями по chunk_size (yield_per) и сразу записываются в файл. Чтение идет через
+    read_engine: транзакция пула записи начинается с BEGIN IMMEDIATE и держала бы блокировку записи
+    на все время экспорта\r\n
+    Параметры:\r\n
+        entity: cars, companies или categories\r\n
+        path: путь к файлу\r\n
+        fmt: csv или jsonl (по умолчанию по расширению файла)\r\n
+        chunk_size: число строк, читаемых из БД за раз\r\n
+    Возвращаемое значение:\r\n
+        словарь со статистикой экспорта\r\n
+    """
+    model = fleet_models[entity]
+    fmt = fleet_format(path, fmt)
+    chunk_size = chunk_size or config['bulk_chunk_size']
+    serializer = Serializer(model)
+    count = 0
+    started = time.monotonic()
+    request_context.read_only = True
+    try:
+        rows = session.query(*serializer.columns).filter(model.DateDel == None).order_by(model.Id)\
+            .yield_per(chunk_size)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, serializer.fields) if fmt == 'csv' else None
+            if writer is not None:
+                writer.writeheader()
+            for row in rows:
+                if writer is not None:
+                    writer.writerow(serializer.to_dict(row, Rabbit_codec.JSON))
+                else:
+                    file.write(json.dumps(serializer.to_dict(row, Rabbit_codec.JSON), ensure_ascii=False) + '\n')
+                count += 1
+                if count % chunk_size == 0:
+                    logger.info('Экспорт ' + entity + ': записано ' + str(count) + ' строк')
+    finally:
+        session.remove()
+        request_context.read_only = False
+    result = {'rows': count, 'seconds': round(time.monotonic() - started, 3)}
+    logger.info('Экспорт ' + entity + ' в ' + path + ' завершен: ' + str(count) + ' строк')
+    return result
+
+
+class AdminJobs:
+    u"""
+    Фоновые задачи администратора (импорт и экспорт файлов)\r\n
+    Задачи выполняются по одной в отдельном потоке со своей сессией БД, поэтому обработчик очереди
+    сразу отвечает номером задачи и подтверждает сообщение, а соединение с RabbitMQ не теряет heartbeat
+    во время долгого импорта. Хранятся последние max_jobs задач\r\n
+    """
+    def __init__(self, max_jobs):
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()  # номер задачи -> словарь состояния
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='admin_job')
+
+    def submit(self, name, func, *args):
+        """
+        Метод для постановки задачи в очередь\r\n
+        Параметры:\r\n
+            name: название задачи\r\n
+            func: функция задачи\r\n
+            args: аргументы функции\r\n
+        Возвращаемое значение:\r\n
+            номер задачи\r\n
+        """
+        job_id = str(uuid.uuid4())
+        with self.lock:
+            self.jobs[job_id] = {'job_id': job_id, 'name': name, 'status': 'queued', 'result': None, 'error': None}
+            finished = [key for key, job in self.jobs.items() if job['status'] in ('done', 'failed')]
+            for key in finished[:max(len(self.jobs) - self.max_jobs, 0)]:
+                del self.jobs[key]
+        self.executor.submit(self.run, job_id, func, args)
+        return job_id
+
+    def run(self, job_id, func, args):
+        """Метод для выполнения задачи в потоке исполнителя"""
+        self.update(job_id, status='running')
+        try:
+            result = func(*args)
+        except Exception as e:
+            session.rollback()
+            logger.error('Задача ' + job_id + ' завершилась с ошибкой: ' + str(e))
+            self.update(job_id, status='failed', error=str(e))
+        else:
+            self.update(job_id, status='done', result=result)
+        finally:
+            session.remove()
+
+    def update(self, job_id, **values):
+        """Метод для изменения состояния задачи"""
+        with self.lock:
+            self.jobs[job_id].update(values)
+
+    def get(self, job_id):
+        """Метод для получения копии состояния задачи (None - задача не найдена)"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+
+admin_jobs = AdminJobs(config['admin_max_jobs'])
+
+
+def check_admin(any_func):
+    u"""Декоратор для проверки ключа администратора (admin_key в конфигурационном файле)"""
+    @wraps(any_func)
+    def checking(data):
+        admin_key = data.pop('admin_key', None)
+        if not config['admin_key'] or not isinstance(admin_key, str) or \
+                not hmac.compare_digest(admin_key, str(config['admin_key'])):
+            data['content'] = []
+            data['status'] = '403'
+            data['message'] = 'Действие доступно только администратору'
+            logger.error(data['message'] + ' ' + data['status'])
+            return data
+        return any_func(data)
+
+    return checking
+
+
+def fleet_path(data):
+    """Метод для получения пути к файлу импорта/экспорта внутри каталога fleet_dir"""
+    return os.path.join(config['fleet_dir'], os.path.basename(data['content']['file']))
+
+
+def fleet_job(data):
+    """
+    Метод для проверки параметров импорта/экспорта до запуска фоновой задачи\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента (entity, file, format)\r\n
+    Возвращаемое значение:\r\n
+        (entity, путь к файлу, формат)\r\n
+    """
+    entity = data['content']['entity']
+    if entity not in fleet_models:
+        raise ValueError('Сущность ' + str(entity) + ' не поддерживается')
+    path = fleet_path(data)
+    return entity, path, fleet_format(path, data['content'].get('format'))
+
+
+@check_500
+@check_admin
+def admin_import_fleet(data):
+    """
+    Метод для запуска импорта файла из каталога fleet_dir сервера в фоновой задаче\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента (admin_key, entity, file, format)\r\n
+    Возвращаемое значение:\r\n
+        data: словарь с номером задачи job_id, статистика импорта доступна через get_job\r\n
+    """
+    data['content'] = {'job_id': admin_jobs.submit('import_fleet', import_fleet, *fleet_job(data))}
+    data['status'] = '200'
+    data['message'] = 'Импорт запущен, задача ' + data['content']['job_id']
+    logger.info(data['message'] + ' ' + data['status'])
+    return data
+
+
+@check_500
+@check_admin
+def admin_export_fleet(data):
+    """
+    Метод для запуска экспорта в файл в каталоге fleet_dir сервера в фоновой задаче\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента (admin_key, entity, file, format)\r\n
+    Возвращаемое значение:\r\n
+        data: словарь с номером задачи job_id, статистика экспорта доступна через get_job\r\n
+    """
+    data['content'] = {'job_id': admin_jobs.submit('export_fleet', export_fleet, *fleet_job(data))}
+    data['status'] = '200'
+    data['message'] = 'Экспорт запущен, задача ' + data['content']['job_id']
+    logger.info(data['message'] + ' ' + data['status'])
+    return data
+
+
+@check_500
+@check_admin
+def admin_get_job(data):
+    """
+    Метод для получения состояния фоновой задачи администратора\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента (admin_key, job_id)\r\n
+    Возвращаемое значение:\r\n
+        data: словарь с состоянием задачи (status: queued, running, done или failed; result; error)\r\n
+    """
+    job = admin_jobs.get(data['content'].get('job_id'))
+    if job is None:
+        data['content'] = []
+        data['status'] = '404'
+        data['message'] = 'Задача не найдена'
+        logger.error(data['message'] + ' ' + data['status'])
+        return data
+    data['content'] = job
+    data['status'] = '200'
+    data['message'] = 'Задача ' + job['job_id'] + ': ' + job['status']
+    logger.info(data['message'] + ' ' + data['status'])
+    return data
+
+
+def archive_query(archive, content):
+    """
+    Метод для построения запроса архивных строк по возрастанию Id\r\n
+    Параметры:\r\n
+        archive: модель архивной таблицы\r\n
+        content: словарь с параметрами запроса (filters - словарь колонка: значение, after_id)\r\n
+    """
+    query = session.query(archive).filter(archive.Id > int(content.get('after_id') or 0))
+    for name, value in (content.get('filters') or {}).items():
+        if name not in archive.__table__.columns:
+            raise ValueError('Колонки ' + str(name) + ' нет в архиве')
+        query = query.filter(archive.__table__.columns[name] == value)
+    return query.order_by(archive.Id)
+
+
+explained_queries.update({'get_archive ' + entity: lambda model=model: archive_query(
+    archive_models[model], {'after_id': 1}).limit(10) for entity, model in archive_entities.items()})
+
+
+@read_only
+@check_500
+@check_admin
+def admin_get_archive(data):
+    """
+    Метод для просмотра архивных строк\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента (admin_key, entity - clients, cars, orders
+        или favorites, filters - словарь колонка: значение, limit, after_id)\r\n
+    Возвращаемое значение:\r\n
+        data: словарь с архивными строками по возрастанию Id и курсором следующей страницы next_page\r\n
+    """
+    archive = archive_models[archive_entities[data['content']['entity']]]
+    limit = min(int(data['content'].get('limit') or config['page_size']), config['max_page_size'])
+    rows = archive_query(archive, data['content']).limit(limit + 1).all()
+    serializer = Serializer(archive, exclude=('Password', 'Token'))
+    data['content'] = [serializer.to_dict(row) for row in rows[:limit]]
+    data['next_page'] = {'after_id': rows[limit - 1].Id} if len(rows) > limit else None
+    data['status'] = '200'
+    data['message'] = 'Архивных строк: ' + str(len(data['content']))
+    logger.info(data['message'] + ' ' + data['status'])
+    return data
+
+
+def report_rows(stats, key_column, data):
+    """Метод для построения запроса строк сводки stats по значению key_column и периоду DateFrom - DateTo"""
+    date_from = datetime.datetime.strptime(data['content']['DateFrom'], "%d-%m-%Y").date()
+    date_to = datetime.datetime.strptime(data['content']['DateTo'], "%d-%m-%Y").date()
+    return session.query(stats).filter(key_column == int(data['content'][key_column.name]),
+                                       stats.Day >= date_from, stats.Day <= date_to)
+
+
+def company_cars_query(data):
+    """Метод для построения запроса итогов по каждому автомобилю компании за период по убыванию выручки"""
+    return report_rows(CarDailyStats, CarDailyStats.CompanyID, data)\
+        .with_entities(CarDailyStats.CarId,
+                       *[func.sum(getattr(CarDailyStats, name)).label(name) for name in report_measures])\
+        .group_by(CarDailyStats.CarId).order_by(func.sum(CarDailyStats.Revenue).desc(), CarDailyStats.CarId)
+
+
+report_sample = {'content': {'CompanyID': 1, 'CarId': 1, 'DateFrom': '01-01-2030', 'DateTo': '31-01-2030'}}
+explained_queries['report_company'] = lambda: report_rows(CompanyDailyStats, CompanyDailyStats.CompanyID,
+                                                          report_sample).order_by(CompanyDailyStats.Day)
+explained_queries['report_car'] = lambda: report_rows(CarDailyStats, CarDailyStats.CarId,
+                                                      report_sample).order_by(CarDailyStats.Day)
+explained_queries['report_company_cars'] = lambda: company_cars_query(report_sample)
+
+
+def report_to_dict(values):
+    """Метод для преобразования показателей сводки в словарь ответа (комиссия в рублях)"""
+    return {
+        'Orders': int(values['Orders'] or 0),
+        'Revenue': int(values['Revenue'] or 0),
+        'Comission': str(decimal.Decimal(int(values['ComissionCents'] or 0)).scaleb(-2)),
+        'Days': int(values['Days'] or 0)
+    }
+
+
+def report_daily(stats, key_column, data):
+    """Метод для заполнения ответа дневной сводкой и итогом за период"""
+    rows = report_rows(stats, key_column, data).order_by(stats.Day).all()
+    total = dict.fromkeys(report_measures, 0)
+    content = []
+    for row in rows:
+        values = {name: getattr(row, name) for name in report_measures}
+        for name in report_measures:
+            total[name] += values[name]
+        content.append(dict(report_to_dict(values), Day=row.Day.isoformat()))
+    data['content'] = content
+    data['total'] = report_to_dict(total)
+    data['status'] = '200'
+    data['message'] = 'Сводка за дней: ' + str(len(rows))
+    logger.info(data['message'] + ' ' + data['status'])
+    return data
+
+
+@read_only
+@check_500
+@check_admin
+def report_company(data):
+    """
+    Метод для получения дневной сводки компании\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента (admin_key, CompanyID, DateFrom, DateTo)\r\n
+    Возвращаемое значение:\r\n
+        data: словарь со сводкой по дням (content) и итогом за период (total)\r\n
+    """
+    return report_daily(CompanyDailyStats, CompanyDailyStats.CompanyID, data)
+
+
+@read_only
+@check_500
+@check_admin
+def report_car(data):
+    """
+    Метод для получения дневной сводки автомобиля\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента (admin_key, CarId, DateFrom, DateTo)\r\n
+    Возвращаемое значение:\r\n
+        data: словарь со сводкой по дням (content) и итогом за период (total)\r\n
+    """
+    return report_daily(CarDailyStats, CarDailyStats.CarId, data)
+
+
+@read_only
+@check_500
+@check_admin
+def report_company_cars(data):
+    """
+    Метод для получения итогов по каждому автомобилю компании за период\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента (admin_key, CompanyID, DateFrom, DateTo)\r\n
+    Возвращаемое значение:\r\n
+        data: словарь с итогами автомобилей по убыванию выручки\r\n
+    """
+    rows = company_cars_query(data).all()
+    data['content'] = [dict(report_to_dict(row._asdict()), CarId=row.CarId) for row in rows]
+    data['status'] = '200'
+    data['message'] = 'Сводка по автомобилям компании: ' + str(len(rows))
+    logger.info(data['message'] + ' ' + data['status'])
+    return data
+
+
+def run_batch_item(item, token):
+    """
+    Метод для выполнения одного запроса пакета\r\n
+    Параметры:\r\n
+        item: словарь запроса {endpoint, action, content}\r\n
+        token: токен пакета\r\n
+    Возвращаемое значение:\r\n
+        словарь с ответом обработчика без токена\r\n
+    """
+    data = {'endpoint': item.get('endpoint'), 'action': item.get('action'), 'content': item.get('content') or {},
+            'token': token}
+    handler = endpoints_dict.get(data['endpoint'], {}).get(data['action']) if data['endpoint'] != 'batch' else None
+    if handler is None:
+        data['status'] = '404'
+        data['message'] = 'Действие ' + str(data['endpoint']) + '.' + str(data['action']) + ' не найдено'
+        logger.error(data['message'] + ' ' + data['status'])
+    elif getattr(request_context, 'batch_transaction', False):
+        info = {key: copy.copy(value) for key, value in session.info.items()}
+        savepoint = session.begin_nested()  # session.commit() обработчика фиксирует только точку сохранения
+        data = handler(data)
+        if session().in_nested_transaction():
+            if data.get('status') == '200':
+                savepoint.commit()  # обработчик чтения
+            else:  # изменения запроса с ошибкой отменяются, изменения предыдущих запросов сохраняются
+                savepoint.rollback()
+                restore_session_changes(session(), info)
+    else:
+        data = handler(data)
+    if isinstance(data, CachedReply):
+        data = Rabbit_codec.decode_message(data.body, data.content_type)
+    data.pop('token', None)
+    return data
+
+
+batch_token_actions = {  # действия, меняющие токены в Tarantool: их нельзя отменить вместе с транзакцией пакета
+    ('clients', 'sign_up'), ('clients', 'sign_in'), ('clients', 'del_client'), ('clients', 'log_out')
+}
+
+
+def batch_item_aborts(item, reply):
+    """
+    Метод для проверки, отменяет ли ответ запроса транзакцию пакета
+
+    Параметры:
+
+        item: словарь запроса пакета
+
+        reply: ответ на запрос
+
+    Возвращаемое значение:
+
+        True, если завершился с ошибкой запрос записи или обработчик отменил всю транзакцию
+
+    """
+    if reply.get('status') == '200':
+        return False
+    return Rabbit_codec.request_class(item) == 'write' or not session().in_transaction()
+
+
+def commit_batch_transaction():
+    """
+    Метод для фиксации транзакции пакета\r\n
+    Возвращаемое значение:\r\n
+        True, если транзакция зафиксирована. При ошибке транзакция отменяется, а discard_session_changes
+        снимает резервирования пакета в availability_index\r\n
+    """
+    try:
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        logger.error('Транзакция пакета отменена: ' + str(e))
+        return False
+
+
+@check_500
+@check_token
+def run_batch(data):
+    """
+    Метод для выполнения нескольких запросов клиента за один обмен сообщениями\r\n
+    Токен проверяется один раз, запросы выполняются по порядку в одной сессии БД. При transaction
+    все запросы выполняются в одной транзакции (каждый в своей точке сохранения), ошибка запроса записи
+    отменяет изменения всего пакета, следующие запросы не выполняются. Ошибка запроса чтения (например,
+    404 get_car) транзакцию не отменяет. Действия с токенами (batch_token_actions) в транзакции запрещены.
+    Индексы и кэши в памяти обновляются только после фиксации всей транзакции\r\n
+    Параметры:\r\n
+        data: словарь с информацией полученной от клиента (items - список запросов {endpoint, action, content},
+        необязательный transaction)\r\n
+    Возвращаемое значение:\r\n
+        data: словарь со списком ответов на запросы пакета в content\r\n
+    """
+    items = data['content'].get('items') or []
+    transaction = bool(data['content'].get('transaction'))
+    if len(items) > config['max_batch_items']:
+        data['content'] = []
+        data['status'] = '403'
+        data['message'] = 'В пакете больше ' + str(config['max_batch_items']) + ' запросов, действие запрещено'
+        logger.error(data['message'] + ' ' + data['status'])
+        return data
+    if transaction and any((item.get('endpoint'), item.get('action')) in batch_token_actions
+                           for item in items if isinstance(item, dict)):
+        data['content'] = []
+        data['status'] = '403'
+        data['message'] = 'Вход, регистрация, выход и удаление клиента в транзакции пакета запрещены'
+        logger.error(data['message'] + ' ' + data['status'])
+        return data
+    session.rollback()  # запросы пакета не используют снимок БД, открытый при проверке токена
+    request_context.batch_token = (data['token'], request_context.person.Id)
+    request_context.batch_transaction = transaction
+    results = []
+    try:
+        aborted = False
+        for item in items:
+            results.append(run_batch_item(item, data['token']))
+            if transaction and batch_item_aborts(item, results[-1]):
+                aborted = True
+                break
+            if not transaction:
+                session.rollback()  # каждый запрос видит изменения предыдущих, как отдельный запрос
+        request_context.batch_transaction = False  # изменения пакета переносятся в индексы только после фиксации
+        if aborted:
+            session.rollback()
+            data['status'] = results[-1].get('status')
+            data['message'] = 'Пакет запросов отменен, ошибка в запросе ' + str(len(results)) + ': ' + \
+                              str(results[-1].get('message'))
+            logger.error(data['message'] + ' ' + data['status'])
+        elif transaction and not commit_batch_transaction():
+            results = []
+            data['status'] = '500'
+            data['message'] = 'Пакет запросов отменен, ошибка фиксации транзакции'
+            logger.error(data['message'] + ' ' + data['status'])
+        else:
+            data['status'] = '200'
+            data['message'] = 'Выполнено запросов пакета: ' + str(len(results))
+            logger.info(data['message'] + ' ' + data['status'])
+    finally:
+        request_context.batch_token = None
+        request_context.batch_transaction = False
+    data['content'] = results
+    return data
+
+
+cars_dict = {
+    'get_cars': Car.get_cars,
+    'get_car': Car.get_car,
+    'get_free_cars': Car.get_free_cars,
+    'search': Car.search
+}
+person_dict = {
+    'sign_up': Person.sign_up,
+    'sign_in': Person.sign_in,
+    'get_client': Person.get_client,
+    'del_client': Person.del_client,
+    'edit_pass': Person.edit_pass,
+    'edit_client': Person.edit_client,
+    'log_out': Person.log_out,
+    'add_favorite': Favorite.add_favorite,
+    'del_favorite': Favorite.del_favorite,
+    'get_favorites': Favorite.get_favorites
+}
+contract_dict = {
+    'add_order': Contract.add_order,
+    'get_order': Contract.get_order,
+    'get_orders': Contract.get_orders,
+    'quote': Contract.quote,
+}
+admin_dict = {
+    'import_fleet': admin_import_fleet,
+    'export_fleet': admin_export_fleet,
+    'get_job': admin_get_job,
+    'get_archive': admin_get_archive
+}
+reports_dict = {
+    'company': report_company,
+    'car': report_car,
+    'company_cars': report_company_cars
+}
+batch_dict = {
+    'run': run_batch
+}
+endpoints_dict = {
+    'cars': cars_dict,
+    'clients': person_dict,
+    'orders': contract_dict,
+    'admin': admin_dict,
+    'reports': reports_dict,
+    'batch': batch_dict
+}
+# обработчики, изменяющие БД (объединяются в общую транзакцию в режиме group_commit), - те же действия записи,
+# по которым клиент выбирает очередь (Rabbit_codec.WRITE_ACTIONS)
+write_handlers = {endpoints_dict[endpoint][action] for endpoint, action in Rabbit_codec.WRITE_ACTIONS}
+
+
+def unit_of_work(any_func):
+    u"""
+    Декоратор для выполнения обработчика в отдельной сессии БД\r\n
+    Изменения фиксируются обработчиком (session.commit), незафиксированные изменения откатываются
+    при закрытии сессии, после чего соединение возвращается в пул, а identity map очищается\r\n
+    """
+    @wraps(any_func)
+    def working(data):
+        try:
+            return any_func(data)
+        finally:
+            session.remove()
+
+    return working
+
+
+class GroupCommitter:
+    u"""
+    Поток группового фиксирования изменений\r\n
+    Обработчики записи, поступившие в течение окна window (или до max_batch штук), выполняются
+    в одной транзакции, каждый в своей точке сохранения (SAVEPOINT). session.commit() внутри
+    обработчика фиксирует только его точку сохранения, ошибка одного обработчика откатывает
+    только ее. Индексы и кэши в памяти обновляются, а ответы возвращаются после фиксации всей транзакции.
+    Обработчики очередей не ждут фиксации (enqueue), поэтому размер группы ограничен prefetch очереди
+    записи и async_concurrency, а не числом обработчиков\r\n
+    """
+    def __init__(self, window, max_batch):
+        self.window = window
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.operations = 0
+        self.thread = Thread(target=self.run, name='group-commit', daemon=True)
+
+    def enqueue(self, handler, data):
+        """
+        Метод для добавления обработчика в ближайшую групповую транзакцию без ожидания ее фиксации\r\n
+        Параметры:\r\n
+            handler: обработчик записи\r\n
+            data: словарь с информацией полученной от клиента\r\n
+        Возвращаемое значение:\r\n
+            Future с ответом обработчика (результат устанавливается после фиксации транзакции)\r\n
+        """
+        future = Future()
+        self.requests.put((handler, data, future))
+        return future
+
+    def submit(self, handler, data):
+        """
+        Метод для выполнения обработчика в ближайшей групповой транзакции\r\n
+        Возвращаемое значение:\r\n
+            словарь с ответом обработчика после фиксации транзакции\r\n
+        """
+        return self.enqueue(handler, data).result()
+
+    def run(self):  # pragma: no cover
+        """Метод для сбора и фиксации групп запросов"""
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.commit_batch(batch)
+
+    def commit_batch(self, batch):
+        """
+        Метод для выполнения группы обработчиков в одной транзакции\r\n
+        Фиксация точки сохранения вызывает after_commit, поэтому на время выполнения обработчиков перенос
+        изменений в память откладывается (commit_deferred) и выполняется один раз после фиксации транзакции.
+        При отмене транзакции запомненные изменения сбрасываются (discard_session_changes)\r\n
+        """
+        results = []
+        request_context.batch_transaction = True
+        try:
+            for handler, data, future in batch:
+                info = {key: copy.copy(value) for key, value in session.info.items()}
+                savepoint = session.begin_nested()
+                results.append(handler(data))
+                if session().in_nested_transaction():  # обработчик не зафиксировал изменения или завершился с ошибкой
+                    savepoint.rollback()
+                    restore_session_changes(session(), info)
+            request_context.batch_transaction = False
+            session.commit()
+        except Exception as e:
+            request_context.batch_transaction = False
+            session.rollback()
+            logger.error('Групповая транзакция отменена: ' + str(e))
+            for handler, data, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            request_context.batch_transaction = False
+            session.remove()
+        with self.lock:
+            self.batches += 1
+            self.operations += len(batch)
+        for (handler, data, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        """Метод для получения статистики групповых транзакций"""
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'operations': self.operations,
+                'avg_batch': round(self.operations / self.batches, 2) if self.batches else 0.0
+            }
+
+
+group_committer = GroupCommitter(config['group_commit_window_ms'] / 1000, config['group_commit_max_batch']) \
+    if config['group_commit'] else None
+
+
+def run_handler(handler, data, content_type=Rabbit_codec.JSON, publish=None):
+    """
+    Метод для выполнения обработчика в отдельной сессии БД или в групповой транзакции\r\n
+    Параметры:\r\n
+        handler: обработчик запроса\r\n
+        data: словарь с информацией полученной от клиента\r\n
+        content_type: формат ответа (сериализаторы и кэш ответов учитывают его через request_context)\r\n
+        publish: функция publish(body, seq) для отправки частей потокового ответа (None - без потока)\r\n
+    """
+    if group_committer is not None and handler in write_handlers:
+        return group_committer.submit(handler, data)
+    request_context.content_type = content_type
+    request_context.publish = publish
+    try:
+        return unit_of_work(handler)(data)
+    finally:
+        request_context.content_type = Rabbit_codec.JSON
+        request_context.publish = None
+
+
+def dispatch(client_data, content_type=Rabbit_codec.JSON, publish=None):
+    """
+    Метод для вызова обработчика по endpoint и action запроса\r\n
+    Параметры:\r\n
+        client_data: словарь с информацией полученной от клиента\r\n
+        content_type: формат ответа\r\n
+        publish: функция отправки частей потокового ответа\r\n
+    Возвращаемое значение:\r\n
+        словарь с ответом обработчика\r\n
+    """
+    handler = find_handler(endpoints_dict, client_data)
+    if handler is None:
+        return not_found(client_data)
+    return run_handler(handler, client_data, content_type, publish)
+
+
+def find_handler(handlers, client_data):
+    """
+    Метод для поиска обработчика по endpoint и action запроса\r\n
+    Параметры:\r\n
+        handlers: словарь endpoint -> словарь action -> обработчик\r\n
+        client_data: словарь с информацией полученной от клиента\r\n
+    Возвращаемое значение:\r\n
+        обработчик или None, если endpoint или action не найден\r\n
+    """
+    return handlers.get(client_data.get('endpoint'), {}).get(client_data.get('action'))
+
+
+def not_found(client_data):
+    """
+    Метод для ответа на запрос с неизвестным endpoint или action\r\n
+    Параметры:\r\n
+        client_data: словарь с информацией полученной от клиента\r\n
+    Возвращаемое значение:\r\n
+        словарь с ответом 404\r\n
+    """
+    return error_reply('404', 'Действие ' + str(client_data.get('endpoint')) + '.' + str(client_data.get('action')) +
+                       ' не найдено')
+
+
+def error_reply(status, message):
+    """
+    Метод для ответа клиенту на запрос, который не удалось обработать\r\n
+    Параметры:\r\n
+        status: код ответа\r\n
+        message: сообщение об ошибке\r\n
+    Возвращаемое значение:\r\n
+        словарь с ответом\r\n
+    """
+    logger.error(message + ' ' + status)
+    return {'content': [], 'status': status, 'message': message}
+
+
+def decode_request(props, body):
+    """
+    Метод для декодирования сообщения запроса клиента\r\n
+    Параметры:\r\n
+        props: свойства сообщения запроса\r\n
+        body: тело сообщения\r\n
+    Возвращаемое значение:\r\n
+        словарь с информацией полученной от клиента\r\n
+    """
+    client_data = Rabbit_codec.decode_message(Rabbit_codec.decompress(body, props.content_encoding),
+                                              props.content_type)
+    if not isinstance(client_data, dict):
+        raise ValueError('запрос должен быть словарем')
+    return client_data
+
+
+def encode_reply(reply, content_type=Rabbit_codec.JSON):
+    """
+    Метод для кодирования ответа клиенту\r\n
+    Параметры:\r\n
+        reply: словарь с ответом обработчика или CachedReply\r\n
+        content_type: формат ответа\r\n
+    Возвращаемое значение:\r\n
+        тело сообщения\r\n
+    """
+    if isinstance(reply, CachedReply):
+        return reply.encode()
+    return Rabbit_codec.encode_message(reply, content_type)
+
+
+def reply_properties(props, content_type, body, headers=None):
+    """
+    Метод для подготовки ответа клиенту: тело сжимается, если клиент указал accept_encoding deflate\r\n
+    Параметры:\r\n
+        props: свойства сообщения запроса\r\n
+        content_type: формат ответа\r\n
+        body: закодированное тело ответа\r\n
+        headers: заголовки ответа (stream_seq, stream_end)\r\n
+    Возвращаемое значение:\r\n
+        (тело ответа, свойства ответа pika.BasicProperties)\r\n
+    """
+    content_encoding = None
+    if Rabbit_codec.accepts_deflate(props.headers):
+        body, content_encoding = compressor.compress(body)
+    return body, pika.BasicProperties(correlation_id=props.correlation_id, content_type=content_type,
+                                      content_encoding=content_encoding, headers=headers)
+
+
+def server_thread(queue_class):  # pragma: no cover
+    """
+    Метод для запуска обработчика очереди запросов класса queue_class в потоке\r\n
+    Каждый обработчик использует собственное соединение с RabbitMQ, канал и сессию БД\r\n
+    Сообщение подтверждается после отправки ответа клиенту. На некорректный запрос отправляется ответ 400,
+    на ошибку обработки - 500, сообщение при этом тоже подтверждается, чтобы не обрабатываться повторно\r\n
+    Параметры:\r\n
+        queue_class: класс запросов очереди (read или write)\r\n
+    """
+    queue_name = config['request_queues'][queue_class]['queue']
+    worker_connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
+    worker_channel = worker_connection.channel()
+    declare_request_queues(worker_channel)
+    grouped = group_committer is not None and queue_class == 'write'
+    # запросы записи ждут фиксации групповой транзакции без блокировки обработчика, поэтому размер группы
+    # ограничен числом неподтвержденных сообщений
+    worker_channel.basic_qos(prefetch_count=config['group_commit_max_batch'] if grouped else config['prefetch_count'])
+
+    def respond(method, props, content_type, future):
+        """Метод для отправки ответа после фиксации групповой транзакции (в потоке соединения)"""
+        try:
+            try:
+                reply = encode_reply(future.result(), content_type)
+            except Exception as e:
+                reply = encode_reply(error_reply('500', 'Произошла ошибка на сервере: ' + str(e)), content_type)
+            if props.reply_to:
+                reply, properties = reply_properties(props, content_type, reply)
+                worker_channel.basic_publish(exchange='', routing_key=props.reply_to, properties=properties, body=reply)
+        finally:
+            worker_channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    def callback(ch, method,  props, body):
+        content_type = Rabbit_codec.negotiate(props.content_type)
+        headers = None
+        deferred = False
+        try:
+            try:
+                client_data = decode_request(props, body)
+            except Exception as e:
+                reply = encode_reply(error_reply('400', 'Некорректный запрос: ' + str(e)), content_type)
+            else:
+                # неверно направленный запрос записи
+                if queue_class == 'read' and Rabbit_codec.request_class(client_data) == 'write':
+                    ch.basic_publish(exchange=config['request_exchange'], routing_key='write', properties=props,
+                                     body=body)
+                    return
+
+                def publish(body, seq):
+                    body, properties = reply_properties(props, content_type, body, {'stream_seq': seq})
+                    ch.basic_publish(exchange='', routing_key=props.reply_to, properties=properties, body=body)
+
+                handler = find_handler(endpoints_dict, client_data)
+                if grouped and handler in write_handlers:  # ответ отправит respond после фиксации группы
+                    future = group_committer.enqueue(handler, client_data)
+                    deferred = True
+                    future.add_done_callback(lambda done: worker_connection.add_callback_threadsafe(
+                        partial(respond, method, props, content_type, done)))
+                    return
+
+                headers = {'stream_end': True} if client_data.get('stream') else None
+                try:
+                    reply = encode_reply(dispatch(client_data, content_type, publish), content_type)
+                except Exception as e:
+                    reply = encode_reply(error_reply('500', 'Произошла ошибка на сервере: ' + str(e)), content_type)
+                client_data = {}
+            if props.reply_to:
+                reply, properties = reply_properties(props, content_type, reply, headers)
+                ch.basic_publish(exchange='', routing_key=props.reply_to, properties=properties, body=reply)
+        finally:
+            if not deferred:
+                ch.basic_ack(delivery_tag=method.delivery_tag)  # сообщение с ошибкой не возвращается в очередь
+
+    worker_channel.basic_consume(queue=queue_name, on_message_callback=callback)
+    try:
+        worker_channel.start_consuming()
+    finally:
+        session.remove()
+        if worker_connection.is_open:
+            worker_connection.close()
+
+
+def worker_loop(queue_class, number):  # pragma: no cover
+    """
+    Метод для работы обработчика с перезапуском после сбоя\r\n
+    Неподтвержденные сообщения упавшего обработчика возвращаются в очередь брокером. Перед перезапуском
+    выдерживается пауза, которая удваивается при повторных сбоях до worker_restart_max_delay\r\n
+    Параметры:\r\n
+        queue_class: класс запросов очереди (read или write)\r\n
+        number: номер обработчика\r\n
+    """
+    delay = config['worker_restart_delay']
+    while True:
+        started = time.monotonic()
+        try:
+            server_thread(queue_class)
+        except Exception as e:
+            logger.error('Обработчик ' + queue_class + '-' + str(number) + ' остановлен с ошибкой: ' + str(e) +
+                         '. Перезапуск через ' + str(delay) + ' с')
+        if time.monotonic() - started > config['worker_restart_max_delay']:  # обработчик долго работал без сбоев
+            delay = config['worker_restart_delay']
+        time.sleep(delay)
+        delay = min(delay * 2, config['worker_restart_max_delay'])
+
+
+def stats_thread():  # pragma: no cover
+    """Метод для периодической записи статистики кэшей сервера в лог"""
+    while True:
+        time.sleep(config['stats_interval'])
+        logger.info('Кэш токенов: ' + str(token_cache.stats()))
+        logger.info('Кэш ответов каталога: ' + str(response_cache.stats()))
+        logger.info('Кэш тарифов: ' + str(price_cache.stats()))
+        logger.info('Сжатие ответов: ' + str(compressor.stats()))
+        if group_committer is not None:
+            logger.info('Групповые транзакции: ' + str(group_committer.stats()))
+
+
+def archive_thread():  # pragma: no cover
+    """Метод для периодического переноса давно удаленных строк в архивные таблицы"""
+    while True:
+        time.sleep(config['archive_interval'])
+        try:
+            archive_deleted()
+        except Exception as e:
+            logger.error('Ошибка переноса в архив: ' + str(e))
+
+
+def launch_server():  # pragma: no cover
+    """Метод для инициализации сервера и запуска пула обработчиков очереди"""
+    logger.info('****** RabbitMq ******')
+    logger.info('Срвер запущен по адресу ' + config['address'] + ':' + str(config['port']))
+    for queue_class, settings in config['request_queues'].items():
+        logger.info('Очередь ' + settings['queue'] + ' (' + queue_class + '): обработчиков ' +
+                    str(settings['workers']) + ', prefetch: ' + str(config['prefetch_count']))
+    if config['catalog_index']:
+        load_catalog_index()
+    load_availability_index()
+    clear_tokens()
+    if group_committer is not None:
+        group_committer.thread.start()
+    Thread(target=stats_thread, name='stats', daemon=True).start()
+    if config['archive_interval']:
+        Thread(target=archive_thread, name='archive', daemon=True).start()
+    if config['reload_check_interval']:
+        Thread(target=reload_thread, name='reload', daemon=True).start()
+    workers = []
+    for queue_class, settings in config['request_queues'].items():
+        for number in range(settings['workers']):
+            worker = Thread(target=worker_loop, args=(queue_class, number), name=queue_class + '-' + str(number),
+                            daemon=True)
+            worker.start()
+            workers.append(worker)
+    for worker in workers:
+        worker.join()
+
+
+###########################################################################################################
+def to_async(any_func):
+    u"""
+    Декоратор для получения awaitable-версии обработчика\r\n
+    Блокирующие вызовы SQLite и Tarantool выполняются в ограниченном пуле исполнителя цикла событий,
+    сам цикл событий при этом не блокируется\r\n
+    """
+    @wraps(any_func)
+    async def awaiting(data, content_type=Rabbit_codec.JSON, publish=None, executor=None):
+        if group_committer is not None and any_func in write_handlers:  # исполнитель не ждет фиксации группы
+            return await asyncio.wrap_future(group_committer.enqueue(any_func, data))
+        return await asyncio.get_running_loop().run_in_executor(executor, run_handler, any_func, data, content_type,
+                                                                publish)
+
+    return awaiting
+
+
+async_endpoints_dict = {
+    endpoint: {action: to_async(func) for action, func in actions.items()}
+    for endpoint, actions in endpoints_dict.items()
+}
+
+
+async def async_dispatch(client_data, content_type=Rabbit_codec.JSON, publish=None, executor=None):
+    """
+    Метод для асинхронного вызова обработчика по endpoint и action запроса\r\n
+    Параметры:\r\n
+        client_data: словарь с информацией полученной от клиента\r\n
+        content_type: формат ответа\r\n
+        publish: функция отправки частей потокового ответа (вызывается из потока исполнителя)\r\n
+        executor: пул исполнителей очереди запроса (None - пул по умолчанию)\r\n
+    Возвращаемое значение:\r\n
+        словарь с ответом обработчика\r\n
+    """
+    handler = find_handler(async_endpoints_dict, client_data)
+    if handler is None:
+        return not_found(client_data)
+    return await handler(client_data, content_type, publish, executor)
+
+
+async def async_server():  # pragma: no cover
+    """
+    Метод для обработки очередей запросов в цикле событий asyncio\r\n
+    Каждое сообщение обрабатывается отдельной задачей. У каждой очереди свой канал, свой семафор
+    async_concurrency и свой пул исполнителей async_db_workers, поэтому запросы записи
+    не задерживают запросы чтения\r\n
+    """
+    loop = asyncio.get_running_loop()
+    closed = loop.create_future()
+
+    async def handle(ch, method, props, body, queue_class, semaphore, executor):
+        async with semaphore:
+            content_type = Rabbit_codec.negotiate(props.content_type)
+
+            async def send(body, properties):
+                ch.basic_publish(exchange='', routing_key=props.reply_to, properties=properties, body=body)
+
+            def publish(body, seq):  # поток исполнителя ждет отправки части, поэтому в памяти не копятся части
+                asyncio.run_coroutine_threadsafe(send(*reply_properties(props, content_type, body, {'stream_seq': seq})),
+                                                 loop).result()
+
+            headers = None
+            try:
+                try:
+                    client_data = decode_request(props, body)
+                except Exception as e:
+                    reply = encode_reply(error_reply('400', 'Некорректный запрос: ' + str(e)), content_type)
+                else:
+                    # неверно направленный запрос записи
+                    if queue_class == 'read' and Rabbit_codec.request_class(client_data) == 'write':
+                        ch.basic_publish(exchange=config['request_exchange'], routing_key='write', properties=props,
+                                         body=body)
+                        return
+                    headers = {'stream_end': True} if client_data.get('stream') else None
+                    try:
+                        reply = encode_reply(await async_dispatch(client_data, content_type, publish, executor),
+                                             content_type)
+                    except Exception as e:
+                        reply = encode_reply(error_reply('500', 'Произошла ошибка на сервере: ' + str(e)), content_type)
+                if props.reply_to:
+                    # сжатие выполняется в пуле исполнителя, чтобы не задерживать цикл событий
+                    await send(*await loop.run_in_executor(executor, reply_properties, props, content_type, reply,
+                                                           headers))
+            except Exception as e:
+                logger.error('Ошибка отправки ответа: ' + str(e))
+            finally:
+                ch.basic_ack(delivery_tag=method.delivery_tag)  # сообщение с ошибкой не возвращается в очередь
+
+    def consume(conn, queue_class, settings):
+        semaphore = asyncio.Semaphore(settings['async_concurrency'])
+        executor = ThreadPoolExecutor(max_workers=settings['async_db_workers'], thread_name_prefix=queue_class)
+
+        def callback(ch, method, props, body):
+            loop.create_task(handle(ch, method, props, body, queue_class, semaphore, executor))
+
+        def on_channel_open(ch):
+            def on_exchange_declared(frame):
+                ch.queue_declare(queue=settings['queue'], arguments=request_queue_arguments(), callback=on_queue_declared)
+
+            def on_queue_declared(frame):
+                ch.queue_bind(queue=settings['queue'], exchange=config['request_exchange'], routing_key=queue_class,
+                              callback=on_queue_bound)
+
+            def on_queue_bound(frame):
+                ch.basic_qos(prefetch_count=settings['async_concurrency'],
+                             callback=lambda frame: ch.basic_consume(queue=settings['queue'], on_message_callback=callback))
+
+            ch.exchange_declare(exchange=config['request_exchange'], exchange_type='direct', callback=on_exchange_declared)
+
+        conn.channel(on_open_callback=on_channel_open)
+
+    def on_open(conn):
+        for queue_class, settings in config['request_queues'].items():
+            consume(conn, queue_class, settings)
+
+    def on_close(conn, reason):
+        if not closed.done():
+            closed.set_result(reason)
+
+    AsyncioConnection(pika.ConnectionParameters(host='localhost'),
+                      on_open_callback=on_open,
+                      on_open_error_callback=on_close,
+                      on_close_callback=on_close,
+                      custom_ioloop=loop)
+    reason = await closed
+    logger.error('Соединение с RabbitMQ закрыто: ' + str(reason))
+
+
+def launch_async_server():  # pragma: no cover
+    """Метод для инициализации сервера в режиме asyncio"""
+    logger.info('****** RabbitMq (asyncio) ******')
+    logger.info('Срвер запущен по адресу ' + config['address'] + ':' + str(config['port']))
+    for queue_class, settings in config['request_queues'].items():
+        logger.info('Очередь ' + settings['queue'] + ' (' + queue_class + '): одновременных запросов ' +
+                    str(settings['async_concurrency']) + ', исполнителей БД: ' + str(settings['async_db_workers']))
+    if config['catalog_index']:
+        load_catalog_index()
+    load_availability_index()
+    clear_tokens()
+    if group_committer is not None:
+        group_committer.thread.start()
+    Thread(target=stats_thread, name='stats', daemon=True).start()
+    if config['archive_interval']:
+        Thread(target=archive_thread, name='archive', daemon=True).start()
+    if config['reload_check_interval']:
+        Thread(target=reload_thread, name='reload', daemon=True).start()
+    asyncio.run(async_server())
+
+
+def clear_tokens():  # pragma: no cover
+    """Метод для удаления всех записей в Tarantool (очистка перед каждым запуском, в будущем можно очищать раз в 24 часа)"""
+    connection_tarantool.call('box.space.user_token:truncate', ())
+
+
+def migrate_indexes():  # pragma: no cover
+    """
+    Метод для создания в существующей базе данных новых таблиц, индексов из моделей и полнотекстового индекса
+    и удаления неиспользуемых индексов (dropped_indexes)\r\n
+    """
+    Base.metadata.create_all(db_engine)  # только отсутствующие таблицы (архивные, сводки)
+    with db_engine.begin() as conn:
+        for name in dropped_indexes:
+            conn.exec_driver_sql('DROP INDEX IF EXISTS "' + name + '"')
+            logger.info('Индекс ' + name + ' удален или отсутствует')
+    for model_table in Base.metadata.sorted_tables:
+        for index in model_table.indexes:
+            index.create(bind=db_engine, checkfirst=True)
+            logger.info('Индекс ' + index.name + ' создан или уже существует')
+    with db_engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'Cars_fts'")).first() is not None
+        for statement in car_search_ddl:
+            conn.exec_driver_sql(statement)
+        if not exists:
+            conn.exec_driver_sql('INSERT INTO "Cars_fts"("Cars_fts") VALUES (\'rebuild\')')
+    logger.info('Полнотекстовый индекс Cars_fts ' + ('уже существует' if exists else 'создан и заполнен'))
+
+
+def explain_queries():
+    """
+    Метод для проверки планов запросов всех обработчиков (explained_queries) через EXPLAIN QUERY PLAN\r\n
+    Возвращаемое значение:\r\n
+        количество запросов, выполняющих полный просмотр таблицы\r\n
+    """
+    full_scans = 0
+    for name, build in explained_queries.items():
+        query = build()
+        statement = getattr(query, 'statement', query)  # запрос ORM или select()
+        sql = str(statement.compile(dialect=db_engine.dialect, compile_kwargs={'literal_binds': True}))
+        plan = [row[3] for row in session.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+        scans = [step for step in plan if step.startswith('SCAN') and 'USING' not in step and
+                 'VIRTUAL TABLE INDEX' not in step]
+        full_scans += len(scans)
+        if scans:
+            logger.error(name + ': полный просмотр таблицы: ' + '; '.join(plan))
+        else:
+            logger.info(name + ': ' + '; '.join(plan))
+    session.remove()
+    return full_scans
+
+
+# Base.metadata.create_all(db_engine)
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        migrate_indexes()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'explain':
+        sys.exit(1 if explain_queries() else 0)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'rebuild_reports':
+        rebuild_reports()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'archive':
+        archive_deleted(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    elif len(sys.argv) > 3 and sys.argv[1] == 'import':
+        import_result = import_fleet(sys.argv[2], sys.argv[3])
+        bump_data_version()  # работающий сервер перезагрузит индекс каталога и кэши (reload_check_interval)
+        sys.exit(1 if import_result['skipped'] else 0)
+    elif len(sys.argv) > 3 and sys.argv[1] == 'export':
+        export_fleet(sys.argv[2], sys.argv[3])
+    elif config['server_mode'] == 'asyncio':
+        launch_async_server()
+    else:
+        launch_server()
@@ -0,0 +1,76 @@
+"""
+Бенчмарк get_cars: индекс каталога в памяти (NumPy) против запроса к SQLite\r\n
+Каждый запрос выполняется обработчиком get_cars целиком (проверка токена, поиск, загрузка строк страницы,
+сериализация), кэш ответов отключен. Путь через индекс в том же вызове считает facets, поэтому для
+сравнения приводится и время SQL с подсчетом facets запросами GROUP BY\r\n
+Запуск: python bench/catalog_index.py --cars 100000
+"""
+import argparse
+
+from sqlalchemy import func
+
+from common import add_fleet, load_server, measure, print_table, reply_dict, sign_up
+
+
+def catalog_requests(category_id):
+    """Набор запросов каталога: от одной категории до фильтров с сортировкой и второй страницей"""
+    return {
+        'категория': {'CategoryID': category_id},
+        'категория + 2 фильтра': {'CategoryID': category_id, 'Transmission': 1, 'Car_type': 2},
+        'диапазоны цены и года': {'CategoryID': category_id, 'Price_min': 3000, 'Price_max': 6000,
+                                  'Year_min': 2015},
+        'сортировка по цене (desc)': {'CategoryID': category_id, 'order_by': 'Price', 'desc': True},
+        'вторая страница по цене': {'CategoryID': category_id, 'order_by': 'Price', 'after_id': 1000,
+                                    'after_value': 5000},
+        'редкое сочетание': {'CategoryID': category_id, 'Transmission': 0, 'Engine': 1, 'Car_type': 5,
+                             'Drive': 2, 'Power_min': 350},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\r\n')[0])
+    parser.add_argument('--cars', type=int, default=100000, help='число автомобилей')
+    parser.add_argument('--limit', type=int, default=50, help='размер страницы')
+    parser.add_argument('--repeat', type=int, default=50, help='число замеров каждого запроса')
+    args = parser.parse_args()
+
+    server = load_server(response_cache_size=0)  # каждый вызов выполняет обработчик
+    add_fleet(server, args.cars)
+    server.load_catalog_index()
+    client_id, token = sign_up(server)
+    category_id = server.session.query(server.Category.Id).first()[0]
+    server.session.remove()
+
+    def get_cars(content, catalog_index):
+        def call():
+            server.config['catalog_index'] = catalog_index
+            return server.dispatch({'endpoint': 'cars', 'action': 'get_cars', 'token': token,
+                                    'content': dict(content, limit=args.limit)})
+        reply = reply_dict(server, call())
+        assert reply['status'] in ('200', '404'), reply['message']
+        return call
+
+    def sql_facets(content):
+        def call():
+            filters = {name: value for name, value in content.items()
+                       if name not in ('order_by', 'desc', 'after_id', 'after_value')}
+            cars = server.catalog_query(filters).order_by(None).subquery()
+            for field in server.car_facet_fields:
+                server.session.query(cars.c[field], func.count()).group_by(cars.c[field]).all()
+            server.session.remove()
+        return call
+
+    rows = []
+    for name, content in catalog_requests(category_id).items():
+        sql = measure(get_cars(content, False), args.repeat)
+        facets = measure(sql_facets(content), args.repeat)
+        index = measure(get_cars(content, True), args.repeat)
+        rows.append([name, '%.2f' % sql, '%.2f' % (sql + facets), '%.2f' % index,
+                     '%.1fx' % ((sql + facets) / index)])
+    print('get_cars, ' + str(args.cars) + ' ТС, страница ' + str(args.limit) + ', медиана ' + str(args.repeat) +
+          ' вызовов')
+    print_table(['запрос', 'SQL, мс', 'SQL + facets, мс', 'индекс + facets, мс', 'ускорение'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Общие функции бенчмарков сервера\r\n
+Сервер загружается без RabbitMQ и Tarantool (соединение с RabbitMQ подменяется MagicMock,
+пространство токенов Tarantool - словарем в памяти), база данных SQLite создается во временном каталоге.
+Бенчмарки запускаются из корня репозитория: python bench/<имя>.py --help\r\n
+"""
+import importlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import types
+import warnings
+from unittest import mock
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+brands = ['Toyota Camry', 'Kia Rio', 'Hyundai Solaris', 'Lada Vesta', 'Skoda Octavia', 'Volkswagen Polo',
+          'BMW X5', 'Mercedes E200', 'Renault Logan', 'Haval Jolion', 'Geely Coolray', 'Chery Tiggo']
+districts = ['Арбат', 'Басманный', 'Замоскворечье', 'Пресненский', 'Тверской', 'Хамовники', 'Якиманка',
+             'Сокольники', 'Митино', 'Марьино', 'Бутово', 'Строгино']
+words = ['комфорт', 'семейный', 'эконом', 'бизнес', 'кондиционер', 'навигатор', 'подогрев', 'новый',
+         'просторный', 'надежный', 'городской', 'дальние', 'поездки', 'аэропорт', 'доставка']
+
+
+class FakeResponse:
+    u"""Ответ Tarantool с полем data"""
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeSpace:
+    u"""Пространство user_token в памяти"""
+    rows = {}
+
+    def select(self, key):
+        return FakeResponse([list(self.rows[key])] if key in self.rows else [])
+
+    def insert(self, row):
+        self.rows[row[0]] = list(row)
+
+    def update(self, key, operations):
+        for operation, field, value in operations:
+            self.rows[key][field] = value
+
+    def delete(self, key):
+        self.rows.pop(key, None)
+
+
+class FakeTarantool:
+    u"""Соединение с Tarantool"""
+    def space(self, name):
+        return FakeSpace()
+
+    def call(self, *args):
+        FakeSpace.rows.clear()
+
+
+def load_server(**overrides):
+    """
+    Метод для загрузки модуля сервера с пустой базой данных во временном каталоге\r\n
+    Параметры:\r\n
+        overrides: значения config_server, заменяющие значения из файла\r\n
+    Возвращаемое значение:\r\n
+        модуль Rabbit_server\r\n
+    """
+    work_dir = tempfile.mkdtemp(prefix='rabbit_bench_')
+    with open(os.path.join(ROOT, 'config_server'), encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+    config['connection_string'] = 'sqlite:///' + os.path.join(work_dir, 'bench.db')
+    config['logger_settings']['handlers']['file_handler']['filename'] = os.path.join(work_dir, 'server_logger.log')
+    config['logger_settings']['loggers']['server']['level'] = 'WARNING'  # журнал каждого запроса искажает замеры
+    config.update(overrides)
+    with open(os.path.join(work_dir, 'config_server'), 'w', encoding='utf-8') as file:
+        yaml.safe_dump(config, file, allow_unicode=True)
+    tarantool = types.ModuleType('tarantool')
+    tarantool.connect = lambda *args, **kwargs: FakeTarantool()
+    tarantool.error = types.SimpleNamespace(NetworkError=type('NetworkError', (Exception,), {}))
+    sys.modules['tarantool'] = tarantool
+    sys.path.insert(0, ROOT)
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        with mock.patch('pika.BlockingConnection'):
+            server = importlib.import_module('Rabbit_server')
+    finally:
+        os.chdir(cwd)
+    server.Base.metadata.create_all(server.db_engine)
+    warnings.filterwarnings('ignore', 'Dialect sqlite\\+pysqlite does \\*not\\* support Decimal')
+    return server
+
+
+def add_fleet(server, cars, categories=5, seed=1, chunk=10000):
+    """
+    Метод для заполнения базы компанией, категориями и случайными автомобилями\r\n
+    Параметры:\r\n
+        server: модуль сервера\r\n
+        cars: число автомобилей\r\n
+        categories: число категорий\r\n
+        seed: начальное значение генератора случайных чисел\r\n
+        chunk: число строк в одной команде executemany\r\n
+    """
+    rnd = random.Random(seed)
+    server.session.execute(server.Company.__table__.insert(),
+                           {'Name': 'Компания', 'Phone': '1', 'FIOContact': 'Иванов', 'ContactPhone': '2'})
+    server.session.execute(server.Category.__table__.insert(),
+                           [{'NameCat': 'Категория ' + str(number)} for number in range(categories)])
+    company_id = server.session.query(server.Company.Id).scalar()
+    category_ids = [row[0] for row in server.session.query(server.Category.Id)]
+    for start in range(0, cars, chunk):
+        rows = []
+        for _ in range(min(chunk, cars - start)):
+            brand = rnd.choice(brands)
+            rows.append({
+                'CompanyID': company_id, 'CategoryID': rnd.choice(category_ids), 'CategoryVU': 'B',
+                'Location': 'Москва, ' + rnd.choice(districts), 'Brand_and_name': brand,
+                'Header': brand + ' ' + ' '.join(rnd.sample(words, 3)),
+                'RentCondition': ' '.join(rnd.sample(words, 5)), 'Driver': rnd.random() < 0.1,
+                'Transmission': rnd.randrange(2), 'Engine': rnd.randrange(2), 'Car_type': rnd.randrange(6),
+                'Drive': rnd.randrange(3), 'Wheel_drive': rnd.randrange(2), 'Year': rnd.randint(2000, 2024),
+                'Power': rnd.randint(70, 400), 'Price': rnd.randint(500, 20000), 'Percent': 10, 'FixedRate': 100})
+        server.session.execute(server.Car.__table__.insert(), rows)
+        server.session.commit()
+    server.session.remove()
+
+
+def sign_up(server, phone='1'):
+    """
+    Метод для регистрации клиента\r\n
+    Возвращаемое значение:\r\n
+        (id клиента, токен)\r\n
+    """
+    reply = server.dispatch({'endpoint': 'clients', 'action': 'sign_up', 'content': {
+        'Name': 'Иван', 'Surname': 'Иванов', 'Birthday': '01-01-2000', 'Phone': phone, 'Email': 'e',
+        'CategoryVuID': 'B', 'NumVU': '1', 'Password': 'p'}})
+    client_id = server.session.query(server.Person.Id).filter(server.Person.Phone == phone).scalar()
+    server.session.remove()
+    return client_id, reply['token']
+
+
+def reply_dict(server, reply):
+    """Метод для получения словаря ответа обработчика (ответ из кэша декодируется)"""
+    if isinstance(reply, server.CachedReply):
+        return server.Rabbit_codec.decode_message(reply.encode(), reply.content_type)
+    return reply
+
+
+def measure(func, repeat):
+    """
+    Метод для замера времени выполнения функции\r\n
+    Параметры:\r\n
+        func: функция без параметров\r\n
+        repeat: число замеров (перед ними выполняется один прогревочный вызов)\r\n
+    Возвращаемое значение:\r\n
+        медиана времени одного вызова в миллисекундах\r\n
+    """
+    func()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def print_table(header, rows):
+    """Метод для вывода результатов таблицей с выравниванием по ширине колонок"""
+    rows = [[str(value) for value in row] for row in [header] + rows]
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    for number, row in enumerate(rows):
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+        if number == 0:
+            print('  '.join('-' * width for width in widths))
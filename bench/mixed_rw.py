@@ -0,0 +1,103 @@
+"""
+Бенчмарк пропускной способности при одновременном чтении и записи: прежний движок SQLite
+(create_engine без PRAGMA, один движок для чтения и записи) против профиля из config_server
+(WAL, пулы соединений, отдельный движок только для чтения)\r\n
+Каждый профиль запускается в отдельном процессе с новой базой данных, так как journal_mode=WAL
+сохраняется в файле БД. Потоки выполняют обработчики через dispatch: чтение (get_car, get_orders,
+get_favorites) и запись (add_favorite, del_favorite, sign_in)\r\n
+Запуск: python bench/mixed_rw.py --threads 8 --seconds 5 --writes 0.2
+"""
+import argparse
+import collections
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from common import add_fleet, load_server, print_table, reply_dict, sign_up
+
+read_actions = [('cars', 'get_car'), ('orders', 'get_orders'), ('clients', 'get_favorites')]
+write_actions = [('clients', 'add_favorite'), ('clients', 'del_favorite'), ('clients', 'sign_in')]
+
+
+def run_profile(profile, args):
+    """
+    Метод для замера одного профиля в текущем процессе\r\n
+    Возвращаемое значение:\r\n
+        словарь: число выполненных чтений и записей, число ошибок, время в секундах\r\n
+    """
+    server = load_server()
+    if profile == 'legacy':
+        from sqlalchemy import create_engine
+        engine = create_engine(server.config['connection_string'])  # как до профиля: без PRAGMA и пулов
+        server.db_engine.dispose()
+        server.read_engine.dispose()
+        server.db_engine = server.read_engine = engine
+    add_fleet(server, args.cars, categories=1)
+    car_ids = [row[0] for row in server.session.query(server.Car.Id)]
+    server.session.remove()
+    clients = [sign_up(server, 'rw' + str(number)) + ('rw' + str(number),) for number in range(args.threads)]
+    counts = collections.Counter()
+    lock = threading.Lock()
+    stop = time.monotonic() + args.seconds
+
+    def worker(number, client_id, token, phone):
+        rnd = random.Random(number)
+        local = collections.Counter()
+        while time.monotonic() < stop:
+            write = rnd.random() < args.writes
+            endpoint, action = rnd.choice(write_actions if write else read_actions)
+            if action == 'sign_in':
+                content = {'Phone': phone, 'Password': 'p'}
+            elif action == 'get_car':
+                content = {'Id': rnd.choice(car_ids)}
+            else:
+                content = {'CarId': rnd.choice(car_ids)}
+            reply = reply_dict(server, server.dispatch({'endpoint': endpoint, 'action': action, 'token': token,
+                                                        'content': content}))
+            if reply['status'] == '500' and reply['message'].startswith('Произошла ошибка на сервере'):
+                local['errors'] += 1  # например, database is locked
+            else:
+                local['writes' if write else 'reads'] += 1
+            if action == 'sign_in' and reply['status'] == '200':
+                token = reply['token']
+        with lock:
+            counts.update(local)
+
+    threads = [threading.Thread(target=worker, args=(number,) + client) for number, client in enumerate(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict(counts, seconds=time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\r\n')[0])
+    parser.add_argument('--threads', type=int, default=8, help='число потоков-обработчиков')
+    parser.add_argument('--seconds', type=float, default=5, help='длительность замера')
+    parser.add_argument('--writes', type=float, default=0.2, help='доля запросов записи')
+    parser.add_argument('--cars', type=int, default=10000, help='число автомобилей')
+    parser.add_argument('--profile', choices=['legacy', 'current'], help='замер одного профиля (для запуска из main)')
+    args = parser.parse_args()
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args)))
+        return
+
+    rows = []
+    for profile in ('legacy', 'current'):
+        output = subprocess.run([sys.executable, __file__, '--profile', profile] + sys.argv[1:],
+                                check=True, stdout=subprocess.PIPE, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        seconds = result['seconds']
+        rows.append([profile, int(result.get('reads', 0) / seconds), int(result.get('writes', 0) / seconds),
+                     int((result.get('reads', 0) + result.get('writes', 0)) / seconds), result.get('errors', 0)])
+    print('Потоков: ' + str(args.threads) + ', доля записи: ' + str(args.writes) + ', ' + str(args.seconds) + ' с')
+    print_table(['профиль', 'чтений/с', 'записей/с', 'всего/с', 'ошибок сервера'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Бенчмарк поиска search: полнотекстовый индекс Cars_fts (FTS5, bm25) против LIKE '%слово%'
+по колонкам Brand_and_name, Header, Location, RentCondition\r\n
+Для каждого запроса замеряется загрузка первой страницы (limit строк) неудаленных автомобилей.
+LIKE сортирует по Id, FTS - по релевантности, поэтому для частого слова LIKE может остановиться раньше,
+а FTS ранжирует все совпадения. Для сравнения приводится и FTS без сортировки по bm25, а также число
+найденных автомобилей\r\n
+Запуск: python bench/search.py --cars 200000
+"""
+import argparse
+import re
+
+from sqlalchemy import and_, func, or_
+
+from common import add_fleet, load_server, measure, print_table
+
+rare_word = 'кабриолет'
+
+
+def search_requests():
+    """Набор строк поиска: редкое слово, частое слово, марка, два слова и префикс"""
+    return {
+        'редкое слово': rare_word,
+        'частое слово': 'комфорт',
+        'марка': 'Toyota',
+        'два слова': 'Kia аэропорт',
+        'префикс': 'навиг',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\r\n')[0])
+    parser.add_argument('--cars', type=int, default=200000, help='число автомобилей')
+    parser.add_argument('--rare', type=int, default=20, help='число автомобилей с редким словом')
+    parser.add_argument('--limit', type=int, default=50, help='размер страницы')
+    parser.add_argument('--repeat', type=int, default=20, help='число замеров каждого запроса')
+    args = parser.parse_args()
+
+    server = load_server()
+    add_fleet(server, args.cars, categories=1)
+    Car = server.Car
+    step = max(args.cars // args.rare, 1)
+    server.session.query(Car).filter(Car.Id % step == 0)\
+        .update({'Header': Car.Header + ' ' + rare_word}, synchronize_session=False)  # триггер обновит Cars_fts
+    server.session.commit()
+    server.session.remove()
+
+    def like_query(query):
+        words = re.findall(r'\w+', query)
+        columns = [getattr(Car, name) for name in server.car_search_columns]
+        condition = and_(*[or_(*[column.like('%' + word + '%') for column in columns]) for word in words])
+        return server.session.query(*server.car_serializer.columns)\
+            .filter(condition, Car.DateDel == None).order_by(Car.Id)
+
+    def fts_query(query):
+        return server.search_query(server.search_match(query))
+
+    def fts_unranked_query(query):
+        return fts_query(query).order_by(None)
+
+    def page(build, query):
+        def call():
+            rows = build(query).limit(args.limit).all()
+            server.session.remove()
+            return rows
+        return call
+
+    def total(build, query):
+        count = build(query).order_by(None).with_entities(func.count()).scalar()
+        server.session.remove()
+        return count
+
+    rows = []
+    for name, query in search_requests().items():
+        found_like, found_fts = total(like_query, query), total(fts_query, query)
+        like = measure(page(like_query, query), args.repeat)
+        fts = measure(page(fts_query, query), args.repeat)
+        unranked = measure(page(fts_unranked_query, query), args.repeat)
+        rows.append([name, query, found_like, found_fts, '%.2f' % like, '%.2f' % fts, '%.2f' % unranked,
+                     '%.2fx' % (like / fts)])
+    print('search, ' + str(args.cars) + ' ТС, страница ' + str(args.limit) + ', медиана ' + str(args.repeat) +
+          ' замеров')
+    print_table(['запрос', 'строка', 'найдено LIKE', 'найдено FTS', 'LIKE, мс', 'FTS, мс', 'FTS без bm25, мс', 'LIKE / FTS'], rows)
+
+
+if __name__ == '__main__':
+    main()
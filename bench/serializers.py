@@ -0,0 +1,57 @@
+"""
+Бенчмарк сериализации ответа get_cars: прежний object_to_dict + json.dumps(default=str)
+против Serializer модели и Rabbit_codec.encode_message\r\n
+Замеряется только преобразование уже загруженных строк в тело ответа, в строках в секунду\r\n
+Запуск: python bench/serializers.py --rows 500 10000
+"""
+import argparse
+import json
+
+from common import add_fleet, load_server, measure, print_table
+
+
+def object_to_dict(obj):
+    """Прежний метод преобразования объекта модели в словарь (обход колонок таблицы для каждой строки)"""
+    return {x.name: getattr(obj, x.name)
+            for x in obj.__table__.columns}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\r\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[500, 10000], help='число строк в ответе')
+    parser.add_argument('--repeat', type=int, default=20, help='число замеров')
+    args = parser.parse_args()
+
+    server = load_server()
+    add_fleet(server, max(args.rows), categories=1)
+    codec = server.Rabbit_codec
+    table = []
+    for count in args.rows:
+        objects = server.session.query(server.Car).order_by(server.Car.Id).limit(count).all()
+        rows = server.session.query(*server.car_serializer.columns).order_by(server.Car.Id).limit(count).all()
+
+        def legacy():
+            data = {'status': '200', 'content': [object_to_dict(car) for car in objects]}
+            return json.dumps(data, ensure_ascii=False, default=str).encode()
+
+        def serializer(content_type):
+            def encode():
+                data = {'status': '200', 'content': [server.car_serializer.to_dict(row, content_type) for row in rows]}
+                return codec.encode_message(data, content_type)
+            return encode
+
+        assert legacy() == serializer(codec.JSON)(), 'тело ответа JSON отличается от прежнего'
+        variants = [('object_to_dict + json.dumps', legacy),
+                    ('Serializer + JSON', serializer(codec.JSON))]
+        if codec.msgpack is not None:
+            variants.append(('Serializer + msgpack', serializer(codec.MSGPACK)))
+        for name, func in variants:
+            ms = measure(func, args.repeat)
+            table.append([count, name, '%.2f' % ms, int(count / ms * 1000), len(func())])
+        server.session.remove()
+    print('Сериализация ответа get_cars, медиана ' + str(args.repeat) + ' замеров')
+    print_table(['строк', 'способ', 'мс', 'строк/с', 'байт'], table)
+
+
+if __name__ == '__main__':
+    main()
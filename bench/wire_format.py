@@ -0,0 +1,71 @@
+"""
+Бенчмарк формата сообщений: JSON против msgpack для ответов get_cars и get_orders\r\n
+Для уже загруженных строк замеряются преобразование в словари (Serializer, order_to_dict), кодирование
+Rabbit_codec.encode_message и декодирование на стороне клиента decode_message, а также размер тела
+до и после сжатия zlib (Compressor сервера)\r\n
+Запуск: python bench/wire_format.py --rows 200
+"""
+import argparse
+import datetime
+import decimal
+
+from common import add_fleet, load_server, measure, print_table, sign_up
+
+
+def add_orders(server, client_id, count):
+    """Метод для добавления клиенту заявок на первые count автомобилей"""
+    start = datetime.date(2024, 1, 1)
+    server.session.execute(server.Contract.__table__.insert(), [{
+        'ClientId': client_id, 'CarId': car_id, 'DateStartContract': start + datetime.timedelta(days=number),
+        'DateEndContract': start + datetime.timedelta(days=number + 3), 'Driver': False, 'Note': 'Заявка ' + str(number),
+        'Status': 1, 'Comission': decimal.Decimal('150.50'), 'Cost': 4500}
+        for number, (car_id,) in enumerate(server.session.query(server.Car.Id).order_by(server.Car.Id).limit(count))])
+    server.session.commit()
+    server.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\r\n')[0])
+    parser.add_argument('--rows', type=int, default=200, help='число строк в ответе')
+    parser.add_argument('--repeat', type=int, default=200, help='число замеров')
+    args = parser.parse_args()
+
+    server = load_server()
+    codec = server.Rabbit_codec
+    if codec.msgpack is None:
+        raise SystemExit('msgpack не установлен')
+    add_fleet(server, args.rows, categories=1)
+    client_id, token = sign_up(server)
+    add_orders(server, client_id, args.rows)
+    cars = server.session.query(*server.car_serializer.columns).order_by(server.Car.Id).limit(args.rows).all()
+    orders = server.orders_query(client_id).order_by(server.Contract.Id).all()
+    server.session.remove()
+    payloads = {
+        'get_cars': lambda: [server.car_serializer.to_dict(row) for row in cars],
+        'get_orders': lambda: [server.order_to_dict(row) for row in orders],
+    }
+
+    table = []
+    for action, rows_to_dicts in payloads.items():
+        for content_type in (codec.JSON, codec.MSGPACK):
+            server.request_context.content_type = content_type  # формат, выбранный для текущего запроса
+
+            def encode():
+                return codec.encode_message({'status': '200', 'message': action, 'content': rows_to_dicts()},
+                                            content_type)
+            body = encode()
+            decoded = codec.decode_message(body, content_type)
+            assert len(decoded['content']) == args.rows
+            encode_ms = measure(encode, args.repeat)
+            decode_ms = measure(lambda: codec.decode_message(body, content_type), args.repeat)
+            packed, encoding = server.compressor.compress(body)
+            table.append([action, content_type.split('/')[1], '%.3f' % encode_ms, '%.3f' % decode_ms,
+                          '%.3f' % (encode_ms + decode_ms), len(body), len(packed) if encoding else '-'])
+    server.request_context.content_type = codec.JSON
+    print('Ответ из ' + str(args.rows) + ' строк, медиана ' + str(args.repeat) + ' замеров')
+    print_table(['действие', 'формат', 'кодирование, мс', 'декодирование, мс', 'всего, мс', 'байт',
+                 'байт после zlib'], table)
+
+
+if __name__ == '__main__':
+    main()
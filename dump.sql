@@ -6,6 +6,18 @@
 PRAGMA foreign_keys = off;
 BEGIN TRANSACTION;
 
+-- Таблица: CarDailyStats
+CREATE TABLE "CarDailyStats" (
+	"CarId" INTEGER NOT NULL, 
+	"Day" DATE NOT NULL, 
+	"CompanyID" INTEGER NOT NULL, 
+	"Orders" INTEGER NOT NULL, 
+	"Revenue" INTEGER NOT NULL, 
+	"ComissionCents" INTEGER NOT NULL, 
+	"Days" INTEGER NOT NULL, 
+	PRIMARY KEY ("CarId", "Day")
+);
+
 -- Таблица: Cars
 CREATE TABLE "Cars" (
 	"Id" INTEGER NOT NULL, 
@@ -35,6 +47,34 @@ CREATE TABLE "Cars" (
 	FOREIGN KEY("CategoryID") REFERENCES "Category" ("Id")
 );
 
+-- Таблица: Cars_archive
+CREATE TABLE "Cars_archive" (
+	"Id" INTEGER NOT NULL, 
+	"CompanyID" INTEGER NOT NULL, 
+	"Location" VARCHAR(250) NOT NULL, 
+	"Photos" VARCHAR, 
+	"RentCondition" VARCHAR, 
+	"Header" VARCHAR NOT NULL, 
+	"Driver" BOOLEAN NOT NULL, 
+	status BOOLEAN, 
+	"CategoryID" INTEGER NOT NULL, 
+	"CategoryVU" VARCHAR NOT NULL, 
+	"DateDel" DATE, 
+	"FixedRate" NUMERIC, 
+	"Percent" NUMERIC, 
+	"Brand_and_name" VARCHAR NOT NULL, 
+	"Transmission" INTEGER, 
+	"Engine" INTEGER, 
+	"Car_type" INTEGER, 
+	"Drive" INTEGER, 
+	"Wheel_drive" INTEGER, 
+	"Year" INTEGER NOT NULL, 
+	"Power" INTEGER NOT NULL, 
+	"Price" INTEGER NOT NULL, 
+	"DateArchive" DATE NOT NULL, 
+	PRIMARY KEY ("Id")
+);
+
 -- Таблица: Category
 CREATE TABLE "Category" (
 	"Id" INTEGER NOT NULL, 
@@ -58,6 +98,17 @@ CREATE TABLE "Company" (
 	PRIMARY KEY ("Id")
 );
 
+-- Таблица: CompanyDailyStats
+CREATE TABLE "CompanyDailyStats" (
+	"CompanyID" INTEGER NOT NULL, 
+	"Day" DATE NOT NULL, 
+	"Orders" INTEGER NOT NULL, 
+	"Revenue" INTEGER NOT NULL, 
+	"ComissionCents" INTEGER NOT NULL, 
+	"Days" INTEGER NOT NULL, 
+	PRIMARY KEY ("CompanyID", "Day")
+);
+
 -- Таблица: Contract
 CREATE TABLE "Contract" (
 	"Id" INTEGER NOT NULL, 
@@ -76,6 +127,23 @@ CREATE TABLE "Contract" (
 	FOREIGN KEY("CarId") REFERENCES "Cars" ("Id")
 );
 
+-- Таблица: Contract_archive
+CREATE TABLE "Contract_archive" (
+	"Id" INTEGER NOT NULL, 
+	"ClientId" INTEGER NOT NULL, 
+	"CarId" INTEGER NOT NULL, 
+	"DateStartContract" DATE NOT NULL, 
+	"DateEndContract" DATE NOT NULL, 
+	"Driver" BOOLEAN NOT NULL, 
+	"Note" VARCHAR, 
+	"Status" INTEGER NOT NULL, 
+	"Comission" NUMERIC NOT NULL, 
+	"Cost" INTEGER NOT NULL, 
+	"DateDel" DATE, 
+	"DateArchive" DATE NOT NULL, 
+	PRIMARY KEY ("Id")
+);
+
 -- Таблица: Favorites
 CREATE TABLE "Favorites" (
 	"Id" INTEGER NOT NULL, 
@@ -88,6 +156,17 @@ CREATE TABLE "Favorites" (
 	FOREIGN KEY("CarId") REFERENCES "Cars" ("Id")
 );
 
+-- Таблица: Favorites_archive
+CREATE TABLE "Favorites_archive" (
+	"Id" INTEGER NOT NULL, 
+	"ClientId" INTEGER NOT NULL, 
+	"CarId" INTEGER NOT NULL, 
+	"Date_add" DATE, 
+	"DateDel" DATE, 
+	"DateArchive" DATE NOT NULL, 
+	PRIMARY KEY ("Id")
+);
+
 -- Таблица: Person
 CREATE TABLE "Person" (
 	"Id" INTEGER NOT NULL, 
@@ -107,5 +186,65 @@ CREATE TABLE "Person" (
 	PRIMARY KEY ("Id")
 );
 
+-- Таблица: Person_archive
+CREATE TABLE "Person_archive" (
+	"Id" INTEGER NOT NULL, 
+	"CompanyID" INTEGER, 
+	"Name" VARCHAR NOT NULL, 
+	"Surname" VARCHAR NOT NULL, 
+	"Birthday" DATE, 
+	"Phone" VARCHAR NOT NULL, 
+	"Password" VARCHAR NOT NULL, 
+	"Token" VARCHAR NOT NULL, 
+	"Email" VARCHAR, 
+	"Position" INTEGER, 
+	"Comment" VARCHAR, 
+	"CategoryVuID" VARCHAR NOT NULL, 
+	"NumVU" VARCHAR NOT NULL, 
+	"DateDel" DATE, 
+	"DateArchive" DATE NOT NULL, 
+	PRIMARY KEY ("Id")
+);
+
+-- Индекс: ix_CarDailyStats_CompanyID_Day
+CREATE INDEX "ix_CarDailyStats_CompanyID_Day" ON "CarDailyStats" ("CompanyID", "Day");
+
+-- Индекс: ix_Cars_CategoryID
+CREATE INDEX "ix_Cars_CategoryID" ON "Cars" ("CategoryID") WHERE "DateDel" IS NULL;
+
+-- Индекс: ix_Cars_CategoryID_Price
+CREATE INDEX "ix_Cars_CategoryID_Price" ON "Cars" ("CategoryID", "Price") WHERE "DateDel" IS NULL;
+
+-- Индекс: ix_Contract_CarId
+CREATE INDEX "ix_Contract_CarId" ON "Contract" ("CarId");
+
+-- Индекс: ix_Contract_ClientId
+CREATE INDEX "ix_Contract_ClientId" ON "Contract" ("ClientId") WHERE "DateDel" IS NULL;
+
+-- Индекс: ix_Contract_ClientId_DateDel
+CREATE INDEX "ix_Contract_ClientId_DateDel" ON "Contract" ("ClientId", "DateDel");
+
+-- Индекс: ix_Favorites_CarId
+CREATE INDEX "ix_Favorites_CarId" ON "Favorites" ("CarId");
+
+-- Индекс: ix_Favorites_ClientId_CarId
+CREATE INDEX "ix_Favorites_ClientId_CarId" ON "Favorites" ("ClientId", "CarId");
+
+-- Индекс: ix_Person_Phone
+CREATE INDEX "ix_Person_Phone" ON "Person" ("Phone") WHERE "DateDel" IS NULL;
+
+-- Таблица: Cars_fts
+CREATE VIRTUAL TABLE "Cars_fts" USING fts5(Brand_and_name, Header, Location, RentCondition, content='Cars', content_rowid='Id', tokenize='unicode61 remove_diacritics 2');
+INSERT INTO "Cars_fts"("Cars_fts") VALUES ('rebuild');
+
+-- Триггер: Cars_fts_ad
+CREATE TRIGGER "Cars_fts_ad" AFTER DELETE ON "Cars" BEGIN INSERT INTO "Cars_fts"("Cars_fts", rowid, Brand_and_name, Header, Location, RentCondition) VALUES ('delete', old."Id", old."Brand_and_name", old."Header", old."Location", old."RentCondition"); END;
+
+-- Триггер: Cars_fts_ai
+CREATE TRIGGER "Cars_fts_ai" AFTER INSERT ON "Cars" BEGIN INSERT INTO "Cars_fts"(rowid, Brand_and_name, Header, Location, RentCondition) VALUES (new."Id", new."Brand_and_name", new."Header", new."Location", new."RentCondition"); END;
+
+-- Триггер: Cars_fts_au
+CREATE TRIGGER "Cars_fts_au" AFTER UPDATE OF Brand_and_name, Header, Location, RentCondition ON "Cars" BEGIN INSERT INTO "Cars_fts"("Cars_fts", rowid, Brand_and_name, Header, Location, RentCondition) VALUES ('delete', old."Id", old."Brand_and_name", old."Header", old."Location", old."RentCondition"); INSERT INTO "Cars_fts"(rowid, Brand_and_name, Header, Location, RentCondition) VALUES (new."Id", new."Brand_and_name", new."Header", new."Location", new."RentCondition"); END;
+
 COMMIT TRANSACTION;
 PRAGMA foreign_keys = on;
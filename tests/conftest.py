@@ -0,0 +1,149 @@
+"""
+Общие фикстуры тестов сервера\r\n
+Сервер импортируется без RabbitMQ и Tarantool: соединение с RabbitMQ подменяется MagicMock,
+пространство токенов Tarantool - словарем в памяти. База данных SQLite создается во временном каталоге\r\n
+"""
+import importlib
+import os
+import sys
+import types
+from unittest import mock
+
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeResponse:
+    u"""Ответ Tarantool с полем data"""
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeSpace:
+    u"""
+    Пространство user_token в памяти. Прежний токен клиента удаляется при выдаче нового, как если бы
+    он уже истек, поэтому число записей не растет при повторных входах\r\n
+    """
+    rows = {}
+
+    def select(self, key):
+        return FakeResponse([list(self.rows[key])] if key in self.rows else [])
+
+    def insert(self, row):
+        for token in [token for token, stored in list(self.rows.items()) if stored[1] == row[1]]:
+            del self.rows[token]
+        self.rows[row[0]] = list(row)
+
+    def update(self, key, operations):
+        for operation, field, value in operations:
+            self.rows[key][field] = value
+
+    def delete(self, key):
+        self.rows.pop(key, None)
+
+
+class FakeTarantool:
+    u"""Соединение с Tarantool"""
+    def space(self, name):
+        return FakeSpace()
+
+    def call(self, *args):
+        FakeSpace.rows.clear()
+
+
+def install_tarantool_stub():
+    """Метод для подмены модуля tarantool"""
+    module = types.ModuleType('tarantool')
+    module.connect = lambda *args, **kwargs: FakeTarantool()
+    module.error = types.SimpleNamespace(NetworkError=type('NetworkError', (Exception,), {}))
+    sys.modules['tarantool'] = module
+
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    """Фикстура модуля сервера с пустой базой данных"""
+    work_dir = tmp_path_factory.mktemp('server')
+    with open(os.path.join(ROOT, 'config_server'), encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+    config['connection_string'] = 'sqlite:///' + str(work_dir / 'test.db')
+    config['logger_settings']['handlers']['file_handler']['filename'] = str(work_dir / 'server_logger.log')
+    config['archive_pause_ms'] = 0
+    with open(work_dir / 'config_server', 'w', encoding='utf-8') as file:
+        yaml.safe_dump(config, file, allow_unicode=True)
+    install_tarantool_stub()
+    sys.path.insert(0, ROOT)
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        with mock.patch('pika.BlockingConnection'):
+            module = importlib.import_module('Rabbit_server')
+    finally:
+        os.chdir(cwd)
+    module.Base.metadata.create_all(module.db_engine)
+    yield module
+    module.session.remove()
+    module.db_engine.dispose()
+    module.read_engine.dispose()
+
+
+def call(server, endpoint, action, content, token=None):
+    """
+    Метод для вызова обработчика так же, как при получении запроса из очереди\r\n
+    Возвращаемое значение:\r\n
+        словарь ответа (ответ из кэша декодируется)\r\n
+    """
+    data = {'endpoint': endpoint, 'action': action, 'content': content}
+    if token is not None:
+        data['token'] = token
+    reply = server.dispatch(data)
+    if isinstance(reply, server.CachedReply):
+        reply = server.Rabbit_codec.decode_message(reply.encode(), reply.content_type)
+    return reply
+
+
+@pytest.fixture(scope='session')
+def company(server):
+    """Фикстура компании и категории, к которым относятся автомобили тестов"""
+    server.session.execute(server.Company.__table__.insert(),
+                           {'Name': 'Компания', 'Phone': '1', 'FIOContact': 'Иванов', 'ContactPhone': '2'})
+    server.session.execute(server.Category.__table__.insert(), {'NameCat': 'Легковые'})
+    server.session.commit()
+    company_id = server.session.query(server.Company.Id).scalar()
+    category_id = server.session.query(server.Category.Id).scalar()
+    server.session.remove()
+    return company_id, category_id
+
+
+def add_cars(server, company, count, **values):
+    """
+    Метод для добавления автомобилей\r\n
+    Возвращаемое значение:\r\n
+        список id добавленных автомобилей\r\n
+    """
+    company_id, category_id = company
+    rows = [dict({'CompanyID': company_id, 'Location': 'Москва', 'Header': 'Toyota Camry', 'Driver': False,
+                  'CategoryID': category_id, 'CategoryVU': 'B', 'Brand_and_name': 'Toyota Camry ' + str(number),
+                  'Year': 2020, 'Power': 150, 'Price': 1000 + number, 'Percent': 10, 'FixedRate': 100},
+                 **values) for number in range(count)]
+    server.session.execute(server.Car.__table__.insert(), rows)
+    server.session.commit()
+    ids = [row[0] for row in server.session.query(server.Car.Id).order_by(server.Car.Id.desc()).limit(count)]
+    server.session.remove()
+    return sorted(ids)
+
+
+def sign_up(server, phone):
+    """
+    Метод для регистрации клиента\r\n
+    Возвращаемое значение:\r\n
+        (id клиента, токен)\r\n
+    """
+    reply = call(server, 'clients', 'sign_up', {'Name': 'Иван', 'Surname': 'Иванов', 'Birthday': '01-01-2000',
+                                               'Phone': phone, 'Email': 'e', 'CategoryVuID': 'B', 'NumVU': '1',
+                                               'Password': 'p'})
+    assert reply['status'] == '200', reply['message']
+    client_id = server.session.query(server.Person.Id).filter(server.Person.Phone == phone).scalar()
+    server.session.remove()
+    return client_id, reply['token']
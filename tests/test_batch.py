@@ -0,0 +1,93 @@
+"""
+Тесты пакета запросов batch в одной транзакции
+"""
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from conftest import add_cars, call, sign_up
+
+start, end = datetime.datetime(2032, 3, 1), datetime.datetime(2032, 3, 5)
+
+
+def item(endpoint, action, content):
+    return {'endpoint': endpoint, 'action': action, 'content': content}
+
+
+def add_order(car_id):
+    return item('orders', 'add_order', {'CarId': car_id, 'DateStartContract': '01-03-2032',
+                                        'DateEndContract': '05-03-2032'})
+
+
+def count(server, model, car_id, client_id):
+    rows = server.session.query(model).filter(model.CarId == car_id, model.ClientId == client_id).count()
+    server.session.remove()
+    return rows
+
+
+@pytest.fixture
+def client(server, company):
+    car_ids = add_cars(server, company, 2)
+    server.load_catalog_index()
+    client_id, token = sign_up(server, 'batch' + str(car_ids[0]))
+    return car_ids, client_id, token
+
+
+def test_failed_read_item_keeps_transaction(server, client):
+    (car_id, other_id), client_id, token = client
+    reply = call(server, 'batch', 'run', {'transaction': True, 'items': [
+        item('clients', 'add_favorite', {'CarId': car_id}),
+        item('cars', 'get_car', {'Id': 10 ** 9}),  # 404 запроса чтения
+        add_order(car_id)]}, token)
+
+    assert reply['status'] == '200', reply['message']
+    assert [result['status'] for result in reply['content']] == ['200', '404', '200']
+    assert count(server, server.Favorite, car_id, client_id) == 1
+    assert count(server, server.Contract, car_id, client_id) == 1
+    assert not server.availability_index.is_free(car_id, start, end)
+
+
+def test_failed_write_item_rolls_back_batch(server, client):
+    (car_id, other_id), client_id, token = client
+    reply = call(server, 'batch', 'run', {'transaction': True, 'items': [
+        add_order(car_id),
+        item('clients', 'add_favorite', {'CarId': car_id}),
+        add_order(car_id),  # автомобиль уже занят первым запросом пакета
+        item('clients', 'add_favorite', {'CarId': other_id})]}, token)
+
+    assert reply['status'] != '200'
+    assert [result['status'] for result in reply['content']][:2] == ['200', '200']
+    assert len(reply['content']) == 3
+    assert count(server, server.Favorite, car_id, client_id) == 0
+    assert count(server, server.Contract, car_id, client_id) == 0
+    assert server.availability_index.is_free(car_id, start, end)
+
+
+def test_token_actions_are_rejected_in_transaction(server, client):
+    (car_id, other_id), client_id, token = client
+    reply = call(server, 'batch', 'run', {'transaction': True, 'items': [
+        item('clients', 'add_favorite', {'CarId': car_id}),
+        item('clients', 'sign_in', {'Phone': 'batch' + str(car_id), 'Password': 'p'})]}, token)
+
+    assert reply['status'] == '403'
+    assert count(server, server.Favorite, car_id, client_id) == 0
+    assert server.session.get(server.Person, client_id).Token == token  # вход не выполнен, токен не заменен
+    server.session.remove()
+
+
+def test_failed_commit_releases_reservations(server, client):
+    (car_id, other_id), client_id, token = client
+
+    def fail(conn):
+        raise RuntimeError('disk I/O error')
+
+    event.listen(server.db_engine, 'commit', fail)  # фиксация точек сохранения проходит, фиксация транзакции - нет
+    try:
+        reply = call(server, 'batch', 'run', {'transaction': True, 'items': [add_order(car_id)]}, token)
+    finally:
+        event.remove(server.db_engine, 'commit', fail)
+
+    assert reply['status'] == '500'
+    assert count(server, server.Contract, car_id, client_id) == 0
+    assert server.availability_index.is_free(car_id, start, end)
@@ -0,0 +1,46 @@
+"""
+Тесты каталога автомобилей (get_cars через индекс каталога в памяти)
+"""
+import datetime
+
+from conftest import add_cars, call, sign_up
+
+
+def test_get_cars_skips_cars_deleted_after_index_load(server, company):
+    server.session.execute(server.Category.__table__.insert(), {'NameCat': 'Удаленные'})
+    server.session.commit()
+    category_id = server.session.query(server.Category.Id).filter(server.Category.NameCat == 'Удаленные').scalar()
+    server.session.remove()
+    car_ids = add_cars(server, company, 3, CategoryID=category_id)
+    server.load_catalog_index()
+    # удаление в обход ORM: индекс каталога о нем не знает
+    server.session.query(server.Car).filter(server.Car.Id == car_ids[0])\
+        .update({'DateDel': datetime.date.today()}, synchronize_session=False)
+    server.session.commit()
+    server.session.remove()
+    client_id, token = sign_up(server, 'catalog')
+    reply = call(server, 'cars', 'get_cars', {'CategoryID': category_id}, token)
+    assert reply['status'] == '200', reply['message']
+    assert [car['Id'] for car in reply['content']] == car_ids[1:]
+
+
+def test_get_cars_refills_page_after_deleted_cars(server, company):
+    server.session.execute(server.Category.__table__.insert(), {'NameCat': 'Страницы'})
+    server.session.commit()
+    category_id = server.session.query(server.Category.Id).filter(server.Category.NameCat == 'Страницы').scalar()
+    server.session.remove()
+    car_ids = add_cars(server, company, 5, CategoryID=category_id)
+    server.load_catalog_index()
+    server.session.query(server.Car).filter(server.Car.Id.in_(car_ids[1:3]))\
+        .update({'DateDel': datetime.date.today()}, synchronize_session=False)
+    server.session.commit()
+    server.session.remove()
+    client_id, token = sign_up(server, 'catalog_pages')
+
+    pages, content = [], {'CategoryID': category_id, 'limit': 2, 'order_by': 'Price', 'desc': True}
+    while content is not None:
+        reply = call(server, 'cars', 'get_cars', dict(content), token)
+        assert reply['status'] == '200', reply['message']
+        pages.append([car['Id'] for car in reply['content']])
+        content = dict(content, **reply['next_page']) if reply['next_page'] else None
+    assert pages == [[car_ids[4], car_ids[3]], [car_ids[0]]]
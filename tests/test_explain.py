@@ -0,0 +1,13 @@
+"""
+Тесты проверки планов запросов (explain)
+"""
+
+
+def test_explained_queries_cover_handlers(server):
+    for name in ('quote (price_cache)', 'get_free_cars', 'report_company', 'report_car', 'report_company_cars',
+                 'get_archive cars', 'search', 'get_orders'):
+        assert name in server.explained_queries
+
+
+def test_explained_queries_use_indexes(server):
+    assert server.explain_queries() == 0
@@ -0,0 +1,41 @@
+"""
+Тесты экспорта автопарка export_fleet
+"""
+import json
+import threading
+import types
+
+from conftest import add_cars
+
+
+def test_export_does_not_block_writes(server, company, tmp_path, monkeypatch):
+    company_id, category_id = company
+    add_cars(server, company, 3)
+    errors = []
+
+    def rename_category():  # запрос записи из другого потока, пока экспорт читает строки
+        try:
+            server.session.get(server.Category, category_id).NameCat = 'Легковые (экспорт)'
+            server.session.commit()
+        except Exception as error:
+            errors.append(error)
+        finally:
+            server.session.remove()
+
+    def dumps(value, **kwargs):
+        if not hasattr(dumps, 'written'):
+            dumps.written = True
+            writer = threading.Thread(target=rename_category)
+            writer.start()
+            writer.join()
+        return json.dumps(value, **kwargs)
+
+    monkeypatch.setattr(server, 'json', types.SimpleNamespace(dumps=dumps))
+    result = server.export_fleet('cars', str(tmp_path / 'cars.jsonl'), chunk_size=1)
+
+    assert errors == []
+    assert result['rows'] == server.session.query(server.Car).filter(server.Car.DateDel == None).count()
+    assert server.session.get(server.Category, category_id).NameCat == 'Легковые (экспорт)'
+    server.session.get(server.Category, category_id).NameCat = 'Легковые'
+    server.session.commit()
+    server.session.remove()
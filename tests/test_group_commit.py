@@ -0,0 +1,88 @@
+"""
+Тесты групповой транзакции GroupCommitter: индексы и кэши в памяти обновляются только после фиксации
+"""
+import datetime
+from concurrent.futures import Future
+
+import pytest
+from sqlalchemy import event
+
+from conftest import add_cars, sign_up
+
+start, end = datetime.datetime(2031, 7, 1), datetime.datetime(2031, 7, 5)
+
+
+def order(token, car_id):
+    return {'endpoint': 'orders', 'action': 'add_order', 'token': token,
+            'content': {'CarId': car_id, 'DateStartContract': '01-07-2031', 'DateEndContract': '05-07-2031'}}
+
+
+def set_price(server, car_id, price):
+    """Обработчик записи, изменяющий автомобиль каталога"""
+    def handler(data):
+        server.session.get(server.Car, car_id).Price = price
+        server.session.commit()
+        return {'status': '200'}
+    return handler
+
+
+def indexed_price(server, car_id):
+    return int(server.catalog_index.data['Price'][server.catalog_index.positions[car_id]])
+
+
+@pytest.fixture
+def fleet(server, company):
+    car_ids = add_cars(server, company, 2)
+    server.load_catalog_index()
+    client_id, token = sign_up(server, 'group' + str(car_ids[0]))
+    return car_ids, token
+
+
+def test_failed_group_commit_leaves_memory_unchanged(server, fleet):
+    (car_id, other_id), token = fleet
+    price = indexed_price(server, other_id)
+    versions = dict(server.table_versions)
+    batch = [(server.Contract.add_order, order(token, car_id), Future()),
+             (set_price(server, other_id, price + 500), {}, Future())]
+
+    def fail(conn):
+        raise RuntimeError('disk I/O error')
+
+    event.listen(server.db_engine, 'commit', fail)  # фиксация точек сохранения проходит, фиксация транзакции - нет
+    try:
+        server.GroupCommitter(0, 10).commit_batch(batch)
+    finally:
+        event.remove(server.db_engine, 'commit', fail)
+
+    assert all(isinstance(future.exception(), RuntimeError) for handler, data, future in batch)
+    assert server.availability_index.is_free(car_id, start, end)
+    assert indexed_price(server, other_id) == price
+    assert dict(server.table_versions) == versions
+    assert server.session.query(server.Contract).filter(server.Contract.CarId == car_id).count() == 0
+    assert server.session.get(server.Car, other_id).Price == price
+    server.session.remove()
+
+
+def test_group_commit_applies_changes_after_commit(server, fleet):
+    (car_id, other_id), token = fleet
+    price = indexed_price(server, other_id)
+    version = server.table_versions.get('Cars', 0)
+    seen = []
+
+    def probe(data):  # выполняется в той же транзакции после фиксации точки сохранения set_price
+        seen.append((indexed_price(server, other_id), server.table_versions.get('Cars', 0)))
+        return {'status': '200'}
+
+    batch = [(server.Contract.add_order, order(token, car_id), Future()),
+             (server.Contract.add_order, order(token, car_id), Future()),  # пересечение: точка сохранения отменяется
+             (set_price(server, other_id, price + 500), {}, Future()),
+             (probe, {}, Future())]
+    server.GroupCommitter(0, 10).commit_batch(batch)
+
+    assert [future.result()['status'] for handler, data, future in batch][::2] == ['200', '200']
+    assert seen == [(price, version)]
+    assert not server.availability_index.is_free(car_id, start, end)
+    assert indexed_price(server, other_id) == price + 500
+    assert server.table_versions.get('Cars', 0) > version
+    assert server.session.query(server.Contract).filter(server.Contract.CarId == car_id).count() == 1
+    server.session.remove()
@@ -0,0 +1,40 @@
+"""
+Тесты заявок: добавление add_order и расчет стоимости quote
+"""
+from conftest import add_cars, call, sign_up
+
+
+def quote_items(car_ids):
+    return [{'CarId': car_id, 'DateStartContract': '01-06-2030', 'DateEndContract': '04-06-2030'}
+            for car_id in car_ids]
+
+
+def test_quote_rejects_more_than_max_quote_items(server, company, monkeypatch):
+    monkeypatch.setitem(server.config, 'max_quote_items', 3)
+    car_ids = add_cars(server, company, 4, Price=1000)
+    client_id, token = sign_up(server, 'quote')
+
+    reply = call(server, 'orders', 'quote', {'items': quote_items(car_ids[:3])}, token)
+    assert reply['status'] == '200', reply['message']
+    assert [item['Cost'] for item in reply['content']] == [3000] * 3
+
+    reply = call(server, 'orders', 'quote', {'items': quote_items(car_ids)}, token)
+    assert reply['status'] == '403'
+    assert reply['content'] == []
+
+
+def test_add_order_rejects_double_booking(server, company):
+    car_id, = add_cars(server, company, 1)
+    server.load_catalog_index()
+    client_id, token = sign_up(server, 'double_booking')
+    order = {'CarId': car_id, 'DateStartContract': '01-08-2030', 'DateEndContract': '05-08-2030'}
+
+    reply = call(server, 'orders', 'add_order', dict(order), token)
+    assert reply['status'] == '200', reply['message']
+
+    reply = call(server, 'orders', 'add_order', dict(order, DateStartContract='03-08-2030'), token)
+    assert reply['status'] == '409'
+    assert 'уже забронирован' in reply['message']
+    contracts = server.session.query(server.Contract).filter(server.Contract.CarId == car_id).count()
+    server.session.remove()
+    assert contracts == 1
@@ -0,0 +1,94 @@
+"""
+Тесты числа SQL-запросов обработчиков чтения: число запросов не должно зависеть от числа строк ответа
+"""
+import contextlib
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from conftest import add_cars, call, sign_up
+
+
+@contextlib.contextmanager
+def count_statements(server):
+    """Контекстный менеджер для подсчета SQL-запросов в пулах записи и чтения"""
+    statements = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for engine in (server.db_engine, server.read_engine):
+        event.listen(engine, 'after_cursor_execute', collect)
+    try:
+        yield statements
+    finally:
+        for engine in (server.db_engine, server.read_engine):
+            event.remove(engine, 'after_cursor_execute', collect)
+
+
+def add_client_rows(server, company, phone, count):
+    """
+    Метод для создания клиента с count заявками и count автомобилями в избранном\r\n
+    Возвращаемое значение:\r\n
+        (токен клиента, id первой заявки)\r\n
+    """
+    client_id, token = sign_up(server, phone)
+    car_ids = add_cars(server, company, count)
+    start = datetime.date(2030, 1, 1)
+    server.session.execute(server.Contract.__table__.insert(), [
+        {'ClientId': client_id, 'CarId': car_id, 'DateStartContract': start, 'DateEndContract': start,
+         'Driver': False, 'Status': 0, 'Comission': 10, 'Cost': 1000} for car_id in car_ids])
+    server.session.execute(server.Favorite.__table__.insert(), [
+        {'ClientId': client_id, 'CarId': car_id, 'Date_add': start} for car_id in car_ids])
+    server.session.commit()
+    order_id = server.session.query(server.Contract.Id).filter(server.Contract.ClientId == client_id)\
+        .order_by(server.Contract.Id).first()[0]
+    server.session.remove()
+    return token, order_id
+
+
+@pytest.fixture(scope='module')
+def clients(server, company):
+    """Фикстура двух клиентов: с одной строкой и со многими строками (больше page_size для yield_per)"""
+    return {
+        1: add_client_rows(server, company, 'one', 1),
+        'many': add_client_rows(server, company, 'many', server.config['page_size'] * 2 + 7),
+    }
+
+
+@pytest.mark.parametrize('action', ['get_orders', 'get_favorites'])
+def test_list_statements_do_not_depend_on_rows(server, clients, action):
+    endpoint = 'orders' if action == 'get_orders' else 'clients'
+    counts = {}
+    for key, (token, order_id) in clients.items():
+        with count_statements(server) as statements:
+            reply = call(server, endpoint, action, {}, token)
+        assert reply['status'] == '200', reply['message']
+        assert len(reply['content']) == (1 if key == 1 else server.config['page_size'] * 2 + 7)
+        counts[key] = len(statements)
+    assert counts[1] == counts['many']
+
+
+def test_get_order_statements_do_not_depend_on_rows(server, clients):
+    counts = {}
+    for key, (token, order_id) in clients.items():
+        with count_statements(server) as statements:
+            reply = call(server, 'orders', 'get_order', {'Id': order_id}, token)
+        assert reply['status'] == '200', reply['message']
+        counts[key] = len(statements)
+    assert counts[1] == counts['many']
+
+
+def test_deleted_rows_are_not_listed(server, company):
+    token, order_id = add_client_rows(server, company, 'deleted', 2)
+    server.session.query(server.Contract).filter(server.Contract.Id == order_id)\
+        .update({'DateDel': datetime.date.today()}, synchronize_session=False)
+    server.session.query(server.Favorite).filter(server.Favorite.CarId == server.session.query(
+        server.Contract.CarId).filter(server.Contract.Id == order_id).scalar_subquery())\
+        .update({'DateDel': datetime.date.today()}, synchronize_session=False)
+    server.session.commit()
+    server.session.remove()
+    assert len(call(server, 'orders', 'get_orders', {}, token)['content']) == 1
+    assert len(call(server, 'clients', 'get_favorites', {}, token)['content']) == 1
+    assert call(server, 'orders', 'get_order', {'Id': order_id}, token)['status'] == '404'
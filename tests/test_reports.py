@@ -0,0 +1,41 @@
+"""
+Тесты дневных сводок по заявкам (обновление сводок при изменении заявок)
+"""
+import datetime
+
+import pytest
+
+from conftest import add_cars, sign_up
+
+
+def company_total(server, company_id, day):
+    row = server.session.query(server.CompanyDailyStats).filter_by(CompanyID=company_id, Day=day).first()
+    result = (row.Orders, row.Revenue) if row is not None else (0, 0)
+    server.session.remove()
+    return result
+
+
+@pytest.mark.parametrize('changes', [{'Cost': 9000}, {'DateDel': datetime.date(2030, 1, 1)}, {'Status': 2}])
+def test_expired_contract_update_moves_report_values(server, company, changes):
+    company_id, category_id = company
+    car_id = add_cars(server, company, 1)[0]
+    client_id, token = sign_up(server, 'report' + '_'.join(changes))
+    day = datetime.date(2031, 3, 1) + datetime.timedelta(days=len(server.session.query(server.Contract).all()))
+    server.session.remove()
+    contract = server.Contract(ClientId=client_id, CarId=car_id, DateStartContract=day,
+                               DateEndContract=day + datetime.timedelta(days=2), Driver=False, Status=0,
+                               Comission=1, Cost=3000)
+    server.session.add(contract)
+    server.session.commit()  # атрибуты заявки истекают, прежние значения при изменении не загружаются
+    contract_id = contract.Id
+    before = company_total(server, company_id, day)
+
+    contract = server.session.get(server.Contract, contract_id)
+    server.session.expire(contract)
+    for name, value in changes.items():
+        setattr(contract, name, value)
+    server.session.commit()
+    server.session.remove()
+
+    expected = (before[0], before[1] + 6000) if 'Cost' in changes else (before[0] - 1, before[1] - 3000)
+    assert company_total(server, company_id, day) == expected
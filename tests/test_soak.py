@@ -0,0 +1,97 @@
+"""
+Нагрузочный тест сессий БД: после множества запросов из нескольких потоков все соединения
+возвращены в пулы, сессии не держат транзакции и объекты identity map, а резидентная память процесса
+после прогрева не растет\r\n
+Длительный прогон: SOAK_ROUNDS=5000 python -m pytest tests/test_soak.py
+"""
+import gc
+import os
+import resource
+import threading
+
+from sqlalchemy import event
+
+from conftest import add_cars, call, sign_up
+
+THREADS = 8
+ROUNDS = 50  # раунды с проверкой сессий, они же прогрев кэшей, индексов и пулов соединений
+SOAK_ROUNDS = int(os.environ.get('SOAK_ROUNDS', 50))  # раунды с замером памяти
+RSS_GROWTH_MB = int(os.environ.get('SOAK_RSS_GROWTH_MB', 16))  # допустимый рост памяти после прогрева
+TOKEN = object()  # подставляется текущий токен клиента
+
+
+def requests(car_ids, category_id, phone):
+    """Список запросов одного раунда: чтение, запись, ошибки клиента и ошибки сервера"""
+    car_id = car_ids[0]
+    return [
+        ('cars', 'get_car', {'Id': car_id}, TOKEN),
+        ('cars', 'get_cars', {'CategoryID': category_id, 'limit': 5}, TOKEN),
+        ('clients', 'add_favorite', {'CarId': car_id}, TOKEN),
+        ('clients', 'get_favorites', {}, TOKEN),
+        ('clients', 'del_favorite', {'CarId': car_id}, TOKEN),
+        ('orders', 'get_orders', {}, TOKEN),
+        ('orders', 'get_order', {'Id': 10 ** 9}, TOKEN),  # 404
+        ('clients', 'sign_in', {'Phone': phone, 'Password': 'p'}, None),
+        ('batch', 'run', {'transaction': True, 'items': [
+            {'endpoint': 'clients', 'action': 'add_favorite', 'content': {'CarId': car_id}},
+            {'endpoint': 'clients', 'action': 'del_favorite', 'content': {'CarId': car_id}}]}, TOKEN),
+        ('cars', 'get_car', {'Id': 'не число'}, TOKEN),  # ошибка разбора запроса
+        ('orders', 'get_orders', {}, 'неверный токен'),  # 403
+        ('cars', 'nope', {}, TOKEN),  # 404 без обработчика
+    ]
+
+
+def rss_mb():
+    """Метод для получения резидентной памяти процесса в мегабайтах"""
+    gc.collect()
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except OSError:  # не Linux: пиковая память процесса (ru_maxrss в килобайтах)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def test_sessions_and_connections_are_released(server, company):
+    car_ids = add_cars(server, company, 3)
+    server.load_catalog_index()
+    clients = [sign_up(server, 'soak' + str(number)) + ('soak' + str(number),) for number in range(THREADS)]
+    sessions = set()  # сессии не освобождаются сборщиком мусора, пока тест их проверяет
+
+    def track(session, transaction):
+        sessions.add(session)
+
+    event.listen(server.session_factory, 'after_transaction_create', track)
+    errors = []
+
+    def worker(client_id, token, phone, rounds):
+        try:
+            for _ in range(rounds):
+                for endpoint, action, content, request_token in requests(car_ids, company[1], phone):
+                    reply = call(server, endpoint, action, dict(content),
+                                 token if request_token is TOKEN else request_token)
+                    assert reply['status'] in ('200', '403', '404', '500'), reply
+                    if action == 'sign_in':
+                        token = reply['token']  # прежний токен после входа недействителен
+        except Exception as e:
+            errors.append(e)
+
+    def run(rounds):
+        threads = [threading.Thread(target=worker, args=client + (rounds,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    try:
+        run(ROUNDS)
+    finally:
+        event.remove(server.session_factory, 'after_transaction_create', track)
+    warm_rss = rss_mb()
+    run(SOAK_ROUNDS)  # сессии больше не запоминаются, чтобы не занимать память самим тестом
+    final_rss = rss_mb()
+    assert not errors
+    assert server.db_engine.pool.checkedout() == 0
+    assert server.read_engine.pool.checkedout() == 0
+    open_sessions = [session for session in sessions if session.in_transaction() or len(session.identity_map)]
+    assert open_sessions == []
+    assert final_rss - warm_rss < RSS_GROWTH_MB, (warm_rss, final_rss)